@@ -1,5 +1,5 @@
 from fastapi import APIRouter
-from app.api.v1.endpoints import users,movies, actors, directors,comments, ratings
+from app.api.v1.endpoints import users,movies, actors, directors,comments, ratings, admin
 
 api_router = APIRouter()
 api_router.include_router(users.router, prefix="/users", tags=["Users"])
@@ -8,4 +8,5 @@ api_router.include_router(actors.router, prefix="/actors", tags=["Actors"])
 api_router.include_router(directors.router, prefix="/directors", tags=["Directors"])
 # 评论和打分的路由
 api_router.include_router(comments.router, tags=["Comments"]) 
-api_router.include_router(ratings.router, tags=["Ratings"])
\ No newline at end of file
+api_router.include_router(ratings.router, tags=["Ratings"])
+api_router.include_router(admin.router, prefix="/admin", tags=["Admin"])
\ No newline at end of file
@@ -9,12 +9,14 @@ from typing import Annotated
 from app.crud import crud_user
 from app.schemas import user_schema
 from app.core.config import settings
+from app.core.tracing import traced
 from app.database import get_db
 from app.models.user_model import User as UserModel
 
 # 定义OAuth2方案，它会告诉FastAPI从哪里“携带”Token
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/v1/users/login/token")
 
+@traced("dependency.get_current_user")
 def get_current_user(token: Annotated[str, Depends(oauth2_scheme)], db: Session = Depends(get_db)) -> UserModel:
     """
     解码Token,并从数据库中获取当前用户对象(SQLAlchemy模型)。
@@ -40,6 +42,7 @@ def get_current_user(token: Annotated[str, Depends(oauth2_scheme)], db: Session
         raise credentials_exception
     return user
 
+@traced("dependency.get_current_admin_user")
 def get_current_admin_user(current_user: Annotated[UserModel, Depends(get_current_user)]) -> UserModel:
     """
     获取当前用户，并验证是否为管理员。
@@ -1,10 +1,15 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, status, Request, Query
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Literal, Optional
 
-from app.crud import crud_actor
-from app.schemas import actor_schema
-from app.database import get_db
+from app.crud import crud_actor, crud_movie, crud_version
+from app.schemas import actor_schema, movie_schema
+from app.database import get_db, get_read_db
+from app.core.rate_limit import rate_limit
+from app.core.serialization import list_response, model_response
+from app.core.tracing import span
+from app.core.pagination import total_from_page, with_total_count
+from app.core.http_cache import make_etag, is_not_modified, not_modified, with_etag
 from app.api.v1.dependencies import get_current_admin_user
 from app.models.user_model import User as UserModel
 
@@ -28,18 +33,59 @@ def create_new_actor(
     return crud_actor.create_actor(db=db, actor=actor)
 
 @router.get("/", response_model=List[actor_schema.ActorRead])
-def read_all_actors(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
+def read_all_actors(
+    skip: int = 0,
+    limit: int = 100,
+    total: bool = Query(False, description="在 X-Total-Count 响应头中返回演员总数"),
+    db: Session = Depends(get_read_db),
+):
     """
     获取演员列表 (公开访问)
     """
-    return crud_actor.get_actors(db, skip=skip, limit=limit)
+    actors = crud_actor.get_actors(db, skip=skip, limit=limit)
+    response = list_response(actor_schema.ActorRead, actors)
+    if total:
+        exact = total_from_page(skip, limit, len(actors))
+        if exact is not None:
+            return with_total_count(response, exact)
+        return with_total_count(response, *crud_actor.count_actors(db))
+    return response
 
 @router.get("/{actor_id}", response_model=actor_schema.ActorRead)
-def read_single_actor(actor_id: int, db: Session = Depends(get_db)):
+def read_single_actor(actor_id: int, request: Request, db: Session = Depends(get_read_db)):
+    version = crud_version.get_actor_version(db, actor_id)
+    if version is None:
+        raise HTTPException(status_code=404, detail="演员未找到")
+    etag = make_etag("actor", actor_id, version)
+    if is_not_modified(request, etag):
+        return not_modified(etag)
+
     db_actor = crud_actor.get_actor(db, actor_id=actor_id)
     if db_actor is None:
         raise HTTPException(status_code=404, detail="演员未找到")
-    return db_actor
+    return with_etag(model_response(actor_schema.ActorRead, db_actor), etag)
+
+@router.get("/{actor_id}/movies", response_model=movie_schema.FilmographyPage)
+def read_actor_movies(
+    actor_id: int,
+    db: Session = Depends(get_read_db),
+    sort_by: Literal["release_year_desc", "rating_desc"] = Query("release_year_desc", description="按上映年份或评分从高到低排序"),
+    cursor: Optional[str] = Query(None, description="上一页返回的 next_cursor, 不传表示第一页"),
+    limit: int = Query(20, ge=1, le=100),
+):
+    """
+    获取演员的作品列表 (公开访问)，每部电影包含完整的演员和导演。
+    使用游标分页: 把响应中的 next_cursor 原样传回即可获取下一页。
+    """
+    if crud_version.get_actor_version(db, actor_id) is None:
+        raise HTTPException(status_code=404, detail="演员未找到")
+    try:
+        movies, next_cursor = crud_movie.get_filmography(
+            db, "actors", actor_id, sort_by=sort_by, cursor=cursor, limit=limit
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return model_response(movie_schema.FilmographyPage, {"items": movies, "next_cursor": next_cursor})
 
 @router.put("/{actor_id}", response_model=actor_schema.ActorRead)
 def update_existing_actor(
@@ -70,7 +116,7 @@ def delete_existing_actor(
         raise HTTPException(status_code=404, detail="演员未找到")
     return db_actor
 
-@router.post("/{actor_id}/photo", response_model=actor_schema.ActorRead)
+@router.post("/{actor_id}/photo", response_model=actor_schema.ActorRead, dependencies=[Depends(rate_limit("upload"))])
 def upload_photo_for_actor(
     actor_id: int,
     file: UploadFile = File(...),
@@ -93,7 +139,7 @@ def upload_photo_for_actor(
     save_path = save_dir / unique_filename
 
     try:
-        with open(save_path, "wb") as buffer:
+        with span("file.write", path=str(save_path)), open(save_path, "wb") as buffer:
             shutil.copyfileobj(file.file, buffer)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"无法保存文件: {e}")
@@ -102,7 +148,8 @@ def upload_photo_for_actor(
     if db_actor.PhotoURL:
         old_photo_filepath = Path(db_actor.PhotoURL.lstrip('/'))
         if old_photo_filepath.exists():
-            old_photo_filepath.unlink()
+            with span("file.delete", path=str(old_photo_filepath)):
+                old_photo_filepath.unlink()
 
     photo_url = f"/static/images/actors/{unique_filename}"
     updated_actor = crud_actor.update_actor_photo(db, actor_id=actor_id, photo_url=photo_url)
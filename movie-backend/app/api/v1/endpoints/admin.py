@@ -0,0 +1,128 @@
+from fastapi import APIRouter, Depends, HTTPException, status
+
+from app.api.v1.dependencies import get_current_admin_user
+from app.core import pool_metrics, single_flight, statement_cache
+from app.core.tracing import tracer
+from app.models.user_model import User as UserModel
+from app.services.jobs import scheduler
+from app.services.catalog import catalog
+from app.services.related import related
+from app.services.affinity import affinity
+from app.services.counts import counts
+from app.services.live import live
+
+router = APIRouter()
+
+@router.get("/pool")
+def read_pool_stats(admin_user: UserModel = Depends(get_current_admin_user)):
+    """
+    查看主库和各副本连接池的实时状态 (需要管理员权限)
+    包括借出数、溢出数、借连接等待时间和连接失效次数。
+    """
+    return [monitor.snapshot() for monitor in pool_metrics.monitors]
+
+@router.post("/pool/reset", status_code=status.HTTP_204_NO_CONTENT)
+def reset_pool_stats(admin_user: UserModel = Depends(get_current_admin_user)):
+    """
+    清空累计的等待时间统计，便于观察调整参数后的效果 (需要管理员权限)
+    """
+    for monitor in pool_metrics.monitors:
+        monitor.reset()
+    return
+
+@router.get("/statement-cache")
+def read_statement_cache_stats(admin_user: UserModel = Depends(get_current_admin_user)):
+    """
+    查看主库和各副本的 SQL 编译缓存命中情况 (需要管理员权限)
+    hit_rate 是复用已编译 SQL 的执行次数占比。
+    """
+    return [monitor.snapshot() for monitor in statement_cache.monitors]
+
+@router.post("/statement-cache/reset", status_code=status.HTTP_204_NO_CONTENT)
+def reset_statement_cache_stats(admin_user: UserModel = Depends(get_current_admin_user)):
+    for monitor in statement_cache.monitors:
+        monitor.reset()
+    return
+
+@router.get("/tracing")
+def read_tracing_stats(admin_user: UserModel = Depends(get_current_admin_user)):
+    """
+    查看请求追踪的状态和按接口汇总的各阶段耗时 (需要管理员权限)
+    phases 只统计记录了 span 的请求(被采样, 或配置了 TRACING_SLOW_MS)，
+    每个接口下按总耗时从高到低列出依赖、SQL、提交、序列化和文件读写等阶段。
+    """
+    return tracer.snapshot()
+
+@router.post("/tracing/reset", status_code=status.HTTP_204_NO_CONTENT)
+def reset_tracing_stats(admin_user: UserModel = Depends(get_current_admin_user)):
+    tracer.reset()
+    return
+
+@router.get("/single-flight")
+def read_single_flight_stats(admin_user: UserModel = Depends(get_current_admin_user)):
+    """
+    查看并发读取合并的统计 (需要管理员权限)
+    coalesced 是等待其他请求结果、没有自己查询数据库的请求数。
+    """
+    return [group.snapshot() for group in single_flight.groups.values()]
+
+@router.post("/single-flight/reset", status_code=status.HTTP_204_NO_CONTENT)
+def reset_single_flight_stats(admin_user: UserModel = Depends(get_current_admin_user)):
+    for group in single_flight.groups.values():
+        group.reset()
+    return
+
+@router.get("/catalog")
+def read_catalog_stats(admin_user: UserModel = Depends(get_current_admin_user)):
+    """
+    查看电影列表内存快照的状态 (需要管理员权限)
+    包括快照中的电影数、由快照回答的查询数、回退到 SQL 的次数和同步次数。
+    """
+    return catalog.snapshot()
+
+@router.get("/related-graph")
+def read_related_graph_stats(admin_user: UserModel = Depends(get_current_admin_user)):
+    """
+    查看相关电影图的状态 (需要管理员权限): 电影数、边数、占用内存以及重建次数和耗时。
+    """
+    return related.snapshot()
+
+@router.get("/affinity")
+def read_affinity_stats(admin_user: UserModel = Depends(get_current_admin_user)):
+    """
+    查看个性化推荐的状态 (需要管理员权限): 内存中的用户数、特征数以及最近一次推荐的耗时。
+    """
+    return affinity.snapshot()
+
+@router.get("/counts")
+def read_count_cache_stats(admin_user: UserModel = Depends(get_current_admin_user)):
+    """
+    查看列表总数缓存的状态 (需要管理员权限): 命中次数、返回估算值的次数和后台精确计数的次数。
+    """
+    return counts.snapshot()
+
+@router.get("/live")
+def read_live_stats(admin_user: UserModel = Depends(get_current_admin_user)):
+    """
+    查看实时更新的状态 (需要管理员权限): 当前 worker 的订阅者数、推送的事件数和因消费太慢被断开的次数。
+    """
+    return live.snapshot()
+
+@router.get("/jobs")
+def read_jobs(admin_user: UserModel = Depends(get_current_admin_user)):
+    """
+    查看后台定时任务的执行计划和运行统计 (需要管理员权限)
+    包括执行次数、失败次数、耗时和最近一次的结果或错误。
+    """
+    return scheduler.snapshot()
+
+@router.post("/jobs/{job_name}/run", status_code=status.HTTP_202_ACCEPTED)
+def run_job(job_name: str, admin_user: UserModel = Depends(get_current_admin_user)):
+    """
+    立即在后台执行一次指定的定时任务 (需要管理员权限)
+    """
+    if job_name not in scheduler.jobs:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if not scheduler.trigger(job_name):
+        raise HTTPException(status_code=409, detail="任务正在运行中")
+    return {"name": job_name, "status": "started"}
@@ -1,10 +1,14 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, status, Request, Query
 from sqlalchemy.orm import Session
 from typing import List
 
-from app.crud import crud_comment
+from app.crud import crud_comment, crud_version
 from app.schemas import comment_schema
-from app.database import get_db
+from app.database import get_db, get_read_db
+from app.core.rate_limit import rate_limit
+from app.core.serialization import list_response
+from app.core.pagination import with_total_count
+from app.core.http_cache import make_etag, is_not_modified, not_modified, with_etag
 from app.api.v1.dependencies import get_current_user
 from app.models.user_model import User as UserModel
 
@@ -15,7 +19,8 @@ router = APIRouter()
     "/movies/{movie_id}/comments",
     response_model=comment_schema.CommentRead,
     status_code=status.HTTP_201_CREATED,
-    summary="为电影添加新评论"
+    summary="为电影添加新评论",
+    dependencies=[Depends(rate_limit("comment"))],
 )
 def create_comment_for_movie(
     movie_id: int,
@@ -27,7 +32,7 @@ def create_comment_for_movie(
     为指定电影添加一条新评论。需要用户登录。
     """
     return crud_comment.create_comment(
-        db=db, comment=comment, user_id=current_user.UserID, movie_id=movie_id
+        db=db, comment=comment, user=current_user, movie_id=movie_id
     )
 
 # 获取单个电影的所有评论
@@ -38,17 +43,29 @@ def create_comment_for_movie(
 )
 def read_comments_for_movie(
     movie_id: int, 
-    db: Session = Depends(get_db), 
+    request: Request,
+    db: Session = Depends(get_read_db), 
     skip: int = 0, 
-    limit: int = 100
+    limit: int = 100,
+    total: bool = Query(False, description="在 X-Total-Count 响应头中返回评论总数"),
 ):
     """
     根据电影ID获取所有评论，支持分页。
+    支持 If-None-Match 条件请求，评论未变化时返回 304。
     """
+    version = crud_version.get_comments_version(db, movie_id)
+    etag = make_etag("comments", movie_id, version, skip, limit)
+    if version is not None and is_not_modified(request, etag):
+        return not_modified(etag)
+
     comments = crud_comment.get_comments_by_movie(db=db, movie_id=movie_id, skip=skip, limit=limit)
-    return comments
+    response = list_response(comment_schema.CommentRead, comments)
+    if total:
+        # 评论数由写评论时维护在 Movies.CommentCount 上，不需要 COUNT(*)
+        with_total_count(response, crud_comment.count_comments(db, movie_id))
+    return with_etag(response, etag) if version is not None else response
 
-@router.put("/comments/{comment_id}", response_model=comment_schema.CommentRead)
+@router.put("/comments/{comment_id}", response_model=comment_schema.CommentRead, dependencies=[Depends(rate_limit("comment"))])
 def update_user_comment(
     comment_id: int,
     comment_update: comment_schema.CommentUpdate,
@@ -1,10 +1,20 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Request, Response
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
-from typing import List, Optional
+from typing import List, Literal, Optional, Tuple
 
-from app.crud import crud_movie
-from app.schemas import movie_schema
-from app.database import get_db
+from app.crud import crud_movie, crud_version, crud_rating
+from app.schemas import movie_schema, rating_schema
+from app.database import SessionLocal, get_db, get_read_db
+from app.services.trending import trending
+from app.services.related import related
+from app.services.live import live, format_event, read_rating_snapshots
+from app.core.config import settings
+from app.core.rate_limit import rate_limit
+from app.core.serialization import list_response, model_response
+from app.core.tracing import span
+from app.core.pagination import total_from_page, with_total_count
+from app.core.http_cache import make_etag, is_not_modified, not_modified, with_etag
 
 from app.crud.crud_view import movie_view
 from app.schemas.view_schemas import MovieDetails
@@ -21,6 +31,35 @@ from pathlib import Path
 
 router = APIRouter()
 
+FIELDS_QUERY = Query(None, description="只返回指定字段, 逗号分隔, 例如: MovieID,Title,CoverURL,AverageRating")
+EXPAND_QUERY = Query(None, description="需要展开的关联关系, 逗号分隔: actors,directors")
+
+def _parse_fieldset(fields: Optional[str], expand: Optional[str]) -> Tuple[Tuple[str, ...], Tuple[str, ...]]:
+    """
+    解析 fields 和 expand 参数。
+    两者都未提供时返回完整字段和全部关系，与原有的响应结构保持一致；
+    只提供 fields 时不展开任何关系。
+    """
+    def split(value: str):
+        return tuple(dict.fromkeys(item.strip() for item in value.split(",") if item.strip()))
+
+    if fields is None:
+        selected_fields = movie_schema.MOVIE_FIELDS
+    else:
+        selected_fields = split(fields)
+        unknown = set(selected_fields) - set(movie_schema.MOVIE_FIELDS)
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"未知字段: {', '.join(sorted(unknown))}")
+
+    if expand is None:
+        selected_expand = movie_schema.MOVIE_RELATIONS if fields is None else ()
+    else:
+        selected_expand = split(expand)
+        unknown = set(selected_expand) - set(movie_schema.MOVIE_RELATIONS)
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"无法展开: {', '.join(sorted(unknown))}")
+    return selected_fields, selected_expand
+
 @router.post("/", response_model=movie_schema.MovieRead, status_code=status.HTTP_201_CREATED)
 def create_new_movie(
     movie: movie_schema.MovieCreate,
@@ -32,63 +71,246 @@ def create_new_movie(
     """
     return crud_movie.create_movie(db=db, movie=movie)
 
+@router.post("/bulk", response_model=movie_schema.MovieBulkResult)
+def bulk_update_movies(
+    request: movie_schema.MovieBulkRequest,
+    dry_run: bool = Query(False, description="只检查并返回每一项的结果, 不提交修改"),
+    db: Session = Depends(get_db),
+    admin_user: UserModel = Depends(get_current_admin_user)
+):
+    """
+    批量删除电影、修改字段、增删演员和导演 (需要管理员权限)。
+    所有修改在一个事务中完成；每一项的结果单独返回，无法执行的项会被跳过并说明原因。
+    """
+    total = len(request.delete) + len(request.update) + len(request.links)
+    if total > settings.BULK_MAX_ITEMS:
+        raise HTTPException(status_code=400, detail=f"一次最多处理 {settings.BULK_MAX_ITEMS} 项")
+    return crud_movie.bulk_apply(db, request, dry_run=dry_run)
+
 @router.get("/", response_model=List[movie_schema.MovieRead])
 def read_all_movies(
-    db: Session = Depends(get_db),
+    request: Request,
+    db: Session = Depends(get_read_db),
     search: Optional[str] = Query(None, description="按电影名、演员或导演名进行搜索"),
     genre: Optional[str] = Query(None, description="按类型/流派筛选，例如：剧情"),
     year: Optional[int] = Query(None, description="按发行年份筛选,例如:1994"),
     min_rating: Optional[float] = Query(None, ge=0, le=10, description="按最低评分筛选,范围0-10"),
+    country: Optional[str] = Query(None, description="按国家/地区筛选, 例如: 美国"),
     sort_by: Optional[str] = Query(None, description="排序方式: 'release_year_desc' 或 'rating_desc'"),
     skip: int = 0, 
     limit: int = 100, 
+    fields: Optional[str] = FIELDS_QUERY,
+    expand: Optional[str] = EXPAND_QUERY,
+    response_format: Optional[Literal["normalized"]] = Query(
+        None, alias="format", description="'normalized': 演员和导演去重后放在顶层, 电影只携带ID列表"
+    ),
+    total: bool = Query(
+        False, description="在 X-Total-Count 响应头中返回总数, X-Total-Count-Exact 为 false 时是估算值"
+    ),
 ):
     """
     获取电影列表，支持按类型、年份和最低评分进行组合查询。
+    可通过 fields 和 expand 只查询和返回需要的字段与关系。
+    支持 If-None-Match 条件请求: ETag 由整个电影表的版本和查询参数生成，
+    电影表没有变化时只执行一次聚合查询并返回 304，同一份内容的压缩结果也按 ETag 缓存。
     """
-    movies = crud_movie.get_movies(
-        db, 
-        genre=genre, 
-        year=year, 
-        min_rating=min_rating,
-        search=search,
-        sort_by=sort_by,
-        skip=skip, 
-        limit=limit
+    selected_fields, selected_expand = _parse_fieldset(fields, expand)
+    filters = dict(genre=genre, year=year, min_rating=min_rating, country=country, search=search)
+    etag = make_etag(
+        "movies", *crud_version.get_movies_catalog_version(db), selected_fields, selected_expand,
+        sorted(filters.items()), sort_by, skip, limit, response_format, total,
     )
-    return movies
+    if is_not_modified(request, etag):
+        return not_modified(etag)
+    if response_format == "normalized":
+        # normalized 格式: 电影本身不加载任何关系
+        movies = crud_movie.get_movies(db, sort_by=sort_by, skip=skip, limit=limit, fields=selected_fields, expand=(), **filters)
+        response = _normalized_movies_response(db, movies, selected_fields, selected_expand)
+    else:
+        movies = crud_movie.get_movies(
+            db,
+            sort_by=sort_by,
+            skip=skip,
+            limit=limit,
+            fields=selected_fields,
+            expand=selected_expand,
+            **filters,
+        )
+        schema = movie_schema.movie_read_model(frozenset(selected_fields), frozenset(selected_expand))
+        response = list_response(schema, movies)
+
+    if total:
+        exact = total_from_page(skip, limit, len(movies))
+        if exact is not None:
+            response = with_total_count(response, exact)
+        else:
+            count = crud_movie.count_movies(db, **filters)
+            response = with_total_count(response, *count)
+            if not count.exact:
+                # 估算的总数之后会变成精确值，响应内容不只取决于电影表的版本
+                return response
+    return with_etag(response, etag)
+
+def _normalized_movies_response(db: Session, movies, fields, expand):
+    """
+    normalized 格式: 按关系类型各用一次查询取回链接行和人员，人员在响应中只出现一次。
+    """
+    relations = crud_movie.get_movie_relations(db, [movie.MovieID for movie in movies], expand)
+    payload = {"movies": []}
+    for movie in movies:
+        item = {name: getattr(movie, name) for name in fields}
+        for relation, (ids_by_movie, _) in relations.items():
+            item[f"{relation[:-1]}_ids"] = ids_by_movie[movie.MovieID]
+        payload["movies"].append(item)
+    for relation, (_, people) in relations.items():
+        payload[relation] = people
+    schema = movie_schema.movie_list_normalized_model(frozenset(fields), frozenset(expand))
+    return model_response(schema, payload)
+
+@router.get("/trending", response_model=List[movie_schema.TrendingMovie])
+def read_trending_movies(
+    db: Session = Depends(get_read_db),
+    window: Literal["1h", "24h", "7d"] = Query("24h", description="热度的时间窗口"),
+    limit: int = Query(20, ge=1, le=100),
+):
+    """
+    获取近期最热门的电影，热度由评分和评论按时间衰减累计。
+    排名直接从内存中读取，只需一次按ID批量查询电影信息。
+    每个 worker 按 TRENDING_PERSIST_INTERVAL 合并其他 worker 的热度，在此之前不同 worker 返回的排名可能略有差异。
+    """
+    ranked = trending.top(window, limit)
+    movies = crud_movie.get_movies_by_ids(db, [movie_id for movie_id, _ in ranked], fields=movie_schema.TRENDING_FIELDS)
+    scores = dict(ranked)
+    items = [
+        {**{name: getattr(movie, name) for name in movie_schema.TRENDING_FIELDS}, "TrendingScore": round(scores[movie.MovieID], 4)}
+        for movie in movies
+    ]
+    return list_response(movie_schema.TrendingMovie, items)
+
+@router.get("/{movie_id}/related", response_model=List[movie_schema.RelatedMovie])
+def read_related_movies(
+    movie_id: int,
+    db: Session = Depends(get_read_db),
+    limit: int = Query(10, ge=1, le=50),
+):
+    """
+    获取与指定电影相关的电影，按共同演员、导演以及类型重合度排序。
+    相似度图预先计算并保存在内存中，读取前 N 名不需要查询关联表。
+    """
+    if crud_version.get_movie_version(db, movie_id) is None:
+        raise HTTPException(status_code=404, detail="电影未找到")
+    ranked = related.top(movie_id, limit)
+    movies = crud_movie.get_movies_by_ids(db, [other for other, _ in ranked], fields=movie_schema.TRENDING_FIELDS)
+    scores = dict(ranked)
+    items = [
+        {**{name: getattr(movie, name) for name in movie_schema.TRENDING_FIELDS}, "RelatedScore": scores[movie.MovieID]}
+        for movie in movies
+    ]
+    return list_response(movie_schema.RelatedMovie, items)
+
+@router.get("/{movie_id}/events", response_class=StreamingResponse)
+def stream_movie_events(movie_id: int):
+    """
+    订阅电影的实时更新 (Server-Sent Events)。
+    连接后先收到一次 rating 事件(当前平均分和评分人数)，之后会收到:
+    rating(评分变化合并后的快照, 最多每 LIVE_RATING_INTERVAL 秒一次)、
+    comment_created / comment_updated / comment_deleted。
+    客户端处理太慢、积压过多事件时会收到 close 事件并被断开。
+    """
+    # 不使用 get_read_db 依赖: 依赖的会话要等响应结束才关闭，每个打开的页面都会一直占用一个连接
+    with SessionLocal() as db:
+        snapshot = read_rating_snapshots(db, [movie_id]).get(movie_id)
+    if snapshot is None:
+        raise HTTPException(status_code=404, detail="电影未找到")
+    # 订阅要在事件循环中进行，这里只准备好初始事件
+    return StreamingResponse(
+        _movie_event_stream(movie_id, [format_event("rating", snapshot)]),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+async def _movie_event_stream(movie_id: int, initial):
+    subscriber = live.subscribe(movie_id)
+    if subscriber is None:
+        yield format_event("close", {"reason": "too_many_subscribers"})
+        return
+    async for message in live.stream(subscriber, initial):
+        yield message
 
 @router.get("/{movie_id}/details", response_model=MovieDetails)
 def read_movie_details(
     *,
-    db: Session = Depends(get_db),
+    request: Request,
+    db: Session = Depends(get_read_db),
     movie_id: int,
 ):
     """
     获取一部电影的完整详细信息 (通过视图 V_MovieDetails)。
     包括电影本身信息、演员列表和导演列表。
+    支持 If-None-Match 条件请求，内容未变化时返回 304。
     """
-   
-    movie_details = movie_view.get_details(db=db, movie_id=movie_id)
+    version = crud_version.get_movie_version(db, movie_id)
+    if version is None:
+        raise HTTPException(
+            status_code=404,
+            detail="Movie with this ID not found",
+        )
+    etag = make_etag("movie-details", movie_id, version)
+    if is_not_modified(request, etag):
+        return not_modified(etag)
 
-    if not movie_details:
+    # 热门电影的并发请求合并为一次查询和序列化
+    content = movie_view.get_details_json(db, movie_id=movie_id, version=version)
+
+    if content is None:
         raise HTTPException(
             status_code=404,
             detail="Movie with this ID not found",
         )
 
-    # FastAPI 会自动使用 MovieDetailsSchema 将返回的 ORM 对象序列化为 JSON
-    return movie_details
+    return with_etag(Response(content=content, media_type="application/json"), etag)
+
+@router.get("/{movie_id}/stats", response_model=rating_schema.MovieRatingStats)
+def read_movie_rating_stats(movie_id: int, request: Request, db: Session = Depends(get_read_db)):
+    """
+    获取电影的评分分布(1-10分各多少人)以及平均分、中位数和标准差。
+    """
+    version = crud_version.get_movie_version(db, movie_id)
+    if version is None:
+        raise HTTPException(status_code=404, detail="电影未找到")
+    etag = make_etag("movie-stats", movie_id, version)
+    if is_not_modified(request, etag):
+        return not_modified(etag)
+
+    stats = crud_rating.get_rating_stats(db, movie_id)
+    if stats is None:
+        raise HTTPException(status_code=404, detail="该电影的评分分布尚未生成")
+    return with_etag(model_response(rating_schema.MovieRatingStats, stats), etag)
 
 @router.get("/{movie_id}", response_model=movie_schema.MovieRead)
-def read_single_movie(movie_id: int, db: Session = Depends(get_db)):
+def read_single_movie(
+    movie_id: int,
+    request: Request,
+    db: Session = Depends(get_read_db),
+    fields: Optional[str] = FIELDS_QUERY,
+    expand: Optional[str] = EXPAND_QUERY,
+):
     """
     获取单个电影的详细信息 (公开访问)
+    支持 If-None-Match 条件请求，内容未变化时只查询版本号并返回 304。
     """
-    db_movie = crud_movie.get_movie(db, movie_id=movie_id)
-    if db_movie is None:
+    selected_fields, selected_expand = _parse_fieldset(fields, expand)
+    version = crud_version.get_movie_version(db, movie_id)
+    if version is None:
         raise HTTPException(status_code=404, detail="电影未找到")
-    return db_movie
+    etag = make_etag("movie", movie_id, version, selected_fields, selected_expand)
+    if is_not_modified(request, etag):
+        return not_modified(etag)
+
+    content = crud_movie.get_movie_json(db, movie_id, version, selected_fields, selected_expand)
+    if content is None:
+        raise HTTPException(status_code=404, detail="电影未找到")
+    return with_etag(Response(content=content, media_type="application/json"), etag)
 
 @router.put("/{movie_id}", response_model=movie_schema.MovieRead)
 def update_existing_movie(
@@ -119,7 +341,7 @@ def delete_existing_movie(
         raise HTTPException(status_code=404, detail="电影未找到")
     return db_movie
 
-@router.post("/{movie_id}/cover", response_model=movie_schema.MovieRead)
+@router.post("/{movie_id}/cover", response_model=movie_schema.MovieRead, dependencies=[Depends(rate_limit("upload"))])
 def upload_cover_for_movie(
     movie_id: int,
     file: UploadFile = File(...), # File(...)表明该参数是必须的
@@ -144,7 +366,7 @@ def upload_cover_for_movie(
 
     # 1. 保存新文件-上下文管理器
     try:
-        with open(save_path, "wb") as buffer:
+        with span("file.write", path=str(save_path)), open(save_path, "wb") as buffer:
             shutil.copyfileobj(file.file, buffer)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"无法保存文件: {e}")
@@ -155,7 +377,8 @@ def upload_cover_for_movie(
         old_cover_filepath = Path(db_movie.CoverURL.lstrip('/'))
         if old_cover_filepath.exists():
             try:
-                old_cover_filepath.unlink() # 删除文件
+                with span("file.delete", path=str(old_cover_filepath)):
+                    old_cover_filepath.unlink() # 删除文件
                 print(f"--- [后端日志] 已成功删除旧封面: {old_cover_filepath} ---")
             except OSError as e:
                 print(f"--- [后端日志] 删除旧封面失败: {e} ---")
@@ -167,7 +390,7 @@ def upload_cover_for_movie(
     return updated_movie
 
 @router.get("/genres/", response_model=List[str])
-def get_all_genres(db: Session = Depends(get_db)):
+def get_all_genres(db: Session = Depends(get_read_db)):
     """
     获取所有不重复的电影类型列表。
     """
@@ -4,12 +4,13 @@ from sqlalchemy.orm import Session
 from app.crud import crud_rating
 from app.schemas import rating_schema
 from app.database import get_db
+from app.core.rate_limit import rate_limit
 from app.api.v1.dependencies import get_current_user
 from app.models.user_model import User as UserModel
 
 router = APIRouter()
 
-@router.post("/movies/{movie_id}/ratings", response_model=rating_schema.RatingRead)
+@router.post("/movies/{movie_id}/ratings", response_model=rating_schema.RatingRead, dependencies=[Depends(rate_limit("rating"))])
 def create_or_update_movie_rating(
     movie_id: int,
     rating: rating_schema.RatingCreate,
@@ -21,7 +22,7 @@ def create_or_update_movie_rating(
     """
     return crud_rating.create_or_update_rating(db=db, rating=rating, user_id=current_user.UserID, movie_id=movie_id)
 
-@router.delete("/movies/{movie_id}/ratings", status_code=status.HTTP_204_NO_CONTENT)
+@router.delete("/movies/{movie_id}/ratings", status_code=status.HTTP_204_NO_CONTENT, dependencies=[Depends(rate_limit("rating"))])
 def delete_movie_rating(
     movie_id: int,
     db: Session = Depends(get_db),
@@ -1,13 +1,17 @@
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, status, Query
 from fastapi.security import OAuth2PasswordRequestForm
 from sqlalchemy.orm import Session
-from typing import Annotated
+from typing import Annotated, List
 
-from app.crud import crud_user
-from app.schemas import user_schema
+from app.crud import crud_movie, crud_user
+from app.schemas import movie_schema, user_schema
 from app.core import security
-from app.database import get_db
+from app.database import get_db, get_read_db
+from app.core.rate_limit import rate_limit
+from app.core.serialization import list_response
+from app.core.tracing import span
+from app.services.affinity import affinity
 # 1. 从新的依赖文件中导入依赖项
 from app.api.v1.dependencies import get_current_user,get_current_admin_user 
 from app.models.user_model import User as UserModel
@@ -20,7 +24,7 @@ from pathlib import Path
 
 router = APIRouter()
 
-@router.post("/register", response_model=user_schema.UserRead, status_code=status.HTTP_201_CREATED)
+@router.post("/register", response_model=user_schema.UserRead, status_code=status.HTTP_201_CREATED, dependencies=[Depends(rate_limit("register"))])
 def register_user(user: user_schema.UserCreate, db: Session = Depends(get_db)):
     """
     用户注册
@@ -36,7 +40,7 @@ def register_user(user: user_schema.UserCreate, db: Session = Depends(get_db)):
     created_user = crud_user.create_user(db=db, user=user)
     return created_user
 
-@router.post("/login/token", response_model=user_schema.Token)
+@router.post("/login/token", response_model=user_schema.Token, dependencies=[Depends(rate_limit("login"))])
 def login_for_access_token(form_data: Annotated[OAuth2PasswordRequestForm, Depends()], db: Session = Depends(get_db)):
     """
     用户登录获取JWT
@@ -59,6 +63,29 @@ def read_users_me(current_user: Annotated[UserModel, Depends(get_current_user)])
     """
     return user_schema.UserRead.model_validate(current_user, from_attributes=True)
 
+@router.get("/me/feed", response_model=List[movie_schema.FeedMovie])
+def read_my_feed(
+    current_user: Annotated[UserModel, Depends(get_current_user)],
+    db: Session = Depends(get_read_db),
+    limit: int = Query(20, ge=1, le=100),
+):
+    """
+    根据当前用户评过分的电影推荐新电影: 偏好的演员、导演和类型越多的电影排得越前，
+    不包含已经评过分的电影。还没有评分时返回空列表。
+    """
+    ranked = affinity.feed(db, current_user.UserID, limit)
+    movies = crud_movie.get_movies_by_ids(db, [movie_id for movie_id, _, _ in ranked], fields=movie_schema.TRENDING_FIELDS)
+    details = {movie_id: (score, because) for movie_id, score, because in ranked}
+    items = [
+        {
+            **{name: getattr(movie, name) for name in movie_schema.TRENDING_FIELDS},
+            "FeedScore": details[movie.MovieID][0],
+            "BecauseMovieID": details[movie.MovieID][1],
+        }
+        for movie in movies
+    ]
+    return list_response(movie_schema.FeedMovie, items)
+
 @router.put("/me", response_model=user_schema.UserRead)
 def update_current_user_info(
     user_update: user_schema.UserUpdate,
@@ -95,7 +122,7 @@ def update_current_user_password(
     # 成功时，不返回任何内容，仅返回204状态码
     return
 
-@router.post("/me/avatar", response_model=user_schema.UserRead)
+@router.post("/me/avatar", response_model=user_schema.UserRead, dependencies=[Depends(rate_limit("upload"))])
 def upload_avatar_for_current_user(
     file: UploadFile = File(...),
     db: Session = Depends(get_db),
@@ -114,7 +141,7 @@ def upload_avatar_for_current_user(
 
     # 1. 保存新文件
     try:
-        with open(save_path, "wb") as buffer:
+        with span("file.write", path=str(save_path)), open(save_path, "wb") as buffer:
             shutil.copyfileobj(file.file, buffer)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"无法保存文件: {e}")
@@ -127,7 +154,8 @@ def upload_avatar_for_current_user(
         # 检查旧文件是否存在，防止因意外情况文件已被删除而报错
         if old_avatar_filepath.exists():
             try:
-                old_avatar_filepath.unlink() # unlink() 就是删除文件
+                with span("file.delete", path=str(old_avatar_filepath)):
+                    old_avatar_filepath.unlink() # unlink() 就是删除文件
                 print(f"--- [后端日志] 已成功删除旧头像: {old_avatar_filepath} ---")
             except OSError as e:
                 # 即使删除失败，也只是打印一个错误，不中断整个上传流程
@@ -0,0 +1,57 @@
+import json
+
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from app.core import pool_metrics
+
+# 不参与过载保护的路径: 静态文件和健康检查
+EXEMPT_PREFIXES = ("/static", "/health")
+# 长连接的事件流(SSE)会一直打开，计入处理中的请求数会很快占满名额，
+# 它们的数量由 LIVE_MAX_SUBSCRIBERS 单独限制
+STREAM_SUFFIXES = ("/events",)
+
+
+class LoadSheddingMiddleware:
+    """
+    全局过载保护(准入控制)。
+    同时处理中的请求数或主库借连接的近期等待时间超过阈值时，
+    新请求直接返回 503 和 Retry-After，而不是继续排队占用连接池。
+    """
+    def __init__(self, app: ASGIApp, max_in_flight: int = 0, max_pool_wait_ms: int = 0, retry_after: int = 2):
+        self.app = app
+        self.max_in_flight = max_in_flight
+        self.max_pool_wait = max_pool_wait_ms / 1000
+        self.retry_after = retry_after
+        self.in_flight = 0
+        self.shed = 0
+
+    def _overloaded(self) -> bool:
+        if self.max_in_flight and self.in_flight >= self.max_in_flight:
+            return True
+        if self.max_pool_wait and pool_metrics.monitors:
+            return pool_metrics.monitors[0].recent_wait() > self.max_pool_wait
+        return False
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or scope["path"].startswith(EXEMPT_PREFIXES) or scope["path"].endswith(STREAM_SUFFIXES):
+            await self.app(scope, receive, send)
+            return
+        if self._overloaded():
+            self.shed += 1
+            body = json.dumps({"detail": "服务器繁忙，请稍后再试"}, ensure_ascii=False).encode("utf-8")
+            await send({
+                "type": "http.response.start",
+                "status": 503,
+                "headers": [
+                    (b"content-type", b"application/json"),
+                    (b"content-length", str(len(body)).encode()),
+                    (b"retry-after", str(self.retry_after).encode()),
+                ],
+            })
+            await send({"type": "http.response.body", "body": body})
+            return
+        self.in_flight += 1
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.in_flight -= 1
@@ -0,0 +1,178 @@
+import gzip
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Tuple
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+# brotli 和 zstandard 是可选依赖，未安装时只协商 gzip
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# 值得压缩的内容类型，图片等已压缩的格式直接跳过
+COMPRESSIBLE_TYPES = ("application/json", "text/", "application/javascript", "application/xml", "image/svg+xml")
+
+
+class CompressedBodyCache:
+    """
+    按 (ETag, 编码) 缓存压缩后的响应体。
+    带 ETag 的响应内容只随版本号变化，同一份内容只需要压缩一次。
+    """
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple[str, str], bytes]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, etag: str, encoding: str) -> Optional[bytes]:
+        with self._lock:
+            body = self._entries.get((etag, encoding))
+            if body is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end((etag, encoding))
+            self.hits += 1
+            return body
+
+    def put(self, etag: str, encoding: str, body: bytes):
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[(etag, encoding)] = body
+            self._entries.move_to_end((etag, encoding))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+def _parse_accept_encoding(header: str) -> Dict[str, float]:
+    accepted = {}
+    for item in header.split(","):
+        parts = item.strip().split(";")
+        coding = parts[0].strip().lower()
+        if not coding:
+            continue
+        quality = 1.0
+        for param in parts[1:]:
+            name, _, value = param.strip().partition("=")
+            if name == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        accepted[coding] = quality
+    return accepted
+
+
+class CompressionMiddleware:
+    """
+    响应压缩中间件，按 Accept-Encoding 协商 br / zstd / gzip。
+    小于 minimum_size 的响应、流式响应(如 SSE)和不可压缩的类型原样返回。
+    压缩级别默认偏向低延迟而不是最高压缩率。
+    """
+    def __init__(
+        self,
+        app: ASGIApp,
+        minimum_size: int = 1024,
+        gzip_level: int = 5,
+        brotli_quality: int = 4,
+        zstd_level: int = 3,
+        cache_entries: int = 512,
+    ):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.cache = CompressedBodyCache(cache_entries)
+        # 按服务端偏好排列的可用编码
+        self.encoders: List[Tuple[str, Callable[[bytes], bytes]]] = []
+        if brotli is not None:
+            self.encoders.append(("br", lambda body: brotli.compress(body, quality=brotli_quality)))
+        if zstandard is not None:
+            compressor = zstandard.ZstdCompressor(level=zstd_level)
+            self.encoders.append(("zstd", compressor.compress))
+        self.encoders.append(("gzip", lambda body: gzip.compress(body, compresslevel=gzip_level, mtime=0)))
+
+    def _negotiate(self, scope: Scope) -> Optional[Tuple[str, Callable[[bytes], bytes]]]:
+        header = Headers(scope=scope).get("accept-encoding", "")
+        if not header:
+            return None
+        accepted = _parse_accept_encoding(header)
+        wildcard = accepted.get("*", 0.0)
+        best = None
+        for encoding, encoder in self.encoders:
+            quality = accepted.get(encoding, wildcard)
+            if quality > 0 and (best is None or quality > best[0]):
+                best = (quality, encoding, encoder)
+        return (best[1], best[2]) if best else None
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        negotiated = self._negotiate(scope)
+        if negotiated is None:
+            await self.app(scope, receive, send)
+            return
+        encoding, encoder = negotiated
+
+        start_message: Optional[Message] = None
+        body_parts: List[bytes] = []
+        passthrough = False
+
+        async def send_wrapper(message: Message):
+            nonlocal start_message, passthrough
+            if passthrough:
+                await send(message)
+                return
+            if message["type"] == "http.response.start":
+                headers = Headers(raw=message["headers"])
+                content_type = headers.get("content-type", "")
+                if (
+                    "content-encoding" in headers
+                    or message["status"] in (204, 304)
+                    or not content_type.startswith(COMPRESSIBLE_TYPES)
+                ):
+                    passthrough = True
+                    await send(message)
+                    return
+                start_message = message
+                return
+            if message["type"] != "http.response.body":
+                await send(message)
+                return
+
+            body_parts.append(message.get("body", b""))
+            if message.get("more_body", False):
+                # 流式响应不做缓冲，原样转发
+                passthrough = True
+                await send(start_message)
+                await send(message)
+                return
+
+            body = b"".join(body_parts)
+            headers = MutableHeaders(raw=start_message["headers"])
+            headers.add_vary_header("Accept-Encoding")
+            if len(body) < self.minimum_size:
+                await send(start_message)
+                await send({"type": "http.response.body", "body": body})
+                return
+
+            etag = headers.get("etag")
+            compressed = self.cache.get(etag, encoding) if etag else None
+            if compressed is None:
+                compressed = encoder(body)
+                if etag:
+                    self.cache.put(etag, encoding, compressed)
+            headers["Content-Encoding"] = encoding
+            headers["Content-Length"] = str(len(compressed))
+            await send(start_message)
+            await send({"type": "http.response.body", "body": compressed})
+
+        await self.app(scope, receive, send_wrapper)
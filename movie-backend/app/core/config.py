@@ -1,6 +1,7 @@
 # BaseSettings是一个基类,继承该类的类将获得读取环境变量和.env的能力
 from pydantic_settings import BaseSettings
 from pathlib import Path # 1. 导入 Path
+from typing import Dict, List
 
 # 构建到 .env 文件的绝对路径
 # 这段代码的意思是：从当前文件(config.py)的位置出发，
@@ -13,6 +14,124 @@ class Settings(BaseSettings):
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 60
 
+    # 只读副本, 多个URL用逗号分隔; 为空时所有读请求都走主库
+    DATABASE_REPLICA_URLS: str = ""
+    REPLICA_HEALTH_CHECK_INTERVAL: int = 30 # 副本健康检查间隔(秒)
+    REPLICA_STICKY_SECONDS: int = 10 # 用户写入后,其读请求固定走主库的时长(秒)
+
+    # 连接池参数, 主库和副本共用
+    DB_POOL_SIZE: int = 20 # 常驻连接数
+    DB_MAX_OVERFLOW: int = 20 # 高峰期允许临时多开的连接数
+    DB_POOL_TIMEOUT: int = 10 # 借连接时最长等待时间(秒)
+    DB_POOL_RECYCLE: int = 3600 # 连接最长存活时间(秒), 需小于 MySQL 的 wait_timeout
+    DB_POOL_PRE_PING: bool = True # 借出前先检测连接是否存活
+    DB_POOL_USE_LIFO: bool = True # 优先复用最近归还的连接, 让空闲连接可以自然超时回收
+    DB_POOL_WARMUP: int = 5 # 启动时预先建立的连接数
+    DB_QUERY_CACHE_SIZE: int = 1200 # SQL 编译缓存的容量(条), 命中率可在 /admin/statement-cache 查看
+
+    # 启动预热和停机排空
+    STARTUP_PRIME_CACHES: bool = True # 启动时执行最热的查询(类型列表、电影列表第一页), 预热编译缓存和内存快照
+    SHUTDOWN_DRAIN_DELAY: float = 0.0 # 收到 SIGTERM 后先等待多久(秒), 让负载均衡发现 /health/ready 不再就绪
+    SHUTDOWN_DRAIN_TIMEOUT: float = 30.0 # 等待处理中的请求结束的最长时间(秒), 包括上面的等待
+
+    # 响应压缩, brotli / zstandard 未安装时只使用 gzip
+    COMPRESSION_MINIMUM_SIZE: int = 1024 # 小于该字节数的响应不压缩
+    COMPRESSION_GZIP_LEVEL: int = 5
+    COMPRESSION_BROTLI_QUALITY: int = 4
+    COMPRESSION_ZSTD_LEVEL: int = 3
+    COMPRESSION_CACHE_ENTRIES: int = 512 # 按 ETag 缓存的压缩结果条数
+
+    # 写接口限流, 格式为 "次数/秒数"; 未列出的接口不限流
+    RATE_LIMIT_ENABLED: bool = True
+    RATE_LIMIT_STORAGE_URL: str = "" # 例如 redis://localhost:6379/0, 为空时使用进程内存储
+    RATE_LIMITS_USER: Dict[str, str] = {
+        "rating": "30/60",
+        "comment": "10/60",
+        "upload": "10/60",
+    }
+    RATE_LIMITS_IP: Dict[str, str] = {
+        "rating": "120/60",
+        "comment": "60/60",
+        "register": "5/3600",
+        "login": "10/60",
+        "upload": "30/60",
+    }
+
+    # 全局过载保护, 超过阈值时直接返回 503; 设为 0 表示不启用对应检查
+    LOAD_SHED_MAX_IN_FLIGHT: int = 200 # 同时处理中的请求数上限
+    LOAD_SHED_MAX_POOL_WAIT_MS: int = 500 # 主库借连接的近期平均等待时间上限
+    LOAD_SHED_RETRY_AFTER: int = 2 # 503 响应中 Retry-After 的秒数
+
+    # 热门电影
+    TRENDING_TOP_K: int = 100 # 每个时间窗口保留的热门电影数
+    TRENDING_RATING_WEIGHT: float = 1.0 # 一次评分贡献的热度
+    TRENDING_COMMENT_WEIGHT: float = 2.0 # 一条评论贡献的热度
+    TRENDING_STATE_PATH: str = str(env_path.parent / "data" / "trending.json") # 热度数据的持久化文件
+    TRENDING_PERSIST_INTERVAL: int = 300 # 持久化间隔(秒)
+
+    # 合并并发的相同读取请求(热门电影详情)
+    SINGLE_FLIGHT_ENABLED: bool = True
+    SINGLE_FLIGHT_WAIT_TIMEOUT: float = 5.0 # 等待首个请求的最长时间(秒), 超时后自己查询
+
+    # 电影列表的内存列式快照(需要安装 numpy), 无法回答的查询回退到 SQL
+    CATALOG_ENABLED: bool = True
+    CATALOG_SYNC_INTERVAL: float = 5.0 # 检查其他 worker 写入的间隔(秒)
+
+    # 相关电影: 按共同演员、导演计算的相似度图
+    RELATED_TOP_K: int = 50 # 每部电影保留的相关电影数
+    RELATED_ACTOR_WEIGHT: float = 1.0 # 每位共同演员贡献的相似度
+    RELATED_DIRECTOR_WEIGHT: float = 2.0 # 每位共同导演贡献的相似度
+    RELATED_GENRE_WEIGHT: float = 0.5 # 类型重合度(Jaccard)的权重, 0 表示不考虑类型
+    RELATED_MAX_PERSON_MOVIES: int = 200 # 参演超过这么多部电影的人员不参与计算
+    RELATED_REBUILD_INTERVAL: int = 3600 # 全量重建的间隔(秒), 用于同步其他 worker 的修改
+
+    # 个性化推荐: 由用户评分汇总出的演员、导演和类型偏好
+    AFFINITY_ACTOR_WEIGHT: float = 1.0
+    AFFINITY_DIRECTOR_WEIGHT: float = 1.5
+    AFFINITY_GENRE_WEIGHT: float = 0.5
+    AFFINITY_MAX_USERS: int = 10000 # 内存中保留偏好数据的用户数
+    AFFINITY_PROFILE_TTL: float = 300.0 # 用户偏好从数据库重新加载的间隔(秒), 用于同步其他 worker 的评分
+    AFFINITY_FEATURE_REFRESH_INTERVAL: float = 30.0 # 电影修改后重建电影特征的最短间隔(秒), 期间使用旧的特征
+
+    # 列表总数(X-Total-Count)
+    COUNT_CACHE_TTL: float = 60.0 # 总数缓存的有效期(秒), 用于同步其他 worker 的写入
+    COUNT_CACHE_MAX_ENTRIES: int = 1000 # 缓存的筛选条件组合数
+    COUNT_BACKGROUND_WORKERS: int = 1 # 后台计算精确总数的线程数(每个线程计算时占用一个主库连接)
+    COUNT_BACKGROUND_QUEUE: int = 16 # 等待和正在计算的精确总数上限, 超过时只返回估算值
+
+    # 电影页面的实时更新(SSE)
+    LIVE_BROKER: str = "local" # worker 之间转发事件: "local" 本机 UDP 转发, "memory" 只在进程内, 或 redis:// 地址
+    LIVE_RELAY_DIR: str = str(env_path.parent / "data" / "live") # "local" 模式下各 worker 登记端口的目录
+    LIVE_QUEUE_SIZE: int = 100 # 每个订阅者最多积压的事件数, 超过后断开
+    LIVE_MAX_SUBSCRIBERS: int = 1000 # 每个 worker 的订阅者上限
+    LIVE_RATING_INTERVAL: float = 1.0 # 评分快照的推送间隔(秒), 期间的多次评分合并为一次
+    LIVE_HEARTBEAT_INTERVAL: float = 15.0 # 没有事件时发送心跳的间隔(秒)
+
+    # 请求追踪
+    TRACING_ENABLED: bool = True # 关闭后不再分配 trace ID, 也不记录任何 span
+    TRACING_SAMPLE_RATE: float = 0.01 # 随机采样的请求比例(0-1), 上游 traceparent 标记为已采样的请求总是采样
+    TRACING_SLOW_MS: float = 0 # 大于 0 时所有请求都记录 span, 耗时超过该值(毫秒)的请求即使未被采样也会导出
+    TRACING_EXPORTER: str = "jsonl" # "jsonl" 写入 JSON Lines 文件, "otlp" 以 OTLP/HTTP JSON 发送给本地 collector
+    TRACING_JSONL_DIR: str = str(env_path.parent / "data" / "traces")
+    TRACING_OTLP_ENDPOINT: str = "http://127.0.0.1:4318/v1/traces"
+    TRACING_SERVICE_NAME: str = "movie-backend"
+    TRACING_MAX_SPANS: int = 500 # 单个请求最多记录的 span 数, 防止循环查询撑大内存
+    TRACING_QUEUE_SIZE: int = 1000 # 等待导出的请求数上限, 超过后丢弃
+    TRACING_EXPORT_INTERVAL: float = 2.0 # 后台批量导出的间隔(秒)
+    TRACING_EXPORT_BATCH_SIZE: int = 100
+
+    # 批量管理操作
+    BULK_MAX_ITEMS: int = 1000 # 一次批量请求中删除、修改和关联操作的总项数上限
+
+    # 后台定时任务
+    SCHEDULER_ENABLED: bool = True
+    SCHEDULER_LOCK_DIR: str = str(env_path.parent / "data" / "locks") # 非 MySQL 数据库时使用的文件锁目录
+    ORPHAN_IMAGE_GRACE_HOURS: int = 24 # 未被引用的图片至少存在多久才会被清理
+
+    @property
+    def replica_urls(self) -> List[str]:
+        return [url.strip() for url in self.DATABASE_REPLICA_URLS.split(",") if url.strip()]
+
     class Config:
         # 3. 使用绝对路径
         env_file = env_path
@@ -0,0 +1,34 @@
+import hashlib
+from typing import Any
+
+from fastapi import Request, Response, status
+
+
+def make_etag(*parts: Any) -> str:
+    """
+    用资源类型、ID、版本号以及影响响应结构的查询参数生成弱 ETag。
+    """
+    digest = hashlib.md5("|".join(str(part) for part in parts).encode("utf-8")).hexdigest()[:16]
+    return f'W/"{digest}"'
+
+
+def is_not_modified(request: Request, etag: str) -> bool:
+    """判断请求头 If-None-Match 是否与当前 ETag 匹配(弱比较)"""
+    header = request.headers.get("If-None-Match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    current = etag.removeprefix("W/")
+    return any(tag.strip().removeprefix("W/") == current for tag in header.split(","))
+
+
+def not_modified(etag: str) -> Response:
+    return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag, "Cache-Control": "no-cache"})
+
+
+def with_etag(response: Response, etag: str) -> Response:
+    # no-cache 表示客户端可以缓存，但每次使用前都要用 If-None-Match 重新验证
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = "no-cache"
+    return response
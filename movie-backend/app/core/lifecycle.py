@@ -0,0 +1,134 @@
+import asyncio
+import signal
+import time
+from typing import Callable, Dict, List, Optional
+
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+
+class Lifecycle:
+    """
+    进程的就绪和停机状态。
+
+    启动时 lifespan 完成连接池预热、缓存预热后调用 mark_ready()，/health/ready 才返回 200；
+    收到 SIGTERM 后先把自己标记为不再就绪(负载均衡据此停止转发新请求)，
+    等处理中的请求结束或超过排空时限后，再把信号交还给服务器原来的处理函数完成退出。
+    """
+    def __init__(self):
+        self.ready = False
+        self.draining = False
+        self.in_flight = 0
+        self.started_at: Optional[float] = None
+        self.ready_at: Optional[float] = None
+        self.warmup: Dict[str, object] = {}
+        self.drain_ms: Optional[float] = None
+        self._drain_callbacks: List[Callable[[], None]] = []
+        self._original_handler = None
+
+    def mark_starting(self):
+        self.ready = False
+        self.draining = False
+        self.started_at = time.monotonic()
+        self.warmup = {}
+
+    def mark_ready(self):
+        self.ready = True
+        self.ready_at = time.monotonic()
+
+    def on_drain(self, callback: Callable[[], None]):
+        """注册开始排空时要执行的回调，例如通知长连接的客户端断开重连到其他实例"""
+        self._drain_callbacks.append(callback)
+
+    # ---------- SIGTERM 排空 ----------
+
+    def install_signal_handler(self, delay: float, timeout: float) -> bool:
+        """
+        接管 SIGTERM。只能在主线程中安装(例如测试客户端在其他线程运行 lifespan 时)，
+        无法安装时返回 False，此时保持服务器默认的停机行为。
+        """
+        loop = asyncio.get_running_loop()
+
+        def handle(signum, frame):
+            if self.draining:
+                # 排空期间再次收到 SIGTERM: 不再等待，立即交给原来的处理函数
+                self._forward(signum)
+                return
+            loop.call_soon_threadsafe(lambda: loop.create_task(self._drain(signum, delay, timeout)))
+
+        try:
+            self._original_handler = signal.getsignal(signal.SIGTERM)
+            signal.signal(signal.SIGTERM, handle)
+        except ValueError:
+            self._original_handler = None
+            return False
+        return True
+
+    def restore_signal_handler(self):
+        if self._original_handler is None:
+            return
+        try:
+            signal.signal(signal.SIGTERM, self._original_handler)
+        except ValueError:
+            pass
+        self._original_handler = None
+
+    async def _drain(self, signum: int, delay: float, timeout: float):
+        start = time.monotonic()
+        self.ready = False
+        self.draining = True
+        print(f"--- [后端日志] 收到停机信号，开始排空 ({self.in_flight} 个请求处理中) ---")
+        for callback in self._drain_callbacks:
+            try:
+                callback()
+            except Exception as e:
+                print(f"--- [后端日志] 排空回调失败: {e} ---")
+        # 先等负载均衡发现实例不再就绪，再等待处理中的请求结束
+        await asyncio.sleep(delay)
+        deadline = start + timeout
+        while self.in_flight > 0 and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+        self.drain_ms = round((time.monotonic() - start) * 1000, 2)
+        if self.in_flight > 0:
+            print(f"--- [后端日志] 排空超时，仍有 {self.in_flight} 个请求未完成 ---")
+        self._forward(signum)
+
+    def _forward(self, signum: int):
+        """恢复原来的信号处理函数并重新发出信号，由服务器按原来的流程停机"""
+        original = self._original_handler
+        self.restore_signal_handler()
+        if callable(original):
+            original(signum, None)
+        else:
+            signal.raise_signal(signum)
+
+    def snapshot(self) -> Dict:
+        now = time.monotonic()
+        return {
+            "ready": self.ready,
+            "draining": self.draining,
+            "in_flight": self.in_flight,
+            "uptime_s": round(now - self.started_at, 1) if self.started_at is not None else None,
+            "startup_ms": round((self.ready_at - self.started_at) * 1000, 2) if self.ready_at and self.started_at else None,
+            "warmup": self.warmup,
+            "drain_ms": self.drain_ms,
+        }
+
+
+class InFlightMiddleware:
+    """统计处理中的 HTTP 请求数，停机排空时据此判断是否可以退出。健康检查本身不计入"""
+    def __init__(self, app: ASGIApp, lifecycle: Lifecycle):
+        self.app = app
+        self.lifecycle = lifecycle
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or scope["path"].startswith("/health"):
+            await self.app(scope, receive, send)
+            return
+        self.lifecycle.in_flight += 1
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.lifecycle.in_flight -= 1
+
+
+lifecycle = Lifecycle()
@@ -0,0 +1,48 @@
+import base64
+import json
+from typing import Any, List, Optional
+
+from fastapi import Response
+
+
+def encode_cursor(*values: Any) -> str:
+    """
+    把上一页最后一行的排序键编码成不透明的游标字符串。
+    Decimal 等无法直接 JSON 序列化的值按字符串保存，由调用方解码时还原类型。
+    """
+    raw = json.dumps([value if isinstance(value, (int, str)) or value is None else str(value) for value in values])
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: Optional[str], length: int) -> Optional[List[Any]]:
+    """解码游标，格式不正确时抛出 ValueError"""
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        values = json.loads(raw)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise ValueError("无效的游标") from e
+    if not isinstance(values, list) or len(values) != length:
+        raise ValueError("无效的游标")
+    return values
+
+
+TOTAL_COUNT_HEADER = "X-Total-Count"
+TOTAL_COUNT_EXACT_HEADER = "X-Total-Count-Exact"
+
+
+def total_from_page(skip: int, limit: int, page_size: int) -> Optional[int]:
+    """
+    不满一页时总数就是 skip + 本页条数，不需要再计数。
+    skip 超出范围得到空页时无法判断总数，返回 None。
+    """
+    if page_size < limit and (page_size > 0 or skip == 0):
+        return skip + page_size
+    return None
+
+
+def with_total_count(response: Response, total: int, exact: bool = True) -> Response:
+    response.headers[TOTAL_COUNT_HEADER] = str(total)
+    response.headers[TOTAL_COUNT_EXACT_HEADER] = "true" if exact else "false"
+    return response
@@ -0,0 +1,153 @@
+import math
+import threading
+import time
+from typing import Dict, List
+
+from sqlalchemy import event
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import QueuePool
+
+from app.core import tracing
+
+
+class PoolMonitor:
+    """
+    统计一个连接池的运行数据：借出等待时间、超时、连接失效次数等。
+    配合 InstrumentedQueuePool 使用，数据通过管理员接口查看，用来决定连接池大小。
+    """
+    def __init__(self, name: str, engine):
+        self.name = name
+        self.engine = engine
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.timeouts = 0
+        self.connects = 0
+        self.invalidations = 0
+        self.soft_invalidations = 0
+        # 最近等待时间的指数滑动平均，用于过载保护
+        self._recent_wait = 0.0
+        self._recent_at = time.monotonic()
+
+        event.listen(engine, "connect", self._on_connect)
+        event.listen(engine, "invalidate", self._on_invalidate)
+        event.listen(engine, "soft_invalidate", self._on_soft_invalidate)
+
+    def _on_connect(self, dbapi_connection, connection_record):
+        with self._lock:
+            self.connects += 1
+
+    def _on_invalidate(self, dbapi_connection, connection_record, exception):
+        with self._lock:
+            self.invalidations += 1
+
+    def _on_soft_invalidate(self, dbapi_connection, connection_record, exception):
+        with self._lock:
+            self.soft_invalidations += 1
+
+    def record_wait(self, seconds: float):
+        with self._lock:
+            self.checkouts += 1
+            self.total_wait += seconds
+            if seconds > self.max_wait:
+                self.max_wait = seconds
+            self._recent_wait = self._decayed_recent_wait() * 0.8 + seconds * 0.2
+            self._recent_at = time.monotonic()
+
+    def record_timeout(self):
+        with self._lock:
+            self.timeouts += 1
+
+    def _decayed_recent_wait(self) -> float:
+        # 没有新的借出时让平均值随时间衰减，避免过载保护在空闲后仍然一直生效
+        return self._recent_wait * math.exp(-(time.monotonic() - self._recent_at) / 5.0)
+
+    def recent_wait(self) -> float:
+        """最近一段时间借连接的平均等待时间(秒)"""
+        return self._decayed_recent_wait()
+
+    @property
+    def avg_wait(self) -> float:
+        return self.total_wait / self.checkouts if self.checkouts else 0.0
+
+    def snapshot(self) -> Dict:
+        pool = self.engine.pool
+        with self._lock:
+            data = {
+                "name": self.name,
+                "checkouts": self.checkouts,
+                "avg_wait_ms": round(self.avg_wait * 1000, 3),
+                "max_wait_ms": round(self.max_wait * 1000, 3),
+                "recent_wait_ms": round(self._decayed_recent_wait() * 1000, 3),
+                "timeouts": self.timeouts,
+                "connects": self.connects,
+                "invalidations": self.invalidations,
+                "soft_invalidations": self.soft_invalidations,
+            }
+        if isinstance(pool, QueuePool):
+            data.update({
+                "pool_size": pool.size(),
+                "checked_out": pool.checkedout(),
+                "checked_in": pool.checkedin(),
+                "overflow": pool.overflow(),
+            })
+        return data
+
+    def reset(self):
+        with self._lock:
+            self.checkouts = 0
+            self.total_wait = 0.0
+            self.max_wait = 0.0
+            self.timeouts = 0
+
+
+class InstrumentedQueuePool(QueuePool):
+    """在 QueuePool 借出连接时计时，把等待时间交给 PoolMonitor"""
+    monitor: "PoolMonitor" = None
+
+    def _do_get(self):
+        start = time.perf_counter_ns()
+        try:
+            connection = super()._do_get()
+        except PoolTimeoutError:
+            if self.monitor is not None:
+                self.monitor.record_timeout()
+            raise
+        end = time.perf_counter_ns()
+        if self.monitor is not None:
+            self.monitor.record_wait((end - start) / 1e9)
+        tracing.record_span("db.pool_checkout", start, end, **{"db.pool": self.monitor.name if self.monitor else ""})
+        return connection
+
+    def recreate(self):
+        # engine.dispose() 会重建连接池，统计对象需要跟着转移过去
+        new_pool = super().recreate()
+        new_pool.monitor = self.monitor
+        return new_pool
+
+
+monitors: List[PoolMonitor] = []
+
+
+def register_engine(name: str, engine) -> PoolMonitor:
+    monitor = PoolMonitor(name, engine)
+    if isinstance(engine.pool, InstrumentedQueuePool):
+        engine.pool.monitor = monitor
+    monitors.append(monitor)
+    return monitor
+
+
+def warm_up_pool(engine, connections: int) -> int:
+    """
+    启动时预先建立指定数量的连接，避免第一批请求承担建连开销。
+    返回实际建立成功的连接数。
+    """
+    opened = []
+    try:
+        for _ in range(connections):
+            opened.append(engine.connect())
+    finally:
+        for conn in opened:
+            conn.close()
+    return len(opened)
@@ -0,0 +1,147 @@
+import math
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+from fastapi import HTTPException, Request, status
+
+from app.core.config import settings
+from app.core.security import get_token_subject
+from app.core.tracing import traced
+
+# redis 是可选依赖，只有配置了 RATE_LIMIT_STORAGE_URL 时才需要
+try:
+    import redis
+except ImportError:
+    redis = None
+
+
+def parse_rate(rate: str) -> Tuple[int, float]:
+    """
+    解析 "次数/秒数" 格式的限流配置，例如 "10/60" 表示每60秒10次。
+    返回 (桶容量, 每秒补充的令牌数)。
+    """
+    count, _, seconds = rate.partition("/")
+    capacity = int(count)
+    period = float(seconds or 1)
+    return capacity, capacity / period
+
+
+class MemoryBucketStore:
+    """
+    进程内的令牌桶存储，只在单个 worker 内生效。
+    桶按最近使用的顺序排列，超过 max_keys 时淘汰最久未使用的一个，每次请求的开销是 O(1)。
+    """
+    def __init__(self, max_keys: int = 100000):
+        self.max_keys = max_keys
+        self._buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, key: str, capacity: int, refill_rate: float) -> Tuple[bool, float]:
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated_at = self._buckets.get(key, (float(capacity), now))
+            tokens = min(float(capacity), tokens + (now - updated_at) * refill_rate)
+            if tokens >= 1:
+                self._buckets[key] = (tokens - 1, now)
+                allowed, retry_after = True, 0.0
+            else:
+                self._buckets[key] = (tokens, now)
+                allowed, retry_after = False, (1 - tokens) / refill_rate
+            self._buckets.move_to_end(key)
+            if len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        return allowed, retry_after
+
+
+# 在 Redis 中原子地完成"补充令牌 + 扣减"，多个 worker 共享同一组令牌桶
+_REDIS_TAKE_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(bucket[1]) or capacity
+local ts = tonumber(bucket[2]) or now
+tokens = math.min(capacity, tokens + (now - ts) * rate)
+local allowed = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+    allowed = 1
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 1)
+return {allowed, tostring(tokens)}
+"""
+
+
+class RedisBucketStore:
+    """
+    共享的令牌桶存储，所有 worker 的计数一致。
+    client 可以是任何兼容 redis-py 接口的对象，本地测试时可以换成替身实现。
+    """
+    def __init__(self, client, prefix: str = "ratelimit:"):
+        self.client = client
+        self.prefix = prefix
+        self._script = client.register_script(_REDIS_TAKE_SCRIPT)
+
+    def take(self, key: str, capacity: int, refill_rate: float) -> Tuple[bool, float]:
+        allowed, tokens = self._script(keys=[self.prefix + key], args=[capacity, refill_rate, time.time()])
+        if int(allowed):
+            return True, 0.0
+        return False, (1 - float(tokens)) / refill_rate
+
+
+def _create_store():
+    if not settings.RATE_LIMIT_STORAGE_URL:
+        return MemoryBucketStore()
+    if redis is None:
+        raise RuntimeError("配置了 RATE_LIMIT_STORAGE_URL 但未安装 redis 包")
+    return RedisBucketStore(redis.Redis.from_url(settings.RATE_LIMIT_STORAGE_URL))
+
+
+store = _create_store()
+
+
+def _client_ip(request: Request) -> str:
+    return request.client.host if request.client else "unknown"
+
+
+def _user_key(request: Request) -> Optional[str]:
+    authorization = request.headers.get("Authorization", "")
+    if authorization.startswith("Bearer "):
+        return get_token_subject(authorization[len("Bearer "):])
+    return None
+
+
+def rate_limit(scope: str):
+    """
+    生成一个限流依赖。
+    已登录用户按用户计数(RATE_LIMITS_USER)，同时所有请求按IP计数(RATE_LIMITS_IP)，
+    任意一个令牌桶耗尽都返回 429 和 Retry-After。
+    """
+    user_rate = settings.RATE_LIMITS_USER.get(scope)
+    ip_rate = settings.RATE_LIMITS_IP.get(scope)
+    user_limit = parse_rate(user_rate) if user_rate else None
+    ip_limit = parse_rate(ip_rate) if ip_rate else None
+
+    @traced(f"dependency.rate_limit.{scope}")
+    def dependency(request: Request):
+        if not settings.RATE_LIMIT_ENABLED:
+            return
+        checks = []
+        if ip_limit:
+            checks.append((f"{scope}:ip:{_client_ip(request)}", ip_limit))
+        user = _user_key(request) if user_limit else None
+        if user:
+            checks.append((f"{scope}:user:{user}", user_limit))
+        for key, (capacity, refill_rate) in checks:
+            allowed, retry_after = store.take(key, capacity, refill_rate)
+            if not allowed:
+                raise HTTPException(
+                    status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                    detail="请求过于频繁，请稍后再试",
+                    headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+                )
+
+    return dependency
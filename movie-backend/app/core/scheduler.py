@@ -0,0 +1,333 @@
+import threading
+import time
+import traceback
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Set
+
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError
+
+# Windows 上没有 fcntl，此时文件锁不生效(开发环境通常只有一个 worker)
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+
+class CronSchedule:
+    """
+    标准5段式 cron 表达式: 分 时 日 月 周(0或7为周日)。
+    支持 *、逗号列表、a-b 范围和 /n 步长。
+    """
+    RANGES = [(0, 59), (0, 23), (1, 31), (1, 12), (0, 6)]
+
+    def __init__(self, expression: str):
+        parts = expression.split()
+        if len(parts) != 5:
+            raise ValueError(f"cron 表达式必须是5段: {expression}")
+        self.expression = expression
+        self.minutes, self.hours, self.days, self.months, self.weekdays = [
+            self._parse_field(part, low, high) for part, (low, high) in zip(parts, self.RANGES)
+        ]
+        self._any_day = parts[2] == "*"
+        self._any_weekday = parts[4] == "*"
+
+    @staticmethod
+    def _parse_field(field: str, low: int, high: int) -> Set[int]:
+        values = set()
+        for item in field.split(","):
+            spec, _, step = item.partition("/")
+            if spec == "*":
+                start, end = low, high
+            elif "-" in spec:
+                start, end = (int(x) for x in spec.split("-"))
+            else:
+                start = end = int(spec)
+            values.update(range(start, end + 1, int(step) if step else 1))
+        if high == 6 and 7 in values:  # 周字段中 7 也表示周日
+            values.discard(7)
+            values.add(0)
+        return values
+
+    def _day_matches(self, moment: datetime) -> bool:
+        day_ok = moment.day in self.days
+        weekday_ok = (moment.weekday() + 1) % 7 in self.weekdays
+        # 与 cron 一致: 日和周都被限定时满足其一即可
+        if self._any_day or self._any_weekday:
+            return day_ok and weekday_ok
+        return day_ok or weekday_ok
+
+    def next_after(self, moment: datetime) -> datetime:
+        candidate = moment.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        limit = candidate + timedelta(days=366 * 5)
+        while candidate < limit:
+            if candidate.month not in self.months or not self._day_matches(candidate):
+                candidate = (candidate + timedelta(days=1)).replace(hour=0, minute=0)
+                continue
+            if candidate.hour not in self.hours:
+                candidate = (candidate + timedelta(hours=1)).replace(minute=0)
+                continue
+            if candidate.minute not in self.minutes:
+                candidate += timedelta(minutes=1)
+                continue
+            return candidate
+        raise ValueError(f"cron 表达式没有可执行的时间: {self.expression}")
+
+
+class Job:
+    """一个定时任务及其运行统计"""
+    def __init__(
+        self,
+        name: str,
+        func: Callable[[], object],
+        interval: Optional[int] = None,
+        cron: Optional[str] = None,
+        single_runner: bool = True,
+    ):
+        if (interval is None) == (cron is None):
+            raise ValueError("interval 和 cron 必须且只能指定一个")
+        self.name = name
+        self.func = func
+        self.interval = interval
+        self.cron = CronSchedule(cron) if cron else None
+        # 为 True 时多个 worker 中同一时间只有一个会执行该任务
+        self.single_runner = single_runner
+        self.next_run = self._compute_next(datetime.now())
+        self.running = False
+        self.runs = 0
+        self.failures = 0
+        self.skipped = 0
+        self.skipped_done = 0
+        self.total_duration = 0.0
+        self.max_duration = 0.0
+        self.last_started: Optional[datetime] = None
+        self.last_duration: Optional[float] = None
+        self.last_result: Optional[str] = None
+        self.last_error: Optional[str] = None
+
+    def _compute_next(self, after: datetime) -> datetime:
+        if self.cron:
+            return self.cron.next_after(after)
+        return after + timedelta(seconds=self.interval)
+
+    def already_ran(self, last_run: Optional[datetime], slot: datetime) -> bool:
+        """
+        其他 worker 是否已经执行过 slot(本 worker 计划的执行时间)这一轮。
+        cron 任务的每一轮在所有 worker 上时间相同; 按间隔执行的任务各 worker 的起点不同，
+        距离上一次执行不足一个间隔就算已经执行过(留出少量余量，避免自己的计时误差跳过正常的一轮)。
+        """
+        if last_run is None:
+            return False
+        if self.cron:
+            return last_run >= slot
+        tolerance = timedelta(seconds=min(60.0, self.interval / 10))
+        return slot - last_run < timedelta(seconds=self.interval) - tolerance
+
+    def snapshot(self) -> Dict:
+        return {
+            "name": self.name,
+            "schedule": self.cron.expression if self.cron else f"every {self.interval}s",
+            "single_runner": self.single_runner,
+            "running": self.running,
+            "next_run": self.next_run.isoformat(timespec="seconds"),
+            "runs": self.runs,
+            "failures": self.failures,
+            "skipped_locked": self.skipped,
+            "skipped_done": self.skipped_done,
+            "last_started": self.last_started.isoformat(timespec="seconds") if self.last_started else None,
+            "last_duration_ms": round(self.last_duration * 1000, 1) if self.last_duration is not None else None,
+            "avg_duration_ms": round(self.total_duration / self.runs * 1000, 1) if self.runs else None,
+            "max_duration_ms": round(self.max_duration * 1000, 1),
+            "last_result": self.last_result,
+            "last_error": self.last_error,
+        }
+
+
+class _MySQLRunRecord:
+    """ScheduledJobRuns 表中的执行记录，使用持有 GET_LOCK 的同一个连接读写"""
+    def __init__(self, conn, name: str):
+        self.conn = conn
+        self.name = name
+
+    def last_run(self) -> Optional[datetime]:
+        try:
+            return self.conn.execute(
+                text("SELECT LastRunAt FROM ScheduledJobRuns WHERE JobName = :name"), {"name": self.name}
+            ).scalar()
+        except DBAPIError as e:
+            # 还没有执行迁移时退回到只防止重叠执行
+            print(f"--- [后端日志] 读取定时任务执行记录失败: {e.orig} ---")
+            self.conn.rollback()
+            return None
+
+    def mark(self, at: datetime):
+        try:
+            self.conn.execute(
+                text(
+                    "INSERT INTO ScheduledJobRuns (JobName, LastRunAt) VALUES (:name, :at) "
+                    "ON DUPLICATE KEY UPDATE LastRunAt = VALUES(LastRunAt)"
+                ),
+                {"name": self.name, "at": at},
+            )
+            self.conn.commit()
+        except DBAPIError as e:
+            print(f"--- [后端日志] 写入定时任务执行记录失败: {e.orig} ---")
+            self.conn.rollback()
+
+
+class _FileRunRecord:
+    """执行记录保存在锁文件的内容中"""
+    def __init__(self, lock_file):
+        self.lock_file = lock_file
+
+    def last_run(self) -> Optional[datetime]:
+        self.lock_file.seek(0)
+        try:
+            return datetime.fromisoformat(self.lock_file.read().strip())
+        except ValueError:
+            return None
+
+    def mark(self, at: datetime):
+        self.lock_file.seek(0)
+        self.lock_file.truncate()
+        self.lock_file.write(at.isoformat())
+        self.lock_file.flush()
+
+
+class Scheduler:
+    """
+    运行在后台线程中的轻量定时任务调度器，随 FastAPI 的 lifespan 启动和停止。
+    多个 uvicorn worker 各自运行一个调度器，single_runner 的任务通过
+    MySQL GET_LOCK(或非 MySQL 数据库时的文件锁)保证同一时间只有一个 worker 执行；
+    持有锁后再读取共享的执行记录(ScheduledJobRuns 表或锁文件的内容)，
+    这一轮已经有其他 worker 执行过时跳过，保证每一轮只执行一次。
+    """
+    def __init__(self, engine, lock_dir: Path):
+        self.engine = engine
+        self.lock_dir = lock_dir
+        self.jobs: Dict[str, Job] = {}
+        self._stop = threading.Event()
+        self._wakeup = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._state_lock = threading.Lock()
+
+    def add_job(self, job: Job):
+        self.jobs[job.name] = job
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name="scheduler", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        self._stop.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _loop(self):
+        while not self._stop.is_set():
+            now = datetime.now()
+            for job in self.jobs.values():
+                if job.next_run <= now:
+                    # 上一次还没执行完的任务跳过本轮
+                    slot = job.next_run
+                    job.next_run = job._compute_next(now)
+                    self._spawn(job, slot)
+            upcoming = min((job.next_run for job in self.jobs.values()), default=now + timedelta(seconds=60))
+            wait = max(0.5, min(60.0, (upcoming - datetime.now()).total_seconds()))
+            self._wakeup.wait(wait)
+            self._wakeup.clear()
+
+    def _spawn(self, job: Job, slot: Optional[datetime] = None) -> bool:
+        with self._state_lock:
+            if job.running:
+                return False
+            job.running = True
+        threading.Thread(target=self._run, args=(job, slot), name=f"job-{job.name}", daemon=True).start()
+        return True
+
+    def trigger(self, name: str) -> bool:
+        """立即在后台执行一次指定任务(不检查本轮是否已经执行过)，任务正在运行时返回 False"""
+        return self._spawn(self.jobs[name])
+
+    def _run(self, job: Job, slot: Optional[datetime]):
+        try:
+            with self._single_runner_lock(job) as (acquired, record):
+                if not acquired:
+                    job.skipped += 1
+                    return
+                if record is not None:
+                    if slot is not None and job.already_ran(record.last_run(), slot):
+                        job.skipped_done += 1
+                        return
+                    record.mark(datetime.now())
+                job.last_started = datetime.now()
+                start = time.perf_counter()
+                try:
+                    result = job.func()
+                    job.last_result = None if result is None else str(result)
+                    job.last_error = None
+                except Exception:
+                    job.failures += 1
+                    job.last_error = traceback.format_exc(limit=5)
+                    print(f"--- [后端日志] 定时任务 {job.name} 执行失败: {job.last_error} ---")
+                finally:
+                    duration = time.perf_counter() - start
+                    job.runs += 1
+                    job.last_duration = duration
+                    job.total_duration += duration
+                    job.max_duration = max(job.max_duration, duration)
+        finally:
+            job.running = False
+
+    @contextmanager
+    def _single_runner_lock(self, job: Job):
+        """返回 (是否拿到锁, 共享的执行记录)；不需要单实例执行或无法共享记录时记录为 None"""
+        if not job.single_runner:
+            yield True, None
+            return
+        if self.engine.dialect.name == "mysql":
+            with self._mysql_lock(job.name) as result:
+                yield result
+        else:
+            with self._file_lock(job.name) as result:
+                yield result
+
+    @contextmanager
+    def _mysql_lock(self, name: str):
+        # GET_LOCK 绑定在连接上，任务执行期间必须一直持有同一个连接
+        lock_name = f"movie-system:job:{name}"
+        with self.engine.connect() as conn:
+            acquired = conn.execute(text("SELECT GET_LOCK(:name, 0)"), {"name": lock_name}).scalar() == 1
+            try:
+                yield acquired, _MySQLRunRecord(conn, name) if acquired else None
+            finally:
+                if acquired:
+                    conn.execute(text("SELECT RELEASE_LOCK(:name)"), {"name": lock_name})
+
+    @contextmanager
+    def _file_lock(self, name: str):
+        if fcntl is None:
+            yield True, None
+            return
+        self.lock_dir.mkdir(parents=True, exist_ok=True)
+        # 以追加方式打开，不清空上一次写入的执行记录
+        with open(self.lock_dir / f"{name}.lock", "a+", encoding="utf-8") as lock_file:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                yield False, None
+                return
+            try:
+                yield True, _FileRunRecord(lock_file)
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def snapshot(self) -> List[Dict]:
+        return [job.snapshot() for job in self.jobs.values()]
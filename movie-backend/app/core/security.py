@@ -1,7 +1,7 @@
 from datetime import datetime, timedelta, timezone
 from typing import Optional
 from passlib.context import CryptContext # Python密码哈希库
-from jose import jwt
+from jose import JWTError, jwt
 from .config import settings
 
 # 密码上下文-哈希算法
@@ -26,4 +26,12 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
         expire = datetime.now(timezone.utc) + timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
     to_encode.update({"exp": expire})
     encoded_jwt = jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
-    return encoded_jwt
\ No newline at end of file
+    return encoded_jwt
+
+def get_token_subject(token: str) -> Optional[str]:
+    """校验JWT并返回其中的sub(用户邮箱),无效时返回None"""
+    try:
+        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+    except JWTError:
+        return None
+    return payload.get("sub")
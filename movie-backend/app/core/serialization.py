@@ -0,0 +1,44 @@
+from functools import lru_cache
+from typing import Any, Iterable, List, Type
+
+from fastapi import Response
+from pydantic import BaseModel, TypeAdapter
+
+from app.core.tracing import span
+
+
+@lru_cache(maxsize=1024)
+def _list_adapter(schema: Type[BaseModel]) -> TypeAdapter:
+    # TypeAdapter 的构建开销较大，每个 schema 只构建一次。
+    # movie_read_model 等按请求参数动态生成的模型被淘汰后会重新生成新的类，
+    # 缓存必须有上限，否则这些旧类和它们的 adapter 永远不会被释放
+    return TypeAdapter(List[schema])
+
+
+def dump_list(schema: Type[BaseModel], items: Iterable[Any]) -> bytes:
+    """
+    把 ORM 对象列表一次性校验为 Pydantic 模型，并直接由 pydantic-core 编码为 JSON 字节。
+    """
+    adapter = _list_adapter(schema)
+    with span("serialize", schema=schema.__name__):
+        models = adapter.validate_python(list(items), from_attributes=True)
+        return adapter.dump_json(models)
+
+
+def list_response(schema: Type[BaseModel], items: Iterable[Any]) -> Response:
+    """
+    列表接口的快速响应路径。
+    直接返回 Response 时 FastAPI 不会再按 response_model 做第二次校验和 jsonable_encoder 转换，
+    response_model 仍然保留在路由上用于生成接口文档。
+    """
+    return Response(content=dump_list(schema, items), media_type="application/json")
+
+
+def dump_model(schema: Type[BaseModel], obj: Any) -> bytes:
+    with span("serialize", schema=schema.__name__):
+        return schema.model_validate(obj, from_attributes=True).model_dump_json().encode("utf-8")
+
+
+def model_response(schema: Type[BaseModel], obj: Any) -> Response:
+    """单个对象的快速响应路径，与 list_response 相同"""
+    return Response(content=dump_model(schema, obj), media_type="application/json")
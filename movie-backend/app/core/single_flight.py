@@ -0,0 +1,118 @@
+import functools
+import threading
+from typing import Any, Callable, Dict, Hashable
+
+from app.core.config import settings
+
+
+class _Call:
+    """一次正在执行的查询，后到的相同请求等待它的结果"""
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: BaseException = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    合并并发的相同查询: 同一个 key 同一时间只执行一次，其余请求等待并共享结果。
+    结果会被多个请求(多个线程)同时使用，被合并的函数应返回不可变的结果(例如序列化好的 bytes)，
+    而不是绑定在某个数据库会话上的 ORM 对象。
+    """
+    def __init__(self, name: str, wait_timeout: float):
+        self.name = name
+        self.wait_timeout = wait_timeout
+        self._calls: Dict[Hashable, _Call] = {}
+        self._lock = threading.Lock()
+        self.executions = 0
+        self.coalesced = 0
+        self.timeouts = 0
+        self.errors = 0
+        self.max_waiters = 0
+
+    def do(self, key: Hashable, func: Callable[[], Any]) -> Any:
+        with self._lock:
+            call = self._calls.get(key)
+            if call is None:
+                call = self._calls[key] = _Call()
+                leader = True
+                self.executions += 1
+            else:
+                leader = False
+                call.waiters += 1
+                self.coalesced += 1
+                self.max_waiters = max(self.max_waiters, call.waiters)
+
+        if not leader:
+            if call.done.wait(self.wait_timeout):
+                if call.error is not None:
+                    raise call.error
+                return call.result
+            # 首个请求迟迟没有返回时不再等待，自己查询一次
+            with self._lock:
+                self.timeouts += 1
+            return func()
+
+        try:
+            call.result = func()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            with self._lock:
+                self.errors += 1
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            total = self.executions + self.coalesced
+            return {
+                "name": self.name,
+                "requests": total,
+                "executions": self.executions,
+                "coalesced": self.coalesced,
+                "coalesced_ratio": round(self.coalesced / total, 4) if total else 0.0,
+                "max_waiters": self.max_waiters,
+                "wait_timeouts": self.timeouts,
+                "errors": self.errors,
+                "in_flight": len(self._calls),
+            }
+
+    def reset(self):
+        with self._lock:
+            self.executions = 0
+            self.coalesced = 0
+            self.timeouts = 0
+            self.errors = 0
+            self.max_waiters = 0
+
+
+groups: Dict[str, SingleFlight] = {}
+
+
+def single_flight(name: str, key: Callable[..., Hashable]):
+    """
+    把一个 crud 读取函数变成 single-flight: key 接收与被装饰函数相同的参数，返回用于判断
+    "相同请求"的值(通常不包含 db 会话)。并发调用中 key 相同的只会真正执行一次。
+
+        @single_flight("movie", key=lambda db, movie_id, version: (movie_id, version))
+        def get_movie_json(db: Session, movie_id: int, version: int) -> Optional[bytes]:
+            ...
+    """
+    group = groups.setdefault(name, SingleFlight(name, settings.SINGLE_FLIGHT_WAIT_TIMEOUT))
+
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not settings.SINGLE_FLIGHT_ENABLED:
+                return func(*args, **kwargs)
+            return group.do(key(*args, **kwargs), lambda: func(*args, **kwargs))
+
+        wrapper.single_flight = group
+        return wrapper
+
+    return decorator
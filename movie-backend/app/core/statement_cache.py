@@ -0,0 +1,54 @@
+import threading
+from typing import Dict, List
+
+from sqlalchemy import event
+
+
+class StatementCacheMonitor:
+    """
+    统计一个引擎的 SQL 编译缓存命中情况。
+    每条语句执行时 SQLAlchemy 会在执行上下文中记录这次是否命中了编译缓存:
+    CACHE_HIT 表示直接复用了已编译的 SQL，CACHE_MISS 表示重新编译后放入缓存，
+    NO_CACHE_KEY / CACHING_DISABLED 表示这条语句无法缓存，每次都要编译。
+    命中率持续偏低说明有查询在每次调用时生成了结构不同的语句，或者缓存容量(DB_QUERY_CACHE_SIZE)不够。
+    """
+    def __init__(self, name: str, engine):
+        self.name = name
+        self.engine = engine
+        self._lock = threading.Lock()
+        self.counts: Dict[str, int] = {}
+        event.listen(engine, "after_cursor_execute", self._on_execute)
+
+    def _on_execute(self, conn, cursor, statement, parameters, context, executemany):
+        if context is None or getattr(context, "compiled", None) is None:
+            key = "RAW_SQL"
+        else:
+            key = getattr(context.cache_hit, "name", str(context.cache_hit))
+        with self._lock:
+            self.counts[key] = self.counts.get(key, 0) + 1
+
+    def snapshot(self) -> Dict:
+        cache = self.engine._compiled_cache
+        with self._lock:
+            counts = dict(self.counts)
+        compiled = sum(value for key, value in counts.items() if key != "RAW_SQL")
+        return {
+            "name": self.name,
+            "executions": counts,
+            "hit_rate": round(counts.get("CACHE_HIT", 0) / compiled, 4) if compiled else None,
+            "cache_entries": len(cache) if cache is not None else None,
+            "cache_capacity": getattr(cache, "capacity", None),
+        }
+
+    def reset(self):
+        with self._lock:
+            self.counts = {}
+
+
+monitors: List[StatementCacheMonitor] = []
+
+
+def register_engine(name: str, engine) -> StatementCacheMonitor:
+    monitor = StatementCacheMonitor(name, engine)
+    monitors.append(monitor)
+    return monitor
@@ -0,0 +1,530 @@
+import functools
+import inspect
+import json
+import os
+import queue
+import random
+import re
+import threading
+import time
+import urllib.request
+from contextvars import ContextVar
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+from sqlalchemy import event
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from app.core.config import settings
+
+TRACE_ID_HEADER = "X-Trace-Id"
+# 不追踪的路径: 健康检查的调用频率高且没有分析价值
+EXEMPT_PREFIXES = ("/health",)
+_TRACEPARENT = re.compile(r"^[0-9a-f]{2}-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$")
+_MAX_STATEMENT_LENGTH = 500
+
+
+class Span:
+    __slots__ = ("name", "span_id", "parent_id", "start", "end", "attributes", "error")
+
+    def __init__(self, name: str, parent_id: Optional[str], attributes: Dict):
+        self.name = name
+        self.span_id = f"{random.getrandbits(64):016x}"
+        self.parent_id = parent_id
+        self.start = time.perf_counter_ns()
+        self.end: Optional[int] = None
+        self.attributes = attributes
+        self.error: Optional[str] = None
+
+
+class Trace:
+    """
+    一个请求的追踪记录。recording 为 False 时只分配 trace_id(写入响应头便于对照日志)，不记录任何 span。
+    所有 span 使用 perf_counter 计时，导出时按请求开始时的墙上时间换算成绝对时间。
+    """
+    def __init__(self, trace_id: str, remote_parent_id: Optional[str], sampled: bool, recording: bool):
+        self.trace_id = trace_id
+        self.remote_parent_id = remote_parent_id
+        self.sampled = sampled
+        self.recording = recording
+        self.wall_start = time.time_ns()
+        self.perf_start = time.perf_counter_ns()
+        self.spans: List[Span] = []
+        self.dropped_spans = 0
+
+    def add(self, span: Span) -> bool:
+        if len(self.spans) >= settings.TRACING_MAX_SPANS:
+            self.dropped_spans += 1
+            return False
+        self.spans.append(span)
+        return True
+
+    def unix_ns(self, perf_ns: int) -> int:
+        return self.wall_start + (perf_ns - self.perf_start)
+
+
+_current_trace: ContextVar[Optional[Trace]] = ContextVar("current_trace", default=None)
+_current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+
+# ---------- 记录 span ----------
+
+class _NullSpan:
+    def __enter__(self):
+        return None
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _SpanContext:
+    __slots__ = ("trace", "span", "token")
+
+    def __init__(self, trace: Trace, name: str, attributes: Dict):
+        parent = _current_span.get()
+        self.trace = trace
+        self.span = Span(name, parent.span_id if parent is not None else trace.remote_parent_id, attributes)
+        self.token = None
+
+    def __enter__(self) -> Span:
+        if self.trace.add(self.span):
+            self.token = _current_span.set(self.span)
+        return self.span
+
+    def __exit__(self, exc_type, exc, tb):
+        self.span.end = time.perf_counter_ns()
+        if exc is not None:
+            self.span.error = f"{exc_type.__name__}: {exc}"
+        if self.token is not None:
+            _current_span.reset(self.token)
+        return False
+
+
+def span(name: str, **attributes):
+    """
+    记录一段代码的耗时，嵌套的 span 自动成为子 span。
+    当前请求没有被采样时返回一个空的上下文管理器，几乎没有开销。
+    """
+    trace = _current_trace.get()
+    if trace is None:
+        return _NULL_SPAN
+    return _SpanContext(trace, name, attributes)
+
+
+def start_span(name: str, **attributes) -> Optional[Span]:
+    """
+    开始一个 span 但不把它设为当前 span，用于在成对的事件回调(例如 SQL 执行前后)中计时。
+    需要调用 end_span 结束。
+    """
+    trace = _current_trace.get()
+    if trace is None:
+        return None
+    parent = _current_span.get()
+    span = Span(name, parent.span_id if parent is not None else trace.remote_parent_id, attributes)
+    return span if trace.add(span) else None
+
+
+def end_span(span: Optional[Span], error: Optional[BaseException] = None):
+    if span is None:
+        return
+    span.end = time.perf_counter_ns()
+    if error is not None:
+        span.error = f"{type(error).__name__}: {error}"
+
+
+def record_span(name: str, start_ns: int, end_ns: int, **attributes):
+    """记录一段已经结束的耗时(perf_counter_ns)，用于无法包在 with 中的代码"""
+    span = start_span(name, **attributes)
+    if span is not None:
+        span.start, span.end = start_ns, end_ns
+
+
+def traced(name: str):
+    """
+    给函数加上 span 的装饰器，支持普通函数、协程和生成器函数(FastAPI 的 yield 依赖)。
+    生成器只统计到第一次 yield 为止，即依赖的准备阶段。
+    保留原函数的签名，FastAPI 按原来的方式解析参数和决定是否在线程池中运行。
+    """
+    def decorator(func: Callable):
+        if inspect.isgeneratorfunction(func):
+            @functools.wraps(func)
+            def generator_wrapper(*args, **kwargs):
+                generator = func(*args, **kwargs)
+                with span(name):
+                    value = next(generator)
+                # 把之后的 send/throw/close 原样转交给原生成器
+                while True:
+                    try:
+                        sent = yield value
+                    except GeneratorExit:
+                        generator.close()
+                        raise
+                    except BaseException as exc:
+                        try:
+                            value = generator.throw(exc)
+                        except StopIteration:
+                            return
+                    else:
+                        try:
+                            value = generator.send(sent)
+                        except StopIteration:
+                            return
+            return generator_wrapper
+
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with span(name):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+# ---------- 数据库 ----------
+
+def instrument_engine(name: str, engine):
+    """每条 SQL 记录为一个 db.query span"""
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if context is not None:
+            context._trace_span = start_span(
+                "db.query", **{"db.engine": name, "db.statement": statement[:_MAX_STATEMENT_LENGTH]}
+            )
+
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if context is not None:
+            end_span(getattr(context, "_trace_span", None))
+
+    def handle_error(exception_context):
+        context = exception_context.execution_context
+        if context is not None:
+            end_span(getattr(context, "_trace_span", None), exception_context.original_exception)
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", after_cursor_execute)
+    event.listen(engine, "handle_error", handle_error)
+
+
+def instrument_sessionmaker(factory):
+    """提交记录为一个 db.commit span，时间包括提交前的 flush(flush 发出的 SQL 另外记录)"""
+    def before_commit(session):
+        session.info["_trace_commit"] = start_span("db.commit")
+
+    def after_commit(session):
+        end_span(session.info.pop("_trace_commit", None))
+
+    def after_rollback(session):
+        end_span(session.info.pop("_trace_commit", None))
+
+    event.listen(factory, "before_commit", before_commit)
+    event.listen(factory, "after_commit", after_commit)
+    event.listen(factory, "after_rollback", after_rollback)
+
+
+# ---------- 导出 ----------
+
+class JsonLinesSink:
+    """每个请求一行 JSON，按日期和进程号分文件，便于用 jq 等工具直接分析"""
+    def __init__(self, directory: Path):
+        self.directory = directory
+
+    def export(self, traces: List[Dict]):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        path = self.directory / f"traces-{datetime.now():%Y%m%d}-{os.getpid()}.jsonl"
+        with open(path, "a", encoding="utf-8") as file:
+            for trace in traces:
+                file.write(json.dumps(trace, ensure_ascii=False, default=str) + "\n")
+
+
+def _otlp_value(value) -> Dict:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+class OtlpHttpSink:
+    """
+    以 OTLP/HTTP 的 JSON 编码发送给本地的 collector(例如 OpenTelemetry Collector、Jaeger、Tempo 的 4318 端口)，
+    不依赖 OpenTelemetry SDK。
+    """
+    def __init__(self, endpoint: str, service_name: str, timeout: float = 5.0):
+        self.endpoint = endpoint
+        self.service_name = service_name
+        self.timeout = timeout
+
+    def export(self, traces: List[Dict]):
+        spans = []
+        for trace in traces:
+            for index, item in enumerate(trace["spans"]):
+                otlp_span = {
+                    "traceId": trace["trace_id"],
+                    "spanId": item["span_id"],
+                    "name": item["name"],
+                    # 第一个是请求的根 span(服务端), 其余是内部 span
+                    "kind": 2 if index == 0 else 1,
+                    "startTimeUnixNano": str(item["start_unix_ns"]),
+                    "endTimeUnixNano": str(item["end_unix_ns"]),
+                    "attributes": [{"key": key, "value": _otlp_value(value)} for key, value in item["attributes"].items()],
+                }
+                if item["parent_id"]:
+                    otlp_span["parentSpanId"] = item["parent_id"]
+                if item["error"]:
+                    otlp_span["status"] = {"code": 2, "message": item["error"]}
+                spans.append(otlp_span)
+        body = {
+            "resourceSpans": [{
+                "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": self.service_name}}]},
+                "scopeSpans": [{"scope": {"name": "app.core.tracing"}, "spans": spans}],
+            }]
+        }
+        request = urllib.request.Request(
+            self.endpoint,
+            data=json.dumps(body).encode("utf-8"),
+            headers={"Content-Type": "application/json"},
+            method="POST",
+        )
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            response.read()
+
+
+def _create_sink():
+    if settings.TRACING_EXPORTER == "otlp":
+        return OtlpHttpSink(settings.TRACING_OTLP_ENDPOINT, settings.TRACING_SERVICE_NAME)
+    return JsonLinesSink(Path(settings.TRACING_JSONL_DIR))
+
+
+# ---------- 采样和汇总 ----------
+
+class Tracer:
+    """
+    决定每个请求是否采样，收集结束的追踪记录，在后台线程中批量导出，并按接口汇总各阶段的耗时。
+
+    采样规则:
+    - 上游通过 traceparent 请求头传入且标记为已采样的请求总是采样；
+    - 其余请求按 TRACING_SAMPLE_RATE 的比例随机采样；
+    - TRACING_SLOW_MS 大于 0 时所有请求都记录 span，未被采样但耗时超过阈值的请求也会导出，
+      这样偶发的慢请求不会因为采样率低而错过，代价是每个请求都要记录 span。
+    导出队列满时丢弃新的记录，不阻塞请求。
+    """
+    def __init__(self):
+        self._queue: "queue.Queue[Dict]" = queue.Queue(maxsize=settings.TRACING_QUEUE_SIZE)
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self.sink = None
+        # {接口: {span 名称: [次数, 总耗时(ns), 最大耗时(ns)]}}
+        self._phases: Dict[str, Dict[str, List[int]]] = {}
+
+        self.started = 0
+        self.recorded = 0
+        self.exported = 0
+        self.dropped = 0
+        self.export_errors = 0
+
+    # ---------- 生命周期 ----------
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self.sink = _create_sink()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="trace-exporter", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """停止后台线程，并导出队列中剩余的记录"""
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join(timeout=settings.TRACING_EXPORT_INTERVAL + 5)
+        self._thread = None
+
+    # ---------- 请求 ----------
+
+    def begin(self, traceparent: Optional[str]) -> Trace:
+        self.started += 1
+        match = _TRACEPARENT.match(traceparent or "")
+        if match and match.group(1) != "0" * 32:
+            trace_id, parent_id = match.group(1), match.group(2)
+            parent_sampled = bool(int(match.group(3), 16) & 1)
+        else:
+            trace_id, parent_id, parent_sampled = f"{random.getrandbits(128):032x}", None, False
+        sampled = parent_sampled or random.random() < settings.TRACING_SAMPLE_RATE
+        recording = sampled or settings.TRACING_SLOW_MS > 0
+        return Trace(trace_id, parent_id, sampled, recording)
+
+    def finish(self, trace: Trace, root: Span, route: str):
+        if not trace.recording:
+            return
+        with self._lock:
+            self.recorded += 1
+            phases = self._phases.setdefault(route, {})
+            for item in trace.spans:
+                if item.end is None:
+                    continue
+                duration = item.end - item.start
+                stats = phases.setdefault(item.name, [0, 0, 0])
+                stats[0] += 1
+                stats[1] += duration
+                if duration > stats[2]:
+                    stats[2] = duration
+        duration_ms = (root.end - root.start) / 1e6
+        slow = settings.TRACING_SLOW_MS > 0 and duration_ms >= settings.TRACING_SLOW_MS
+        if not (trace.sampled or slow):
+            return
+        if self._thread is None:
+            self.start()
+        try:
+            self._queue.put_nowait(self._serialize(trace, root, route, duration_ms))
+        except queue.Full:
+            self.dropped += 1
+
+    @staticmethod
+    def _serialize(trace: Trace, root: Span, route: str, duration_ms: float) -> Dict:
+        spans = []
+        for item in trace.spans:
+            end = item.end if item.end is not None else root.end
+            spans.append({
+                "name": item.name,
+                "span_id": item.span_id,
+                "parent_id": item.parent_id,
+                "offset_ms": round((item.start - root.start) / 1e6, 3),
+                "duration_ms": round((end - item.start) / 1e6, 3),
+                "start_unix_ns": trace.unix_ns(item.start),
+                "end_unix_ns": trace.unix_ns(end),
+                "attributes": item.attributes,
+                "error": item.error,
+            })
+        return {
+            "trace_id": trace.trace_id,
+            "remote_parent_id": trace.remote_parent_id,
+            "route": route,
+            "start": datetime.fromtimestamp(trace.wall_start / 1e9).isoformat(timespec="milliseconds"),
+            "duration_ms": round(duration_ms, 3),
+            "sampled": trace.sampled,
+            "dropped_spans": trace.dropped_spans,
+            "spans": spans,
+        }
+
+    # ---------- 导出线程 ----------
+
+    def _run(self):
+        while True:
+            stopping = self._stop.wait(settings.TRACING_EXPORT_INTERVAL)
+            self._flush()
+            if stopping:
+                return
+
+    def _flush(self):
+        while True:
+            batch = []
+            while len(batch) < settings.TRACING_EXPORT_BATCH_SIZE:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            if not batch:
+                return
+            try:
+                self.sink.export(batch)
+                self.exported += len(batch)
+            except Exception as e:
+                self.export_errors += 1
+                print(f"--- [后端日志] 导出追踪记录失败: {e} ---")
+
+    # ---------- 统计 ----------
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            phases = {
+                route: {
+                    name: {
+                        "count": count,
+                        "avg_ms": round(total / count / 1e6, 3),
+                        "max_ms": round(maximum / 1e6, 3),
+                        "total_ms": round(total / 1e6, 3),
+                    }
+                    for name, (count, total, maximum) in sorted(items.items(), key=lambda item: -item[1][1])
+                }
+                for route, items in self._phases.items()
+            }
+        return {
+            "enabled": settings.TRACING_ENABLED,
+            "exporter": settings.TRACING_EXPORTER,
+            "sample_rate": settings.TRACING_SAMPLE_RATE,
+            "slow_ms": settings.TRACING_SLOW_MS,
+            "requests": self.started,
+            "recorded": self.recorded,
+            "exported": self.exported,
+            "queued": self._queue.qsize(),
+            "dropped": self.dropped,
+            "export_errors": self.export_errors,
+            "phases": phases,
+        }
+
+    def reset(self):
+        with self._lock:
+            self._phases = {}
+
+
+tracer = Tracer()
+
+
+class TracingMiddleware:
+    """
+    为每个 HTTP 请求分配 trace ID(在 X-Trace-Id 响应头中返回)，采样的请求记录一个覆盖整个请求的根 span，
+    请求处理过程中的依赖、SQL、序列化和文件读写 span 都挂在它下面。
+    """
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or not settings.TRACING_ENABLED or scope["path"].startswith(EXEMPT_PREFIXES):
+            await self.app(scope, receive, send)
+            return
+
+        traceparent = None
+        for key, value in scope["headers"]:
+            if key == b"traceparent":
+                traceparent = value.decode("latin-1").strip().lower()
+                break
+        trace = tracer.begin(traceparent)
+        trace_token = _current_trace.set(trace if trace.recording else None)
+        root = Span("http.request", trace.remote_parent_id, {"http.method": scope["method"], "http.target": scope["path"]})
+        if trace.recording:
+            trace.add(root)
+        span_token = _current_span.set(root)
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                message.setdefault("headers", [])
+                message["headers"] = [*message["headers"], (TRACE_ID_HEADER.lower().encode(), trace.trace_id.encode())]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            root.end = time.perf_counter_ns()
+            _current_span.reset(span_token)
+            _current_trace.reset(trace_token)
+            # 路由匹配后 scope 中有路由对象, 按路径模板汇总, 不会因为路径参数不同而分散
+            route_path = getattr(scope.get("route"), "path", None) or "<unmatched>"
+            root.attributes["http.route"] = route_path
+            root.attributes["http.status_code"] = status_code
+            tracer.finish(trace, root, f"{scope['method']} {route_path}")
@@ -1,38 +1,66 @@
+from functools import lru_cache
+from sqlalchemy import bindparam, func, select, update
 from sqlalchemy.orm import Session
 from app.models import actor_model
 from app.schemas import actor_schema
+from app.crud import crud_version
+from app.services.related import related
+from app.services.counts import TotalCount, counts
 
 def create_actor(db: Session, actor: actor_schema.ActorCreate):
     db_actor = actor_model.Actor(**actor.model_dump())
     db.add(db_actor)
     db.commit()
-    db.refresh(db_actor)
+    counts.invalidate("actors")
     return db_actor
 
 def get_actor(db: Session, actor_id: int):
-    return db.query(actor_model.Actor).filter(actor_model.Actor.ActorID == actor_id).first()
+    # 按主键读取, 同一会话中已加载过的对象直接从 identity map 返回, 不再查询
+    return db.get(actor_model.Actor, actor_id)
+
+# 列表语句只构建一次, 分页参数通过 bindparam 传入
+@lru_cache(maxsize=None)
+def _actors_page_statement():
+    return select(actor_model.Actor).offset(bindparam("skip")).limit(bindparam("limit"))
 
 def get_actors(db: Session, skip: int = 0, limit: int = 100):
-    return db.query(actor_model.Actor).offset(skip).limit(limit).all()
+    return db.scalars(_actors_page_statement(), {"skip": skip, "limit": limit}).all()
+
+def count_actors(db: Session) -> TotalCount:
+    """演员总数，缓存到下一次新增或删除"""
+    return counts.get_or_count(
+        "actors", None, db, lambda session: session.execute(select(func.count()).select_from(actor_model.Actor)).scalar_one()
+    )
 
 def update_actor(db: Session, actor_id: int, actor_update: actor_schema.ActorUpdate):
-    db_actor = get_actor(db, actor_id)
-    if not db_actor:
-        return None
+    """
+    直接执行 UPDATE ... WHERE, 由影响行数判断演员是否存在，不需要先查询一次。
+    """
+    Actor = actor_model.Actor
     update_data = actor_update.model_dump(exclude_unset=True)
-    for key, value in update_data.items():
-        setattr(db_actor, key, value)
-    db.add(db_actor)
+    result = db.execute(
+        update(Actor)
+        .where(Actor.ActorID == actor_id)
+        .values(**update_data, Version=Actor.Version + 1)
+        .execution_options(synchronize_session=False)
+    )
+    if result.rowcount == 0:
+        db.rollback()
+        return None
+    crud_version.bump_movies_of_actor(db, actor_id)
     db.commit()
-    db.refresh(db_actor)
-    return db_actor
+    return db.get(Actor, actor_id, populate_existing=True)
 
 def delete_actor(db: Session, actor_id: int):
     db_actor = get_actor(db, actor_id)
     if not db_actor:
         return None
+    crud_version.bump_movies_of_actor(db, actor_id)
     db.delete(db_actor)
     db.commit()
+    # 删除演员会级联删除多部电影的关联，相关电影图在下一次读取时全量重建
+    related.mark_stale()
+    counts.invalidate("actors")
     return db_actor
 
 def update_actor_photo(db: Session, actor_id: int, photo_url: str) -> actor_model.Actor:
@@ -40,6 +68,7 @@ def update_actor_photo(db: Session, actor_id: int, photo_url: str) -> actor_mode
     db_actor = get_actor(db, actor_id=actor_id)
     if db_actor:
         db_actor.PhotoURL = photo_url
+        db_actor.Version = actor_model.Actor.Version + 1
+        crud_version.bump_movies_of_actor(db, actor_id)
         db.commit()
-        db.refresh(db_actor)
     return db_actor
\ No newline at end of file
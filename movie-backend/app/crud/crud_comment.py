@@ -1,53 +1,91 @@
+from functools import lru_cache
+from sqlalchemy import bindparam, func, select, update
 from sqlalchemy.orm import Session, joinedload
-from app.models import comment_model
+from app.models import comment_model, movie_model, user_model
 from app.schemas import comment_schema
+from app.crud import crud_version
+from app.services.trending import trending
+from app.services.live import live
 
-def create_comment(db: Session, comment: comment_schema.CommentCreate, user_id: int, movie_id: int):
+def _publish(event_type: str, db_comment: comment_model.Comment):
+    """把评论推送给正在查看这部电影的客户端"""
+    payload = comment_schema.CommentRead.model_validate(db_comment).model_dump(mode="json")
+    live.comment_event(db_comment.MovieID, event_type, payload)
+
+def _update_comment_stats(db: Session, movie_id: int, **values):
+    """
+    在同一条 UPDATE 中维护电影的评论数、最新评论指针和版本号。
+    电影详情包含评论数，所以电影本身的版本号也要加一。
+    """
+    Movie = movie_model.Movie
+    db.execute(
+        update(Movie)
+        .where(Movie.MovieID == movie_id)
+        .values(Version=Movie.Version + 1, CommentsVersion=Movie.CommentsVersion + 1, **values)
+        .execution_options(synchronize_session=False)
+    )
+
+def create_comment(db: Session, comment: comment_schema.CommentCreate, user: user_model.User, movie_id: int):
     """
-    创建评论，并确保返回的对象包含完整的用户信息。
+    创建评论。直接挂上调用方已经加载的当前用户，返回的对象自带用户信息，不需要再查询一次。
     """
     db_comment = comment_model.Comment(
         Content=comment.Content,
-        UserID=user_id,
-        MovieID=movie_id
+        UserID=user.UserID,
+        MovieID=movie_id,
+        user=user,
     )
     db.add(db_comment)
+    db.flush()  # 取得 CommentID
+    Comment = comment_model.Comment
+    _update_comment_stats(
+        db, movie_id,
+        CommentCount=movie_model.Movie.CommentCount + 1,
+        LatestCommentID=db_comment.CommentID,
+        LatestCommentAt=select(Comment.CreatedAt).where(Comment.CommentID == db_comment.CommentID).scalar_subquery(),
+    )
     db.commit()
-    db.refresh(db_comment)
+    trending.record_comment(movie_id)
+    _publish("comment_created", db_comment)
+    return db_comment
+
+def count_comments(db: Session, movie_id: int) -> int:
+    """电影的评论数，直接读取 Movies.CommentCount"""
+    return db.execute(
+        select(movie_model.Movie.CommentCount).where(movie_model.Movie.MovieID == movie_id)
+    ).scalar() or 0
 
-    newly_created_comment = (
-        db.query(comment_model.Comment)
+# 评论列表语句只构建一次, 电影ID和分页参数通过 bindparam 传入
+@lru_cache(maxsize=None)
+def _comments_page_statement():
+    return (
+        select(comment_model.Comment)
         .options(joinedload(comment_model.Comment.user))
-        .filter(comment_model.Comment.CommentID == db_comment.CommentID)
-        .first()
+        .where(comment_model.Comment.MovieID == bindparam("movie_id"))
+        .order_by(comment_model.Comment.CreatedAt.desc())
+        .offset(bindparam("skip"))
+        .limit(bindparam("limit"))
     )
-    return newly_created_comment
 
 def get_comments_by_movie(db: Session, movie_id: int, skip: int = 0, limit: int = 100):
     """
     获取指定电影的所有评论，并预加载（join）关联的用户信息。
     同时支持分页功能。
     """
-    return (
-        db.query(comment_model.Comment)
-        .options(joinedload(comment_model.Comment.user))
-        .filter(comment_model.Comment.MovieID == movie_id)
-        .order_by(comment_model.Comment.CreatedAt.desc())
-        .offset(skip)  # <--- 添加 skip
-        .limit(limit)  # <--- 添加 limit
-        .all()
-    )
+    return db.scalars(_comments_page_statement(), {"movie_id": movie_id, "skip": skip, "limit": limit}).all()
 
 def get_comment(db: Session, comment_id: int):
-    return db.query(comment_model.Comment).filter(comment_model.Comment.CommentID == comment_id).first()
+    # 按主键读取, 接口中权限检查已经加载过的评论直接从 identity map 返回
+    return db.get(comment_model.Comment, comment_id)
 
 def update_comment(db: Session, comment_id: int, comment_update: comment_schema.CommentUpdate):
     db_comment = get_comment(db, comment_id)
     if not db_comment:
         return None
     db_comment.Content = comment_update.Content
+    crud_version.bump_movie_comments(db, db_comment.MovieID)
     db.commit()
-    db.refresh(db_comment)
+    _publish("comment_updated", db_comment)
     return db_comment
 
 def delete_comment(db: Session, comment_id: int):
@@ -55,5 +93,22 @@ def delete_comment(db: Session, comment_id: int):
     if not db_comment:
         return None
     db.delete(db_comment)
+    db.flush()
+    # 按 (MovieID, CreatedAt) 索引取剩余评论中最新的一条
+    Comment = comment_model.Comment
+    latest = (
+        select(Comment)
+        .where(Comment.MovieID == db_comment.MovieID)
+        .order_by(Comment.CreatedAt.desc(), Comment.CommentID.desc())
+        .limit(1)
+        .subquery()
+    )
+    _update_comment_stats(
+        db, db_comment.MovieID,
+        CommentCount=func.greatest(movie_model.Movie.CommentCount - 1, 0),
+        LatestCommentID=select(latest.c.CommentID).scalar_subquery(),
+        LatestCommentAt=select(latest.c.CreatedAt).scalar_subquery(),
+    )
     db.commit()
+    live.comment_event(db_comment.MovieID, "comment_deleted", {"CommentID": db_comment.CommentID})
     return db_comment
\ No newline at end of file
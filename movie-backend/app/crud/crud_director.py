@@ -1,38 +1,66 @@
+from functools import lru_cache
+from sqlalchemy import bindparam, func, select, update
 from sqlalchemy.orm import Session
 from app.models import director_model
 from app.schemas import director_schema
+from app.crud import crud_version
+from app.services.related import related
+from app.services.counts import TotalCount, counts
 
 def create_director(db: Session, director: director_schema.DirectorCreate):
     db_director = director_model.Director(**director.model_dump())
     db.add(db_director)
     db.commit()
-    db.refresh(db_director)
+    counts.invalidate("directors")
     return db_director
 
 def get_director(db: Session, director_id: int):
-    return db.query(director_model.Director).filter(director_model.Director.DirectorID == director_id).first()
+    # 按主键读取, 同一会话中已加载过的对象直接从 identity map 返回, 不再查询
+    return db.get(director_model.Director, director_id)
+
+# 列表语句只构建一次, 分页参数通过 bindparam 传入
+@lru_cache(maxsize=None)
+def _directors_page_statement():
+    return select(director_model.Director).offset(bindparam("skip")).limit(bindparam("limit"))
 
 def get_directors(db: Session, skip: int = 0, limit: int = 100):
-    return db.query(director_model.Director).offset(skip).limit(limit).all()
+    return db.scalars(_directors_page_statement(), {"skip": skip, "limit": limit}).all()
+
+def count_directors(db: Session) -> TotalCount:
+    """导演总数，缓存到下一次新增或删除"""
+    return counts.get_or_count(
+        "directors", None, db, lambda session: session.execute(select(func.count()).select_from(director_model.Director)).scalar_one()
+    )
 
 def update_director(db: Session, director_id: int, director_update: director_schema.DirectorUpdate):
-    db_director = get_director(db, director_id)
-    if not db_director:
-        return None
+    """
+    直接执行 UPDATE ... WHERE, 由影响行数判断导演是否存在，不需要先查询一次。
+    """
+    Director = director_model.Director
     update_data = director_update.model_dump(exclude_unset=True)
-    for key, value in update_data.items():
-        setattr(db_director, key, value)
-    db.add(db_director)
+    result = db.execute(
+        update(Director)
+        .where(Director.DirectorID == director_id)
+        .values(**update_data, Version=Director.Version + 1)
+        .execution_options(synchronize_session=False)
+    )
+    if result.rowcount == 0:
+        db.rollback()
+        return None
+    crud_version.bump_movies_of_director(db, director_id)
     db.commit()
-    db.refresh(db_director)
-    return db_director
+    return db.get(Director, director_id, populate_existing=True)
 
 def delete_director(db: Session, director_id: int):
     db_director = get_director(db, director_id)
     if not db_director:
         return None
+    crud_version.bump_movies_of_director(db, director_id)
     db.delete(db_director)
     db.commit()
+    # 删除导演会级联删除多部电影的关联，相关电影图在下一次读取时全量重建
+    related.mark_stale()
+    counts.invalidate("directors")
     return db_director
 
 
@@ -41,6 +69,7 @@ def update_director_photo(db: Session, director_id: int, photo_url: str) -> dire
     db_director = get_director(db, director_id = director_id)
     if db_director:
         db_director.PhotoURL = photo_url
+        db_director.Version = director_model.Director.Version + 1
+        crud_version.bump_movies_of_director(db, director_id)
         db.commit()
-        db.refresh(db_director)
     return db_director
\ No newline at end of file
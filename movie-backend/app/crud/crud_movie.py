@@ -1,66 +1,356 @@
-from sqlalchemy.orm import Session
-from sqlalchemy import or_, desc, distinct
-from typing import Optional,List
-from app.models import movie_model, actor_model, director_model
+from sqlalchemy.orm import Session, joinedload, load_only, selectinload, noload
+from sqlalchemy import and_, or_, bindparam, desc, func, delete, insert, select, tuple_, update
+from decimal import Decimal
+from functools import lru_cache
+from typing import Dict, FrozenSet, Iterable, Optional,List,Sequence, Tuple
+from app.models import movie_model, actor_model, director_model, rating_model
+from app.database import MovieActors, MovieDirectors
 from app.schemas import movie_schema
+from app.core.serialization import dump_model
+from app.core.single_flight import single_flight
+from app.core.pagination import decode_cursor, encode_cursor
+from app.services.trending import trending
+from app.services.catalog import catalog
+from app.services.related import related
+from app.services.counts import TotalCount, counts, estimate_table_rows
+
+def _movie_load_options(
+    fields: Optional[Sequence[str]] = None,
+    expand: Optional[Sequence[str]] = None,
+    extra_columns: Sequence[str] = (),
+):
+    """
+    根据稀疏字段集生成加载选项。
+    fields 为 None 时加载全部列；expand 为 None 时保持关系的默认懒加载，
+    否则展开的关系用 selectinload 批量加载，未展开的关系用 noload 完全不加载。
+    """
+    options = []
+    if fields is not None:
+        columns = {"MovieID", *fields, *extra_columns}
+        options.append(load_only(*[getattr(movie_model.Movie, name) for name in columns]))
+    if expand is not None:
+        for relation in movie_schema.MOVIE_RELATIONS:
+            attr = getattr(movie_model.Movie, relation)
+            options.append(selectinload(attr) if relation in expand else noload(attr))
+    return options
+
+# 热点查询的语句按"形状"(字段集、展开的关系、生效的筛选条件等)缓存，参数值全部通过 bindparam 传入。
+# 同一形状的请求复用同一个语句对象: 不再每次构建表达式树，SQLAlchemy 也不必重新计算缓存键，
+# 直接命中编译缓存。命中情况可在 /admin/statement-cache 查看。
+_STATEMENT_CACHE_SIZE = 256
+
+def _shape(names: Optional[Iterable[str]]) -> Optional[FrozenSet[str]]:
+    """把字段集/关系列表转换成可哈希、与顺序无关的缓存键"""
+    return None if names is None else frozenset(names)
+
+@lru_cache(maxsize=_STATEMENT_CACHE_SIZE)
+def _movie_by_id_statement(fields: Optional[FrozenSet[str]], expand: Optional[FrozenSet[str]]):
+    Movie = movie_model.Movie
+    return select(Movie).options(*_movie_load_options(fields, expand)).where(Movie.MovieID == bindparam("movie_id"))
 
 # 从数据库当中返回指定的单部电影信息
-def get_movie(db: Session, movie_id: int):
-    return db.query(movie_model.Movie).filter(movie_model.Movie.MovieID == movie_id).first()
+def get_movie(
+    db: Session,
+    movie_id: int,
+    fields: Optional[Sequence[str]] = None,
+    expand: Optional[Sequence[str]] = None,
+):
+    statement = _movie_by_id_statement(_shape(fields), _shape(expand))
+    return db.scalars(statement, {"movie_id": movie_id}).first()
 
-def get_movies(
-    db: Session, 
+@single_flight("movie", key=lambda db, movie_id, version, fields, expand: (movie_id, version, fields, expand))
+def get_movie_json(
+    db: Session,
+    movie_id: int,
+    version: int,
+    fields: Sequence[str],
+    expand: Sequence[str],
+) -> Optional[bytes]:
+    """
+    读取并序列化单部电影。热门电影被大量并发请求时，相同版本、相同字段集的请求只查询和序列化一次。
+    version 只用于区分请求: 版本号不同的请求不会共享结果。
+    """
+    db_movie = get_movie(db, movie_id, fields=fields, expand=expand)
+    if db_movie is None:
+        return None
+    return dump_model(movie_schema.movie_read_model(frozenset(fields), frozenset(expand)), db_movie)
+
+def _movie_filter_params(
     genre: Optional[str] = None,
     year: Optional[int] = None,
     min_rating: Optional[float] = None,
+    country: Optional[str] = None,
     search: Optional[str] = None,
-    sort_by: Optional[str] = None,
-    skip: int = 0, 
-    limit: int = 100
-):
-    # 1. 创建一个基础查询
-    query = db.query(movie_model.Movie)
-
-    # 2. 如果有搜索词，则应用一个更健壮的筛选条件
+) -> Dict[str, object]:
+    """
+    电影列表实际生效的筛选条件及其参数值，get_movies 和 count_movies 共用。
+    字典的键决定语句的形状，模糊匹配的值在这里加上 % 通配符。
+    """
+    params = {}
     if search:
-        search_filter = or_(
+        params["search"] = f"%{search}%"
+    if genre:
+        params["genre"] = f"%{genre}%"
+    if year:
+        params["year"] = year
+    if min_rating is not None:
+        params["min_rating"] = min_rating
+    if country:
+        params["country"] = country
+    return params
+
+def _movie_filters(names: FrozenSet[str]) -> list:
+    """按生效的筛选条件生成 WHERE 子句，值全部是同名的绑定参数"""
+    criteria = []
+    # 如果有搜索词，则应用一个更健壮的筛选条件
+    if "search" in names:
+        search = bindparam("search")
+        criteria.append(or_(
             # 不区分大小写(insensitive)
-            movie_model.Movie.Title.ilike(f"%{search}%"),  
+            movie_model.Movie.Title.ilike(search),
             # 远比使用JOIN查询更优，因为JOIN可能会因为一部电影有多个匹配的演员而返回重复的电影记录。
-            movie_model.Movie.actors.any(actor_model.Actor.Name.ilike(f"%{search}%")),
-            movie_model.Movie.directors.any(director_model.Director.Name.ilike(f"%{search}%"))
-        )
-        query = query.filter(search_filter)
+            movie_model.Movie.actors.any(actor_model.Actor.Name.ilike(search)),
+            movie_model.Movie.directors.any(director_model.Director.Name.ilike(search))
+        ))
 
-    # 3. 应用其他筛选条件
-    if genre:
-        query = query.filter(movie_model.Movie.Genre.ilike(f"%{genre}%"))
+    # 应用其他筛选条件
+    if "genre" in names:
+        criteria.append(movie_model.Movie.Genre.ilike(bindparam("genre")))
     
-    if year:
-        query = query.filter(movie_model.Movie.ReleaseYear == year)
+    if "year" in names:
+        criteria.append(movie_model.Movie.ReleaseYear == bindparam("year"))
     
-    if min_rating is not None:
-        query = query.filter(movie_model.Movie.AverageRating >= min_rating)
+    if "min_rating" in names:
+        criteria.append(movie_model.Movie.AverageRating >= bindparam("min_rating"))
+
+    if "country" in names:
+        criteria.append(movie_model.Movie.Country == bindparam("country"))
+    return criteria
+
+@lru_cache(maxsize=_STATEMENT_CACHE_SIZE)
+def _movie_list_statement(
+    filters: FrozenSet[str],
+    sort_column: str,
+    fields: Optional[FrozenSet[str]],
+    expand: Optional[FrozenSet[str]],
+):
+    Movie = movie_model.Movie
+    # 1. 创建一个基础查询, 应用筛选条件
+    statement = select(Movie).where(*_movie_filters(filters))
+
+    # 2. 排序, 同分时按 MovieID 排序, 与内存快照的结果一致
+    statement = statement.order_by(desc(getattr(Movie, sort_column)), Movie.MovieID)
+
+    # 排序列在使用 DISTINCT 时必须出现在 SELECT 列表中
+    statement = statement.options(*_movie_load_options(fields, expand, extra_columns=(sort_column,)))
+
+    # 3. 最后应用分页和distinct来获取所有结果
+    # distinct() 确保在复杂查询中不会返回重复的电影
+    return statement.distinct().offset(bindparam("skip")).limit(bindparam("limit"))
+
+@lru_cache(maxsize=_STATEMENT_CACHE_SIZE)
+def _movie_count_statement(filters: FrozenSet[str]):
+    return select(func.count()).select_from(movie_model.Movie).where(*_movie_filters(filters))
+
+def get_movies(
+    db: Session, 
+    genre: Optional[str] = None,
+    year: Optional[int] = None,
+    min_rating: Optional[float] = None,
+    search: Optional[str] = None,
+    sort_by: Optional[str] = None,
+    skip: int = 0, 
+    limit: int = 100,
+    fields: Optional[Sequence[str]] = None,
+    expand: Optional[Sequence[str]] = None,
+    country: Optional[str] = None,
+):
+    # 0. 内存快照能回答的筛选和排序不再交给数据库，只按主键取回这一页的电影
+    movie_ids = catalog.query(
+        db, genre=genre, year=year, min_rating=min_rating, country=country,
+        search=search, sort_by=sort_by, skip=skip, limit=limit,
+    )
+    if movie_ids is not None:
+        return get_movies_by_ids(db, movie_ids, fields=fields, expand=expand)
 
-    # 4. 增加排序逻辑
+    params = _movie_filter_params(genre=genre, year=year, min_rating=min_rating, country=country, search=search)
     if sort_by == "release_year_desc":
-        query = query.order_by(desc(movie_model.Movie.ReleaseYear))
-    elif sort_by == "rating_desc":
-        query = query.order_by(desc(movie_model.Movie.AverageRating))
+        sort_column = "ReleaseYear"
     else:
         # 默认按评分排序
-        query = query.order_by(desc(movie_model.Movie.AverageRating))
+        sort_column = "AverageRating"
+    statement = _movie_list_statement(frozenset(params), sort_column, _shape(fields), _shape(expand))
+    return db.scalars(statement, {**params, "skip": skip, "limit": limit}).all()
 
-    # 5. 最后应用分页和distinct来获取所有结果
-    # distinct() 确保在复杂查询中不会返回重复的电影
-    return query.distinct().offset(skip).limit(limit).all()
+def count_movies(
+    db: Session,
+    genre: Optional[str] = None,
+    year: Optional[int] = None,
+    min_rating: Optional[float] = None,
+    country: Optional[str] = None,
+    search: Optional[str] = None,
+) -> TotalCount:
+    """
+    get_movies 同样筛选条件下的电影总数。
+    内存快照能回答的条件直接从快照中计数；其余条件先查缓存。
+    搜索(多个 ILIKE 和 EXISTS 子查询)未命中缓存时不在请求中计数，返回估算值并在后台计算精确值:
+    有快照时用不含搜索词的筛选结果数，否则用表的统计行数，两者都是上限。
+    """
+    filters = dict(genre=genre, year=year, min_rating=min_rating, country=country)
+    if not search:
+        value = catalog.count(db, **filters)
+        if value is not None:
+            return TotalCount(value, True)
+
+    signature = (genre, year, min_rating, country, search)
+    # 评分变化只影响带 min_rating 的总数，这些缓存单独失效
+    resource = "movies" if min_rating is None else "movies:rating"
+    params = _movie_filter_params(search=search, **filters)
+    statement = _movie_count_statement(frozenset(params))
+
+    def count(session: Session) -> int:
+        return session.execute(statement, params).scalar_one()
+
+    if not search:
+        return counts.get_or_count(resource, signature, db, count)
+    estimate = catalog.count(db, **filters)
+    if estimate is None:
+        estimate = estimate_table_rows(db, movie_model.Movie.__table__)
+    return counts.get_or_estimate(resource, signature, estimate, count)
+
+@lru_cache(maxsize=_STATEMENT_CACHE_SIZE)
+def _movies_by_ids_statement(fields: Optional[FrozenSet[str]], expand: Optional[FrozenSet[str]]):
+    Movie = movie_model.Movie
+    return (
+        select(Movie)
+        .options(*_movie_load_options(fields, expand=expand))
+        .where(Movie.MovieID.in_(bindparam("movie_ids", expanding=True)))
+    )
+
+def get_movies_by_ids(
+    db: Session,
+    movie_ids: Sequence[int],
+    fields: Optional[Sequence[str]] = None,
+    expand: Optional[Sequence[str]] = (),
+) -> List[movie_model.Movie]:
+    """按给定ID顺序批量获取电影，不存在的ID会被跳过"""
+    if not movie_ids:
+        return []
+    statement = _movies_by_ids_statement(_shape(fields), _shape(expand))
+    movies = db.scalars(statement, {"movie_ids": list(movie_ids)}).all()
+    by_id = {movie.MovieID: movie for movie in movies}
+    return [by_id[movie_id] for movie_id in movie_ids if movie_id in by_id]
+
+_RELATION_SOURCES = {
+    "actors": (MovieActors, MovieActors.c.ActorID, actor_model.Actor, actor_model.Actor.ActorID),
+    "directors": (MovieDirectors, MovieDirectors.c.DirectorID, director_model.Director, director_model.Director.DirectorID),
+}
+
+@lru_cache(maxsize=None)
+def _movie_relation_statement(relation: str):
+    link_table, link_column, model, id_column = _RELATION_SOURCES[relation]
+    return (
+        select(link_table.c.MovieID, model)
+        .join(model, id_column == link_column)
+        .where(link_table.c.MovieID.in_(bindparam("movie_ids", expanding=True)))
+    )
+
+def get_movie_relations(
+    db: Session, movie_ids: Sequence[int], expand: Sequence[str]
+) -> Dict[str, Tuple[Dict[int, List[int]], Dict[int, object]]]:
+    """
+    为一批电影加载关联的演员/导演，每种关系只执行一次查询。
+    返回 {关系名: ({电影ID: [人员ID, ...]}, {人员ID: 人员对象})}。
+    """
+    result = {}
+    for relation in expand:
+        id_column = _RELATION_SOURCES[relation][3]
+        ids_by_movie: Dict[int, List[int]] = {movie_id: [] for movie_id in movie_ids}
+        people: Dict[int, object] = {}
+        if movie_ids:
+            rows = db.execute(_movie_relation_statement(relation), {"movie_ids": list(movie_ids)}).all()
+            for movie_id, person in rows:
+                person_id = getattr(person, id_column.key)
+                ids_by_movie[movie_id].append(person_id)
+                people[person_id] = person
+        result[relation] = (ids_by_movie, people)
+    return result
+
+_PERSON_LINKS = {
+    "actors": MovieActors.c.ActorID,
+    "directors": MovieDirectors.c.DirectorID,
+}
+
+@lru_cache(maxsize=None)
+def _filmography_statement(relation: str, sort_by: str, after_cursor: bool):
+    Movie = movie_model.Movie
+    person_column = _PERSON_LINKS[relation]
+    if sort_by == "rating_desc":
+        sort_key = Movie.AverageRating
+    else:
+        # 没有年份的电影排在最后
+        sort_key = func.coalesce(Movie.ReleaseYear, -1)
+
+    statement = (
+        select(Movie)
+        .join(person_column.table, person_column.table.c.MovieID == Movie.MovieID)
+        .where(person_column == bindparam("person_id"))
+    )
+    if after_cursor:
+        value, last_id = bindparam("value"), bindparam("last_id")
+        statement = statement.where(or_(sort_key < value, and_(sort_key == value, Movie.MovieID < last_id)))
+    return (
+        statement.options(*_movie_load_options(expand=movie_schema.MOVIE_RELATIONS))
+        .order_by(sort_key.desc(), Movie.MovieID.desc())
+        .limit(bindparam("limit"))
+    )
+
+def get_filmography(
+    db: Session,
+    relation: str,
+    person_id: int,
+    sort_by: str = "release_year_desc",
+    cursor: Optional[str] = None,
+    limit: int = 20,
+) -> Tuple[List[movie_model.Movie], Optional[str]]:
+    """
+    按演员或导演分页获取参演/执导的电影，返回 (这一页的电影, 下一页的游标)。
+    使用键集分页: 游标记录上一页最后一部电影的 (排序值, MovieID)，下一页从它之后开始，
+    不需要 OFFSET 跳过前面的行。先通过关联表上以人员ID开头的索引找到电影，
+    这一页电影的演员和导演再各用一次 IN 查询批量加载，查询数量与作品总数无关。
+    游标格式不正确时抛出 ValueError。
+    """
+    params = {"person_id": person_id, "limit": limit + 1}  # 多取一条判断是否还有下一页
+    after = decode_cursor(cursor, 3)
+    if after is not None:
+        cursor_sort, value, last_id = after
+        if cursor_sort != sort_by:
+            raise ValueError("游标与排序方式不匹配")
+        try:
+            params["value"] = Decimal(value) if sort_by == "rating_desc" else int(value)
+            params["last_id"] = int(last_id)
+        except (TypeError, ArithmeticError, ValueError) as e:
+            raise ValueError("无效的游标") from e
+
+    statement = _filmography_statement(relation, sort_by, after is not None)
+    movies = db.scalars(statement, params).all()
+    next_cursor = None
+    if len(movies) > limit:
+        movies = movies[:limit]
+        last = movies[-1]
+        if sort_by == "rating_desc":
+            value = last.AverageRating
+        else:
+            value = last.ReleaseYear if last.ReleaseYear is not None else -1
+        next_cursor = encode_cursor(sort_by, value, last.MovieID)
+    return movies, next_cursor
 
 def get_genres(db: Session) -> List[str]:
     """从数据库中获取所有不重复的电影类型"""
     # 查找所有不为空的 Genre 字段
-    results = db.query(distinct(movie_model.Movie.Genre)).filter(movie_model.Movie.Genre.isnot(None)).all()
+    results = db.scalars(select(movie_model.Movie.Genre).where(movie_model.Movie.Genre.isnot(None)).distinct())
     genres = set()
-    for (genre_string,) in results:
+    for genre_string in results:
         # 将 "剧情/犯罪" 这样的字符串拆分成独立的类型
         genres.update(g.strip() for g in genre_string.split('/'))
     # 过滤掉空字符串并排序返回
@@ -72,24 +362,36 @@ def create_movie(db: Session, movie: movie_schema.MovieCreate):
     # 1. 将电影基本数据和ID列表分开
     movie_data = movie.model_dump(exclude={'actor_ids', 'director_ids'})
     db_movie = movie_model.Movie(**movie_data)
+    # 新电影同时创建一条全为0的评分分布记录，之后评分时只需 UPDATE
+    db_movie.rating_histogram = rating_model.MovieRatingHistogram()
 
     db.add(db_movie)
     # 2. 根据传入的ID，从数据库中查询出对应的演员和导演对象
+    # 没有传入时也显式设为空列表，返回响应时不会再为这两个关系发起懒加载查询
+    actors, directors = [], []
     if movie.actor_ids:
-        actors = db.query(actor_model.Actor).filter(actor_model.Actor.ActorID.in_(movie.actor_ids)).all()
-        db_movie.actors = actors
-        
+        actors = db.scalars(select(actor_model.Actor).where(actor_model.Actor.ActorID.in_(movie.actor_ids))).all()
     if movie.director_ids:
-        directors = db.query(director_model.Director).filter(director_model.Director.DirectorID.in_(movie.director_ids)).all()
-        db_movie.directors = directors
+        directors = db.scalars(select(director_model.Director).where(director_model.Director.DirectorID.in_(movie.director_ids))).all()
+    db_movie.actors = actors
+    db_movie.directors = directors
     
     db.commit()
-    db.refresh(db_movie)
+    catalog.mark_stale([db_movie.MovieID])
+    counts.invalidate("movies")
+    related.update_movie(
+        db_movie.MovieID,
+        actor_ids=[actor.ActorID for actor in actors],
+        director_ids=[director.DirectorID for director in directors],
+        genre=db_movie.Genre,
+    )
     return db_movie
 
 def update_movie(db: Session, movie_id: int, movie_update: movie_schema.MovieUpdate):
     # print(f"--- [后端接收到的数据] --- 电影标题: {movie_update.Title}, 演员ID: {movie_update.actor_ids}, 导演ID: {movie_update.director_ids}")
-    db_movie = get_movie(db, movie_id)
+    # 电影和现有的演员、导演在一次查询中加载: 替换关系时需要旧列表来计算差异，返回响应时也要用到
+    Movie = movie_model.Movie
+    db_movie = db.get(Movie, movie_id, options=[joinedload(Movie.actors), joinedload(Movie.directors)])
     if not db_movie:
         return None
     
@@ -100,17 +402,25 @@ def update_movie(db: Session, movie_id: int, movie_update: movie_schema.MovieUpd
     
     # 更新演员关系
     if movie_update.actor_ids is not None:
-        actors = db.query(actor_model.Actor).filter(actor_model.Actor.ActorID.in_(movie_update.actor_ids)).all()
+        actors = db.scalars(select(actor_model.Actor).where(actor_model.Actor.ActorID.in_(movie_update.actor_ids))).all()
         db_movie.actors = actors
         
     # 更新导演关系
     if movie_update.director_ids is not None:
-        directors = db.query(director_model.Director).filter(director_model.Director.DirectorID.in_(movie_update.director_ids)).all()
+        directors = db.scalars(select(director_model.Director).where(director_model.Director.DirectorID.in_(movie_update.director_ids))).all()
         db_movie.directors = directors
 
+    db_movie.Version = movie_model.Movie.Version + 1
     db.add(db_movie)
     db.commit()
-    db.refresh(db_movie)
+    catalog.mark_stale([movie_id])
+    counts.invalidate("movies")
+    related.update_movie(
+        movie_id,
+        actor_ids=None if movie_update.actor_ids is None else [actor.ActorID for actor in db_movie.actors],
+        director_ids=None if movie_update.director_ids is None else [director.DirectorID for director in db_movie.directors],
+        genre=db_movie.Genre,
+    )
     return db_movie
 
 def delete_movie(db: Session, movie_id: int):
@@ -119,12 +429,158 @@ def delete_movie(db: Session, movie_id: int):
         return None
     db.delete(db_movie)
     db.commit()
+    trending.remove(movie_id)
+    catalog.mark_stale([movie_id])
+    counts.invalidate("movies")
+    related.remove_movie(movie_id)
     return db_movie
 
 def update_movie_cover(db: Session, movie_id: int, cover_url: str) -> movie_model.Movie:
     db_movie = get_movie(db, movie_id)
     if db_movie:
         db_movie.CoverURL = cover_url
+        db_movie.Version = movie_model.Movie.Version + 1
+        db.commit()
+    return db_movie
+
+_LINK_TABLES = {
+    "actor": (MovieActors, MovieActors.c.ActorID, actor_model.Actor.ActorID),
+    "director": (MovieDirectors, MovieDirectors.c.DirectorID, director_model.Director.DirectorID),
+}
+
+def bulk_apply(db: Session, request: movie_schema.MovieBulkRequest, dry_run: bool = False) -> dict:
+    """
+    在一个事务中批量删除电影、修改字段以及增删演员/导演关联，返回每一项的处理结果。
+
+    所有操作都是集合操作: 删除是一条 DELETE ... IN，字段修改按相同的修改内容分组、每组一条 UPDATE ... IN，
+    关联表只删除和插入有变化的行，而不是像 update_movie 那样整体替换。
+    不存在、重复或与删除冲突的项不会执行，只在结果中说明原因，其余项照常提交。
+    dry_run 时所有语句都会执行以得到准确的结果，最后回滚。
+    """
+    Movie = movie_model.Movie
+    results = []
+    movie_ids = {*request.delete, *(item.MovieID for item in request.update), *(item.MovieID for item in request.links)}
+    existing = set(db.scalars(select(Movie.MovieID).where(Movie.MovieID.in_(movie_ids)))) if movie_ids else set()
+
+    def check(movie_id: int, op: str, seen: set) -> bool:
+        problem = None
+        if movie_id not in existing:
+            problem = ("not_found", "电影未找到")
+        elif op != "delete" and movie_id in deleted:
+            problem = ("conflict", "电影在同一请求中被删除")
+        elif movie_id in seen:
+            problem = ("invalid", "同一部电影在这一类操作中重复出现")
+        if problem:
+            results.append({"MovieID": movie_id, "op": op, "status": problem[0], "detail": problem[1]})
+            return False
+        seen.add(movie_id)
+        return True
+
+    # 1. 删除
+    deleted: set = set()
+    for movie_id in request.delete:
+        if check(movie_id, "delete", deleted):
+            results.append({"MovieID": movie_id, "op": "delete", "status": "ok"})
+
+    # 2. 修改字段: 修改内容相同的电影合并成一条 UPDATE
+    update_groups: Dict[tuple, List[int]] = {}
+    updated: set = set()
+    for item in request.update:
+        changes = item.changes.model_dump(exclude_unset=True)
+        if not check(item.MovieID, "update", updated):
+            continue
+        if not changes:
+            updated.discard(item.MovieID)
+            results.append({"MovieID": item.MovieID, "op": "update", "status": "invalid", "detail": "没有要修改的字段"})
+            continue
+        update_groups.setdefault(tuple(sorted(changes.items())), []).append(item.MovieID)
+        results.append({"MovieID": item.MovieID, "op": "update", "status": "ok"})
+
+    # 3. 关联表差异: 每张表一次查询校验人员ID、一次查询读取已有的关联行
+    linked: set = set()
+    link_items = []
+    known_people = {}
+    for kind, (_, _, person_id_column) in _LINK_TABLES.items():
+        wanted = {person_id for item in request.links for person_id in getattr(item, f"add_{kind}_ids")}
+        known_people[kind] = set(db.scalars(select(person_id_column).where(person_id_column.in_(wanted)))) if wanted else set()
+    for item in request.links:
+        if not check(item.MovieID, "links", linked):
+            continue
+        problem = None
+        for kind in _LINK_TABLES:
+            add, remove = set(getattr(item, f"add_{kind}_ids")), set(getattr(item, f"remove_{kind}_ids"))
+            if add & remove:
+                problem = f"{kind} ID 同时出现在添加和移除中: {sorted(add & remove)}"
+            elif add - known_people[kind]:
+                problem = f"{kind} 不存在: {sorted(add - known_people[kind])}"
+            if problem:
+                break
+        if problem:
+            linked.discard(item.MovieID)
+            results.append({"MovieID": item.MovieID, "op": "links", "status": "invalid", "detail": problem})
+            continue
+        result = {"MovieID": item.MovieID, "op": "links", "status": "ok"}
+        link_items.append((item, result))
+        results.append(result)
+
+    link_writes = {}
+    for kind, (table, person_column, _) in _LINK_TABLES.items():
+        candidates = {
+            (item.MovieID, person_id)
+            for item, _ in link_items
+            for person_id in (*getattr(item, f"add_{kind}_ids"), *getattr(item, f"remove_{kind}_ids"))
+        }
+        present = set()
+        if candidates:
+            present = set(db.execute(
+                select(table.c.MovieID, person_column).where(tuple_(table.c.MovieID, person_column).in_(candidates))
+            ).tuples())
+        to_add, to_remove = set(), set()
+        for item, result in link_items:
+            added = {(item.MovieID, person_id) for person_id in getattr(item, f"add_{kind}_ids")} - present
+            removed = {(item.MovieID, person_id) for person_id in getattr(item, f"remove_{kind}_ids")} & present
+            result[f"{kind}s_added"], result[f"{kind}s_removed"] = len(added), len(removed)
+            to_add |= added
+            to_remove |= removed
+        link_writes[kind] = (to_add, to_remove)
+
+    # 4. 执行
+    if deleted:
+        db.execute(delete(Movie).where(Movie.MovieID.in_(deleted)).execution_options(synchronize_session=False))
+    for changes, ids in update_groups.items():
+        db.execute(
+            update(Movie)
+            .where(Movie.MovieID.in_(ids))
+            .values(**dict(changes), Version=Movie.Version + 1)
+            .execution_options(synchronize_session=False)
+        )
+    touched = set()
+    for kind, (to_add, to_remove) in link_writes.items():
+        table, person_column, _ = _LINK_TABLES[kind]
+        if to_remove:
+            db.execute(delete(table).where(tuple_(table.c.MovieID, person_column).in_(to_remove)))
+        if to_add:
+            db.execute(insert(table), [{"MovieID": movie_id, person_column.key: person_id} for movie_id, person_id in to_add])
+        touched |= {movie_id for movie_id, _ in to_add | to_remove}
+    # 只改了关联的电影也要让版本号加一，已经在第 2 步加过的不再重复
+    touched -= {movie_id for ids in update_groups.values() for movie_id in ids}
+    if touched:
+        db.execute(
+            update(Movie)
+            .where(Movie.MovieID.in_(touched))
+            .values(Version=Movie.Version + 1)
+            .execution_options(synchronize_session=False)
+        )
+
+    applied = sum(1 for result in results if result["status"] == "ok")
+    if dry_run:
+        db.rollback()
+    else:
         db.commit()
-        db.refresh(db_movie)
-    return db_movie
\ No newline at end of file
+        if applied:
+            for movie_id in deleted:
+                trending.remove(movie_id)
+            catalog.mark_stale(deleted | touched | {movie_id for ids in update_groups.values() for movie_id in ids})
+            counts.invalidate("movies")
+            related.mark_stale()
+    return {"dry_run": dry_run, "applied": applied, "results": results}
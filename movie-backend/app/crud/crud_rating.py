@@ -1,12 +1,19 @@
+import math
+from typing import Optional
+from sqlalchemy import case, delete, func, insert, select
 from sqlalchemy.orm import Session
-from app.models import rating_model
+from app.models import rating_model, movie_model
 from app.schemas import rating_schema
+from app.services.trending import trending
+from app.services.catalog import catalog
+from app.services.counts import counts
+from app.services.affinity import affinity
+from app.services.live import live
+
+Histogram = rating_model.MovieRatingHistogram
 
 def get_rating(db: Session, user_id: int, movie_id: int):
-    return db.query(rating_model.Rating).filter(
-        rating_model.Rating.UserID == user_id,
-        rating_model.Rating.MovieID == movie_id
-    ).first()
+    return db.get(rating_model.Rating, (user_id, movie_id))
 
 def create_or_update_rating(db: Session, rating: rating_schema.RatingCreate, user_id: int, movie_id: int):
     db_rating = get_rating(db, user_id=user_id, movie_id=movie_id)
@@ -21,8 +28,13 @@ def create_or_update_rating(db: Session, rating: rating_schema.RatingCreate, use
             Score=rating.Score
         )
         db.add(db_rating)
+    # 电影的平均分、评分分布和版本号都由 Ratings 上的触发器在同一事务中更新
     db.commit()
-    db.refresh(db_rating)
+    trending.record_rating(movie_id)
+    catalog.mark_stale([movie_id])
+    counts.invalidate("movies:rating")
+    affinity.record_rating(user_id, movie_id, rating.Score)
+    live.rating_changed(movie_id)
     return db_rating
 
 def delete_rating(db: Session, user_id: int, movie_id: int):
@@ -30,4 +42,62 @@ def delete_rating(db: Session, user_id: int, movie_id: int):
     if db_rating:
         db.delete(db_rating)
         db.commit()
-    return db_rating
\ No newline at end of file
+        catalog.mark_stale([movie_id])
+        counts.invalidate("movies:rating")
+        affinity.record_rating(user_id, movie_id, None)
+        live.rating_changed(movie_id)
+    return db_rating
+
+def rebuild_histograms(db: Session) -> int:
+    """
+    从 Ratings 表全量重建所有电影的评分分布，用于初始化或修正触发器之外的写入(如直接导入数据)产生的偏差。
+    返回重建的电影数量。
+    """
+    Rating = rating_model.Rating
+    Movie = movie_model.Movie
+    columns = [func.coalesce(func.sum(case((Rating.Score == score, 1), else_=0)), 0) for score in range(1, 11)]
+    aggregated = (
+        select(Movie.MovieID, *columns)
+        .outerjoin(Rating, Rating.MovieID == Movie.MovieID)
+        .group_by(Movie.MovieID)
+    )
+    db.execute(delete(Histogram))
+    result = db.execute(
+        insert(Histogram).from_select(
+            ["MovieID", *[f"Score{score}" for score in range(1, 11)]], aggregated
+        )
+    )
+    db.commit()
+    return result.rowcount
+
+def get_rating_stats(db: Session, movie_id: int) -> Optional[dict]:
+    """
+    读取一部电影的评分分布，并由10个计数器直接算出平均分、中位数和标准差，开销与评分人数无关。
+    """
+    histogram = db.get(Histogram, movie_id)
+    if histogram is None:
+        return None
+    counts = histogram.counts()
+    total = sum(counts)
+    stats = {"MovieID": movie_id, "histogram": counts, "count": total, "mean": None, "median": None, "stddev": None}
+    if total == 0:
+        return stats
+
+    mean = sum(score * n for score, n in zip(range(1, 11), counts)) / total
+    variance = sum(n * (score - mean) ** 2 for score, n in zip(range(1, 11), counts)) / total
+
+    def nth_score(position: int) -> int:
+        # 返回排序后第 position 个(从1开始)评分的分值
+        seen = 0
+        for score, n in zip(range(1, 11), counts):
+            seen += n
+            if seen >= position:
+                return score
+        return 10
+
+    if total % 2:
+        median = float(nth_score(total // 2 + 1))
+    else:
+        median = (nth_score(total // 2) + nth_score(total // 2 + 1)) / 2
+    stats.update(mean=round(mean, 2), median=median, stddev=round(math.sqrt(variance), 2))
+    return stats
@@ -1,23 +1,31 @@
+from functools import lru_cache
 from sqlalchemy.orm import Session
 from app.models import user_model
 from app.schemas import user_schema
 from app.core import security
-from sqlalchemy import or_
+from app.crud import crud_version
+from sqlalchemy import bindparam, or_, select
 from fastapi import HTTPException
 
 
 def get_user(db: Session, user_id: int):
     """通过用户ID查询用户"""
-    return db.query(user_model.User).filter(user_model.User.UserID == user_id).first()
+    # 按主键读取, 当前登录用户已经在会话的 identity map 中时不再查询
+    return db.get(user_model.User, user_id)
+# 每个需要登录的请求都会按邮箱查询用户, 语句只构建一次
+@lru_cache(maxsize=None)
+def _user_by_email_statement():
+    return select(user_model.User).where(user_model.User.Email == bindparam("email"))
+
 def get_user_by_email(db: Session, email: str):
     """通过邮箱查询用户"""
-    return db.query(user_model.User).filter(user_model.User.Email == email).first()
+    return db.scalars(_user_by_email_statement(), {"email": email}).first()
 
 
 def get_user_by_username_or_email(db: Session, username: str, email: str):
     """通过用户ID或者邮箱查询用户"""
-    return db.query(user_model.User).filter(
-        or_(user_model.User.Username == username, user_model.User.Email == email)
+    return db.scalars(
+        select(user_model.User).where(or_(user_model.User.Username == username, user_model.User.Email == email))
     ).first()
 
 def create_user(db: Session, user: user_schema.UserCreate):
@@ -30,15 +38,13 @@ def create_user(db: Session, user: user_schema.UserCreate):
     )
     db.add(db_user)
     db.commit()
-    db.refresh(db_user)
     return db_user
 
 def update_user_avatar(db: Session, user_id: int, avatar_url: str) -> user_model.User:
-    db_user = db.query(user_model.User).filter(user_model.User.UserID == user_id).first()
+    db_user = get_user(db, user_id)
     if db_user:
         db_user.AvatarURL = avatar_url
         db.commit()
-        db.refresh(db_user)
     return db_user
 
 def update_user(db: Session, user_id: int, user_update: user_schema.UserUpdate):
@@ -56,10 +62,13 @@ def update_user(db: Session, user_id: int, user_update: user_schema.UserUpdate):
 
     for key, value in update_data.items():
         setattr(db_user, key, value)
+
+    # 评论中展示了用户名，改名后相关电影的评论列表缓存需要失效
+    if "Username" in update_data:
+        crud_version.bump_comments_of_user(db, user_id)
     
     db.add(db_user)
     db.commit()
-    db.refresh(db_user)
     return db_user
 
 def update_user_password(db: Session, *, user: user_model.User, current_password: str, new_password: str) -> bool:
@@ -0,0 +1,69 @@
+from typing import Optional
+from sqlalchemy import func, select, update
+from sqlalchemy.orm import Session
+from app.models import movie_model, actor_model, director_model, comment_model
+from app.database import MovieActors, MovieDirectors
+
+# 只查询版本号的轻量查询，用于在加载完整数据之前判断客户端缓存是否仍然有效
+
+def get_movie_version(db: Session, movie_id: int) -> Optional[int]:
+    return db.execute(
+        select(movie_model.Movie.Version).where(movie_model.Movie.MovieID == movie_id)
+    ).scalar_one_or_none()
+
+def get_movies_catalog_version(db: Session) -> tuple:
+    """
+    整个电影表的版本: (电影数, 版本号之和, 最大 MovieID)。
+    任何电影的写入(包括评分、评论、演员/导演变化)都会让某部电影的版本号加一，新建电影会得到更大的 MovieID，
+    只要内容变化这个元组就会变化，用于电影列表的 ETag。
+    """
+    Movie = movie_model.Movie
+    return tuple(db.execute(
+        select(func.count(), func.coalesce(func.sum(Movie.Version), 0), func.coalesce(func.max(Movie.MovieID), 0))
+    ).one())
+
+def get_comments_version(db: Session, movie_id: int) -> Optional[int]:
+    return db.execute(
+        select(movie_model.Movie.CommentsVersion).where(movie_model.Movie.MovieID == movie_id)
+    ).scalar_one_or_none()
+
+def get_actor_version(db: Session, actor_id: int) -> Optional[int]:
+    return db.execute(
+        select(actor_model.Actor.Version).where(actor_model.Actor.ActorID == actor_id)
+    ).scalar_one_or_none()
+
+def get_director_version(db: Session, director_id: int) -> Optional[int]:
+    return db.execute(
+        select(director_model.Director.Version).where(director_model.Director.DirectorID == director_id)
+    ).scalar_one_or_none()
+
+# 写入路径调用的版本号递增，随调用方的事务一起提交
+
+def _bump_movies(db: Session, *criteria, column: str = "Version"):
+    Movie = movie_model.Movie
+    db.execute(
+        update(Movie)
+        .where(*criteria)
+        .values({column: getattr(Movie, column) + 1})
+        .execution_options(synchronize_session=False)
+    )
+
+def bump_movie(db: Session, movie_id: int):
+    _bump_movies(db, movie_model.Movie.MovieID == movie_id)
+
+def bump_movie_comments(db: Session, movie_id: int):
+    _bump_movies(db, movie_model.Movie.MovieID == movie_id, column="CommentsVersion")
+
+def bump_movies_of_actor(db: Session, actor_id: int):
+    """演员信息嵌在电影响应中，演员变化时其参演电影的版本号也要加一"""
+    movie_ids = select(MovieActors.c.MovieID).where(MovieActors.c.ActorID == actor_id)
+    _bump_movies(db, movie_model.Movie.MovieID.in_(movie_ids))
+
+def bump_movies_of_director(db: Session, director_id: int):
+    movie_ids = select(MovieDirectors.c.MovieID).where(MovieDirectors.c.DirectorID == director_id)
+    _bump_movies(db, movie_model.Movie.MovieID.in_(movie_ids))
+
+def bump_comments_of_user(db: Session, user_id: int):
+    """评论中嵌有用户名，用户改名后其评论过的电影的评论列表版本号都要加一"""
+    movie_ids = select(comment_model.Comment.MovieID).where(comment_model.Comment.UserID == user_id)
+    _bump_movies(db, movie_model.Movie.MovieID.in_(movie_ids), column="CommentsVersion")
@@ -1,7 +1,15 @@
+from functools import lru_cache
+from sqlalchemy import bindparam, select
 from sqlalchemy.orm import Session
 from app.models.view_models import VMovieDetails # 导入视图模型
 from app.schemas.view_schemas import MovieDetails # 导入视图 Schema
 from typing import Optional
+from app.core.serialization import dump_model
+from app.core.single_flight import single_flight
+
+@lru_cache(maxsize=None)
+def _details_by_id_statement():
+    return select(VMovieDetails).where(VMovieDetails.MovieID == bindparam("movie_id"))
 
 def get_movie_details(db: Session, movie_id: int) -> Optional[VMovieDetails]:
     """
@@ -14,11 +22,19 @@ def get_movie_details(db: Session, movie_id: int) -> Optional[VMovieDetails]:
     Returns:
         Optional[VMovieDetails]: 包含电影详细信息的视图模型实例，如果找不到则返回 None。
     """
-    return db.query(VMovieDetails).filter(VMovieDetails.MovieID == movie_id).first()
+    return db.scalars(_details_by_id_statement(), {"movie_id": movie_id}).first()
 
 # 将其组织成一个类
 class CRUDMovieView:
     def get_details(self, db: Session, *, movie_id: int) -> Optional[VMovieDetails]:
-        return db.query(VMovieDetails).filter(VMovieDetails.MovieID == movie_id).first()
+        return db.scalars(_details_by_id_statement(), {"movie_id": movie_id}).first()
+
+    @single_flight("movie-details", key=lambda self, db, *, movie_id, version: (movie_id, version))
+    def get_details_json(self, db: Session, *, movie_id: int, version: int) -> Optional[bytes]:
+        """读取并序列化电影详情，并发的相同请求只查询一次"""
+        details = self.get_details(db, movie_id=movie_id)
+        if details is None:
+            return None
+        return dump_model(MovieDetails, details)
 
 movie_view = CRUDMovieView()
\ No newline at end of file
@@ -1,28 +1,241 @@
-from sqlalchemy import create_engine, Table, Column, Integer, ForeignKey
-from sqlalchemy.orm import sessionmaker, declarative_base
+import hashlib
+import hmac
+import itertools
+import threading
+import time
+from collections import OrderedDict
+from typing import List, Optional
+
+from fastapi import Request, Response
+from sqlalchemy import create_engine, event, text, Table, Column, DateTime, Integer, ForeignKey, Index, String
+from sqlalchemy.exc import DBAPIError, OperationalError
+from sqlalchemy.orm import sessionmaker, declarative_base, Session
 from app.core.config import settings
+from app.core.security import get_token_subject
+from app.core.pool_metrics import InstrumentedQueuePool, register_engine
+from app.core import statement_cache, tracing
 
 connect_args = {"init_command": "SET time_zone = '+8:00'"}
-engine = create_engine(settings.DATABASE_URL,connect_args=connect_args) # 在底层创建了一个连接池
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine) # 从连接池当中借用链接,使用完后归还
+
+
+def _create_engine(url: str):
+    """按 Settings 中的连接池参数创建引擎，并登记到连接池监控"""
+    return create_engine(
+        url,
+        connect_args=connect_args,
+        poolclass=InstrumentedQueuePool,
+        pool_size=settings.DB_POOL_SIZE,
+        max_overflow=settings.DB_MAX_OVERFLOW,
+        pool_timeout=settings.DB_POOL_TIMEOUT,
+        pool_recycle=settings.DB_POOL_RECYCLE,
+        pool_pre_ping=settings.DB_POOL_PRE_PING,
+        pool_use_lifo=settings.DB_POOL_USE_LIFO,
+        query_cache_size=settings.DB_QUERY_CACHE_SIZE,
+    )
+
+
+engine = _create_engine(settings.DATABASE_URL) # 在底层创建了一个连接池
+register_engine("primary", engine)
+statement_cache.register_engine("primary", engine)
+tracing.instrument_engine("primary", engine)
+# expire_on_commit=False: 提交后对象保留已加载的属性, 写接口返回刚写入的对象时不需要再 SELECT 一次
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False, bind=engine) # 从连接池当中借用链接,使用完后归还
+tracing.instrument_sessionmaker(SessionLocal)
 Base = declarative_base()
 
 # 中间表定义
 MovieActors = Table(
     'MovieActors', Base.metadata,
     Column('MovieID', Integer, ForeignKey('Movies.MovieID', ondelete="CASCADE"), primary_key=True),
-    Column('ActorID', Integer, ForeignKey('Actors.ActorID', ondelete="CASCADE"), primary_key=True)
+    Column('ActorID', Integer, ForeignKey('Actors.ActorID', ondelete="CASCADE"), primary_key=True),
+    # 主键以 MovieID 开头, 按演员反查电影需要单独的索引
+    Index('idx_movie_actors_actor', 'ActorID'),
 )
 
 MovieDirectors = Table(
     'MovieDirectors', Base.metadata,
     Column('MovieID', Integer, ForeignKey('Movies.MovieID', ondelete="CASCADE"), primary_key=True),
-    Column('DirectorID', Integer, ForeignKey('Directors.DirectorID', ondelete="CASCADE"), primary_key=True)
+    Column('DirectorID', Integer, ForeignKey('Directors.DirectorID', ondelete="CASCADE"), primary_key=True),
+    Index('idx_movie_directors_director', 'DirectorID'),
 )
 
-def get_db():
+# 定时任务最近一次执行的时间，多个 worker 据此判断本轮是否已经有人执行过
+ScheduledJobRuns = Table(
+    'ScheduledJobRuns', Base.metadata,
+    Column('JobName', String(100), primary_key=True),
+    Column('LastRunAt', DateTime, nullable=False),
+)
+
+
+class ReplicaRouter:
+    """
+    在多个只读副本之间轮询分配会话。
+    每个副本定期用 SELECT 1 做健康检查，失败的副本在下一次检查通过前不会再被选中。
+    """
+    def __init__(self, engines: List, check_interval: int):
+        self.engines = engines
+        self.check_interval = check_interval
+        self._sessionmakers = [sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False, bind=e) for e in engines]
+        self._healthy = [True] * len(engines)
+        self._checked_at = [0.0] * len(engines)
+        self._counter = itertools.count()
+        self._lock = threading.Lock()
+
+    def _check(self, index: int) -> bool:
+        try:
+            with self.engines[index].connect() as conn:
+                conn.execute(text("SELECT 1"))
+            healthy = True
+        except DBAPIError:
+            healthy = False
+        self._healthy[index] = healthy
+        self._checked_at[index] = time.monotonic()
+        return healthy
+
+    def is_healthy(self, index: int) -> bool:
+        if time.monotonic() - self._checked_at[index] < self.check_interval:
+            return self._healthy[index]
+        # 同一时间只让一个请求去做检查，其余请求沿用上一次的结果
+        if not self._lock.acquire(blocking=False):
+            return self._healthy[index]
+        try:
+            return self._check(index)
+        finally:
+            self._lock.release()
+
+    def mark_unhealthy(self, index: int):
+        self._healthy[index] = False
+        self._checked_at[index] = time.monotonic()
+
+    def get_session(self) -> Optional[Session]:
+        """按轮询顺序返回一个健康副本的会话，全部不可用时返回 None"""
+        for _ in range(len(self.engines)):
+            index = next(self._counter) % len(self.engines)
+            if self.is_healthy(index):
+                db = self._sessionmakers[index]()
+                db.info["replica_index"] = index
+                return db
+        return None
+
+
+replica_engines = [_create_engine(url) for url in settings.replica_urls]
+for _index, _replica_engine in enumerate(replica_engines):
+    register_engine(f"replica-{_index}", _replica_engine)
+    statement_cache.register_engine(f"replica-{_index}", _replica_engine)
+    tracing.instrument_engine(f"replica-{_index}", _replica_engine)
+replica_router = ReplicaRouter(replica_engines, settings.REPLICA_HEALTH_CHECK_INTERVAL) if replica_engines else None
+
+# 记录刚刚写过数据的用户，在 REPLICA_STICKY_SECONDS 内他们的读请求仍然走主库，
+# 避免因为副本复制延迟而读不到自己刚提交的评分或评论。
+# 所有记录的有效期相同，按写入顺序排列即按过期时间排列，超过上限时淘汰最早的一条
+_sticky_until: "OrderedDict[str, float]" = OrderedDict()
+_STICKY_MAX_ENTRIES = 10000
+# 写请求在线程池中并发提交，修改字典需要互斥
+_sticky_lock = threading.Lock()
+# 进程内的记录只对同一个 worker 有效; 写响应同时下发带签名的 cookie 记录截止时间，
+# 后续的读请求落到其他 worker 上也能据此走主库
+PRIMARY_STICKY_COOKIE = "primary_sticky"
+
+
+def _request_identity(request: Request) -> str:
+    """用JWT中的用户邮箱标识请求者，未登录时退回到客户端IP"""
+    authorization = request.headers.get("Authorization", "")
+    if authorization.startswith("Bearer "):
+        subject = get_token_subject(authorization[len("Bearer "):])
+        if subject:
+            return f"user:{subject}"
+    return f"ip:{request.client.host if request.client else ''}"
+
+
+def _mark_primary_sticky(identity: str):
+    now = time.monotonic()
+    with _sticky_lock:
+        _sticky_until[identity] = now + settings.REPLICA_STICKY_SECONDS
+        _sticky_until.move_to_end(identity)
+        while _sticky_until and (
+            len(_sticky_until) > _STICKY_MAX_ENTRIES or next(iter(_sticky_until.values())) <= now
+        ):
+            _sticky_until.popitem(last=False)
+
+
+def _is_primary_sticky(identity: str) -> bool:
+    until = _sticky_until.get(identity)
+    return until is not None and until > time.monotonic()
+
+
+def _sticky_signature(identity: str, until: int) -> str:
+    # 签名绑定请求者，cookie 不能伪造更长的有效期，也不能转给其他用户使用
+    message = f"{identity}:{until}".encode()
+    return hmac.new(settings.SECRET_KEY.encode(), message, hashlib.sha256).hexdigest()[:32]
+
+
+def _set_sticky_cookie(response: Response, identity: str):
+    until = int(time.time()) + settings.REPLICA_STICKY_SECONDS
+    response.set_cookie(
+        PRIMARY_STICKY_COOKIE,
+        f"{until}.{_sticky_signature(identity, until)}",
+        max_age=settings.REPLICA_STICKY_SECONDS,
+        httponly=True,
+        samesite="lax",
+    )
+
+
+def _has_sticky_cookie(request: Request, identity: str) -> bool:
+    until, _, signature = request.cookies.get(PRIMARY_STICKY_COOKIE, "").partition(".")
+    if not until.isdigit() or int(until) <= time.time():
+        return False
+    return hmac.compare_digest(signature, _sticky_signature(identity, int(until)))
+
+
+@event.listens_for(SessionLocal, "after_commit")
+def _after_primary_commit(session: Session):
+    identity = session.info.get("identity")
+    if not identity:
+        return
+    _mark_primary_sticky(identity)
+    response = session.info.get("response")
+    # 没有配置副本时所有读请求本来就走主库，不需要下发 cookie
+    if response is not None and replica_router is not None and not session.info.get("sticky_cookie_set"):
+        _set_sticky_cookie(response, identity)
+        session.info["sticky_cookie_set"] = True
+
+
+@tracing.traced("dependency.get_db")
+def get_db(request: Request, response: Response):
     db = SessionLocal()
+    db.info["identity"] = _request_identity(request)
+    # 提交时在这次请求的响应上设置 cookie, 接口返回模型时 FastAPI 会把这里的响应头合并进去
+    db.info["response"] = response
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+@tracing.traced("dependency.get_read_db")
+def get_read_db(request: Request):
+    """
+    只读接口使用的会话。
+    配置了副本时轮询分配到健康的副本；用户刚写过数据(本进程的记录或写响应下发的 cookie)
+    或副本全部不可用时回退到主库。
+    """
+    identity = _request_identity(request)
+    db = None
+    if (
+        replica_router is not None
+        and not _is_primary_sticky(identity)
+        and not _has_sticky_cookie(request, identity)
+    ):
+        db = replica_router.get_session()
+    if db is None:
+        db = SessionLocal()
+        db.info["identity"] = identity
     try:
         yield db
+    except OperationalError:
+        # 连接层面的错误说明副本可能已经不可用，立即将其摘除
+        if "replica_index" in db.info:
+            replica_router.mark_unhealthy(db.info["replica_index"])
+        raise
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
@@ -1,16 +1,109 @@
+import time
+from contextlib import asynccontextmanager
+from typing import Dict
 from fastapi import FastAPI
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse
 from starlette.staticfiles import StaticFiles
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.orm import sessionmaker
 
 from fastapi.middleware.cors import CORSMiddleware 
 import os               # 1. 导入os模块
 from pathlib import Path  # 2. 导入Path模块
 
 from app.api.v1 import api
-from app.database import Base, engine
+from app.database import Base, engine, replica_engines
+from app.core.config import settings
+from app.core.pool_metrics import warm_up_pool
+from app.core.compression import CompressionMiddleware
+from app.core.admission import LoadSheddingMiddleware
+from app.core.pagination import TOTAL_COUNT_HEADER, TOTAL_COUNT_EXACT_HEADER
+from app.core.lifecycle import lifecycle, InFlightMiddleware
+from app.core.tracing import TRACE_ID_HEADER, TracingMiddleware, tracer
+from app.core.serialization import dump_list
+from app.crud import crud_movie
+from app.schemas import movie_schema
+from app.services.trending import trending
+from app.services.jobs import scheduler
+from app.services.live import live
+from app.services.related import related
+from app.services.counts import counts
 
 ROOT_DIR = Path(__file__).resolve().parent.parent
+static_path = os.path.join(ROOT_DIR, "static")
+# 上传接口保存图片的目录
+UPLOAD_DIRS = ("avatars", "covers", "directors", "actors")
+
+def _ensure_static_dirs():
+    for name in UPLOAD_DIRS:
+        os.makedirs(os.path.join(static_path, "images", name), exist_ok=True)
+
+def _prime_caches(db_engine) -> Dict[str, float]:
+    """
+    按接口默认参数执行最热的查询并序列化结果: 编译并缓存这些 SQL(编译缓存按引擎区分)，
+    加载电影列表的内存快照，生成响应模型。返回每一步的耗时(毫秒)。
+    """
+    timings = {}
+    fields, expand = movie_schema.MOVIE_FIELDS, movie_schema.MOVIE_RELATIONS
+    with sessionmaker(bind=db_engine, expire_on_commit=False)() as db:
+        for name, prime in (
+            ("genres", lambda: crud_movie.get_genres(db)),
+            ("movies_first_page", lambda: dump_list(
+                movie_schema.movie_read_model(frozenset(fields), frozenset(expand)),
+                crud_movie.get_movies(db, fields=fields, expand=expand),
+            )),
+        ):
+            start = time.perf_counter()
+            prime()
+            timings[name] = round((time.perf_counter() - start) * 1000, 2)
+    return timings
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    lifecycle.mark_starting()
+    _ensure_static_dirs()
+    # 启动时预热连接池，让第一批请求不用再等待建立连接
+    warmup = min(settings.DB_POOL_WARMUP, settings.DB_POOL_SIZE)
+    for db_engine in [engine, *replica_engines]:
+        try:
+            opened = await run_in_threadpool(warm_up_pool, db_engine, warmup)
+            print(f"--- [后端日志] 连接池预热完成: {db_engine.url.render_as_string(hide_password=True)} ({opened}) ---")
+        except DBAPIError as e:
+            print(f"--- [后端日志] 连接池预热失败: {e} ---")
+    # 执行最热的查询，让第一批请求不用承担 SQL 编译和快照加载的开销
+    if settings.STARTUP_PRIME_CACHES:
+        for db_engine in [engine, *replica_engines]:
+            name = db_engine.url.render_as_string(hide_password=True)
+            try:
+                lifecycle.warmup[name] = await run_in_threadpool(_prime_caches, db_engine)
+            except DBAPIError as e:
+                lifecycle.warmup[name] = {"error": str(e.orig)}
+                print(f"--- [后端日志] 缓存预热失败: {e} ---")
+    # 恢复上次保存的热度数据
+    trending.load()
+    # 相关电影图在后台构建，构建完成前相关电影和个性化推荐返回空列表
+    related.refresh()
+    if settings.SCHEDULER_ENABLED:
+        scheduler.start()
+    live.start()
+    if settings.TRACING_ENABLED:
+        tracer.start()
+    lifecycle.install_signal_handler(delay=settings.SHUTDOWN_DRAIN_DELAY, timeout=settings.SHUTDOWN_DRAIN_TIMEOUT)
+    lifecycle.mark_ready()
+    yield
+    lifecycle.ready = False
+    lifecycle.restore_signal_handler()
+    live.stop()
+    scheduler.stop()
+    counts.stop()
+    trending.save()
+    tracer.stop()
 
-app = FastAPI(title="电影评分系统 API")
+# 排空时让 SSE 长连接尽快结束, 不占满排空时限
+lifecycle.on_drain(live.close_all)
+
+app = FastAPI(title="电影评分系统 API", lifespan=lifespan)
 
 # 定义允许访问的源列表
 # Access-Control-Allow-Origin
@@ -20,6 +113,15 @@ origins = [
     "*"
 ]
 
+# 过载保护: 被拒绝的请求不再经过路由和数据库。
+# 先添加的中间件在内层, 放在 CORS 之内, 503 响应也带有 CORS 头, 浏览器中的前端才能读到 Retry-After
+app.add_middleware(
+    LoadSheddingMiddleware,
+    max_in_flight=settings.LOAD_SHED_MAX_IN_FLIGHT,
+    max_pool_wait_ms=settings.LOAD_SHED_MAX_POOL_WAIT_MS,
+    retry_after=settings.LOAD_SHED_RETRY_AFTER,
+)
+
 # 添加CORS(跨资源共享)中间件到应用实例
 app.add_middleware(
     CORSMiddleware,
@@ -27,22 +129,46 @@ app.add_middleware(
     allow_credentials=True, # 支持 cookie
     allow_methods=["*"],    # 允许所有方法
     allow_headers=["*"],    # 允许所有请求头
+    expose_headers=[TOTAL_COUNT_HEADER, TOTAL_COUNT_EXACT_HEADER, TRACE_ID_HEADER, "Retry-After"], # 前端分页需要读取总数, 报告问题时附上 trace ID, 过载时按 Retry-After 重试
 )
 
-static_path = os.path.join(ROOT_DIR, "static")
+# 响应压缩中间件, 按客户端支持的编码选择 br / zstd / gzip
+app.add_middleware(
+    CompressionMiddleware,
+    minimum_size=settings.COMPRESSION_MINIMUM_SIZE,
+    gzip_level=settings.COMPRESSION_GZIP_LEVEL,
+    brotli_quality=settings.COMPRESSION_BROTLI_QUALITY,
+    zstd_level=settings.COMPRESSION_ZSTD_LEVEL,
+    cache_entries=settings.COMPRESSION_CACHE_ENTRIES,
+)
 
-# 确保目录是存在的
-if not os.path.exists(static_path):
-    os.makedirs(os.path.join(static_path, "images", "avatars"))
-    os.makedirs(os.path.join(static_path, "images", "covers"))
-    os.makedirs(os.path.join(static_path, "images", "directprs"))
-    os.makedirs(os.path.join(static_path, "images", "actors"))
+# 统计处理中的请求数, 停机时等待它们结束
+app.add_middleware(InFlightMiddleware, lifecycle=lifecycle)
+
+# 请求追踪放在最外层, 根 span 覆盖其他所有中间件
+app.add_middleware(TracingMiddleware)
 
 # StaticFiles(静态文件服务程序) 是一个专门用来提供静态文件服务的应用。
-app.mount("/static", StaticFiles(directory=static_path), name="static")
+# 目录在 lifespan 启动时创建, 这里不在导入时检查
+app.mount("/static", StaticFiles(directory=static_path, check_dir=False), name="static")
 
 app.include_router(api.api_router, prefix="/api/v1")
 
 @app.get("/")
 def read_root():
-    return {"message": "欢迎使用电影评分系统 API"}
\ No newline at end of file
+    return {"message": "欢迎使用电影评分系统 API"}
+
+@app.get("/health/live")
+def read_liveness():
+    """存活检查: 进程能够处理请求就返回 200，失败时应重启进程"""
+    return {"status": "alive"}
+
+@app.get("/health/ready")
+def read_readiness():
+    """
+    就绪检查: 启动预热完成前和停机排空期间返回 503，负载均衡据此决定是否转发请求。
+    """
+    return JSONResponse(
+        status_code=200 if lifecycle.ready else 503,
+        content={"status": "ready" if lifecycle.ready else ("draining" if lifecycle.draining else "starting"), **lifecycle.snapshot()},
+    )
\ No newline at end of file
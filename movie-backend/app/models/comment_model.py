@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, Text, ForeignKey,DateTime 
+from sqlalchemy import Column, Index, Integer, Text, ForeignKey,DateTime 
 from sqlalchemy.sql import func
 from app.database import Base
 from sqlalchemy.orm import relationship
@@ -12,4 +12,7 @@ class Comment(Base):
     Content = Column(Text, nullable=False)
     CreatedAt = Column(DateTime(timezone=True), server_default=func.now())
     
-    user = relationship("User", back_populates="comments")
\ No newline at end of file
+    user = relationship("User", back_populates="comments")
+
+    # 按电影分页读取评论时直接按索引顺序取出，不需要对该电影的全部评论排序
+    __table_args__ = (Index("idx_comments_movie_created", "MovieID", "CreatedAt"),)
\ No newline at end of file
@@ -11,6 +11,7 @@ class Director(Base):
     BirthDate = Column(Date)
     Nationality = Column(String(50))
     PhotoURL = Column(String(255), nullable=True)
+    Version = Column(Integer, nullable=False, default=1, server_default="1") # 版本号, 用于生成 ETag
 
     # 使用字符串 "Movie" 声明关系
     movies = relationship("Movie", secondary=MovieDirectors, back_populates="directors")
\ No newline at end of file
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Text, DECIMAL
+from sqlalchemy import Column, DateTime, Index, Integer, String, Text, DECIMAL
 from sqlalchemy.orm import relationship
 #  从database导入基类和关联表
 from app.database import Base, MovieActors, MovieDirectors
@@ -16,7 +16,25 @@ class Movie(Base):
     AverageRating = Column(DECIMAL(3, 1), nullable=False, default=0.0)
     RatingCount = Column(Integer, nullable=False, default=0)
     CoverURL = Column(String(255), nullable=True)
+    # 版本号, 每次写入电影(或其评分、演职人员)时加一, 用于生成 ETag
+    Version = Column(Integer, nullable=False, default=1, server_default="1")
+    # 评论列表的版本号, 增删改评论时加一
+    CommentsVersion = Column(Integer, nullable=False, default=1, server_default="1")
+    # 评论数和最新一条评论, 由 crud_comment 在增删评论时维护, 列表页不需要再统计 Comments 表
+    CommentCount = Column(Integer, nullable=False, default=0, server_default="0")
+    LatestCommentID = Column(Integer, nullable=True)
+    LatestCommentAt = Column(DateTime(timezone=True), nullable=True)
 
     # 使用字符串 "Actor" 和 "Director" 来声明关系，避免直接导入
     actors = relationship("Actor", secondary=MovieActors, back_populates="movies")
-    directors = relationship("Director", secondary=MovieDirectors, back_populates="movies")
\ No newline at end of file
+    directors = relationship("Director", secondary=MovieDirectors, back_populates="movies")
+    # 评分分布计数器, 删除电影时由数据库外键级联删除
+    rating_histogram = relationship(
+        "MovieRatingHistogram", uselist=False, cascade="all, delete-orphan", passive_deletes=True
+    )
+
+    # 列表页按评分/年份排序和按年份筛选使用的索引
+    __table_args__ = (
+        Index("idx_movies_average_rating", "AverageRating"),
+        Index("idx_movies_release_year", "ReleaseYear"),
+    )
\ No newline at end of file
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, TIMESTAMP, ForeignKey, CheckConstraint
+from sqlalchemy import Column, Index, Integer, TIMESTAMP, ForeignKey, CheckConstraint
 from sqlalchemy.sql import func
 from app.database import Base
 
@@ -12,4 +12,29 @@ class Rating(Base):
 
     __table_args__ = (
         CheckConstraint('Score >= 1 AND Score <= 10', name='score_check'),
-    )
\ No newline at end of file
+        # 主键以 UserID 开头, 按电影统计评分需要单独的索引; 带上 Score 后统计时不用回表
+        Index("idx_ratings_movie_score", "MovieID", "Score"),
+    )
+
+
+class MovieRatingHistogram(Base):
+    """
+    每部电影 1-10 分各有多少人评分的计数器。
+    由 Ratings 上的触发器在评分增删改时维护，可以用 rebuild_histograms 全量重建。
+    """
+    __tablename__ = "MovieRatingHistograms"
+
+    MovieID = Column(Integer, ForeignKey("Movies.MovieID", ondelete="CASCADE"), primary_key=True)
+    Score1 = Column(Integer, nullable=False, default=0, server_default="0")
+    Score2 = Column(Integer, nullable=False, default=0, server_default="0")
+    Score3 = Column(Integer, nullable=False, default=0, server_default="0")
+    Score4 = Column(Integer, nullable=False, default=0, server_default="0")
+    Score5 = Column(Integer, nullable=False, default=0, server_default="0")
+    Score6 = Column(Integer, nullable=False, default=0, server_default="0")
+    Score7 = Column(Integer, nullable=False, default=0, server_default="0")
+    Score8 = Column(Integer, nullable=False, default=0, server_default="0")
+    Score9 = Column(Integer, nullable=False, default=0, server_default="0")
+    Score10 = Column(Integer, nullable=False, default=0, server_default="0")
+
+    def counts(self):
+        return [getattr(self, f"Score{score}") for score in range(1, 11)]
@@ -1,5 +1,7 @@
-from pydantic import BaseModel
-from typing import Optional,List # 类型提示
+from datetime import datetime
+from functools import lru_cache
+from pydantic import BaseModel, ConfigDict, create_model
+from typing import Dict, FrozenSet, Literal, Optional,List, Type # 类型提示
 from . import actor_schema, director_schema
 
 # 基础模式，包含所有电影共有的字段
@@ -17,8 +19,8 @@ class MovieCreate(MovieBase):
     actor_ids: List[int] = []
     director_ids: List[int] = []
 
-# 用于更新电影的模式，所有字段都是可选的
-class MovieUpdate(BaseModel):
+# 电影本身的可更新字段，所有字段都是可选的
+class MovieFieldsUpdate(BaseModel):
     Title: Optional[str] = None
     ReleaseYear: Optional[int] = None
     Duration: Optional[int] = None
@@ -26,6 +28,9 @@ class MovieUpdate(BaseModel):
     Language: Optional[str] = None
     Country: Optional[str] = None
     Synopsis: Optional[str] = None
+
+# 用于更新电影的模式，可以同时整体替换演员和导演
+class MovieUpdate(MovieFieldsUpdate):
     actor_ids: Optional[List[int]] = None
     director_ids: Optional[List[int]] = None
 
@@ -35,8 +40,126 @@ class MovieRead(MovieBase):
     AverageRating: float
     RatingCount: int
     CoverURL: Optional[str] = None
+    CommentCount: int = 0
+    LatestCommentID: Optional[int] = None
+    LatestCommentAt: Optional[datetime] = None
     actors: List[actor_schema.ActorRead] = []
     directors: List[director_schema.DirectorRead] = []
 
     class Config:
-        from_attributes = True # 兼容ORM模型
\ No newline at end of file
+        from_attributes = True # 兼容ORM模型
+
+# 稀疏字段集: fields= 可选的普通字段, expand= 可展开的关联关系
+MOVIE_RELATIONS = ("actors", "directors")
+MOVIE_FIELDS = tuple(name for name in MovieRead.model_fields if name not in MOVIE_RELATIONS)
+
+@lru_cache(maxsize=256)
+def movie_read_model(fields: FrozenSet[str], expand: FrozenSet[str]) -> Type[BaseModel]:
+    """
+    按请求的字段和展开关系动态生成一个 MovieRead 的子集模型。
+    子模型只声明被请求的属性，序列化时不会访问(也就不会触发懒加载)其余属性。
+    """
+    if fields == frozenset(MOVIE_FIELDS) and expand == frozenset(MOVIE_RELATIONS):
+        return MovieRead
+    selected = {
+        name: (info.annotation, info)
+        for name, info in MovieRead.model_fields.items()
+        if name in fields or name in expand
+    }
+    return create_model("MovieReadSparse", __config__=ConfigDict(from_attributes=True), **selected)
+
+@lru_cache(maxsize=256)
+def movie_list_normalized_model(fields: FrozenSet[str], expand: FrozenSet[str]) -> Type[BaseModel]:
+    """
+    去重(normalized)格式的电影列表模型。
+    每部电影只携带 actor_ids / director_ids，演员和导演按ID放在顶层字典中，每人只出现一次。
+    """
+    selected = {
+        name: (info.annotation, info)
+        for name, info in MovieRead.model_fields.items()
+        if name in fields
+    }
+    for relation in MOVIE_RELATIONS:
+        if relation in expand:
+            selected[f"{relation[:-1]}_ids"] = (List[int], [])
+    movie_model = create_model("MovieNormalized", __config__=ConfigDict(from_attributes=True), **selected)
+    return create_model(
+        "MovieListNormalized",
+        __config__=ConfigDict(from_attributes=True),
+        movies=(List[movie_model], ...),
+        actors=(Dict[int, actor_schema.ActorRead], {}),
+        directors=(Dict[int, director_schema.DirectorRead], {}),
+    )
+
+# 批量操作: 修改字段、删除电影、增删演员和导演关联，在一个事务中完成
+class MovieBulkUpdateItem(BaseModel):
+    MovieID: int
+    changes: MovieFieldsUpdate
+
+class MovieLinkDiff(BaseModel):
+    MovieID: int
+    add_actor_ids: List[int] = []
+    remove_actor_ids: List[int] = []
+    add_director_ids: List[int] = []
+    remove_director_ids: List[int] = []
+
+class MovieBulkRequest(BaseModel):
+    update: List[MovieBulkUpdateItem] = []
+    delete: List[int] = []
+    links: List[MovieLinkDiff] = []
+
+class MovieBulkItemResult(BaseModel):
+    MovieID: int
+    op: Literal["update", "delete", "links"]
+    status: Literal["ok", "not_found", "invalid", "conflict"]
+    detail: Optional[str] = None
+    actors_added: int = 0
+    actors_removed: int = 0
+    directors_added: int = 0
+    directors_removed: int = 0
+
+class MovieBulkResult(BaseModel):
+    dry_run: bool
+    applied: int # status 为 ok 的项数
+    results: List[MovieBulkItemResult]
+
+# 演员/导演作品列表的一页
+class FilmographyPage(BaseModel):
+    items: List[MovieRead]
+    next_cursor: Optional[str] = None # 为空表示已经是最后一页
+
+# 热门电影列表中的一项
+class TrendingMovie(BaseModel):
+    MovieID: int
+    Title: str
+    ReleaseYear: Optional[int] = None
+    CoverURL: Optional[str] = None
+    AverageRating: float
+    RatingCount: int
+    TrendingScore: float
+
+    class Config:
+        from_attributes = True
+
+class RelatedMovie(BaseModel):
+    MovieID: int
+    Title: str
+    ReleaseYear: Optional[int] = None
+    CoverURL: Optional[str] = None
+    AverageRating: float
+    RatingCount: int
+    RelatedScore: float # 共同演员、导演和类型重合度加权得到的相似度
+
+# 个性化推荐列表中的一项
+class FeedMovie(BaseModel):
+    MovieID: int
+    Title: str
+    ReleaseYear: Optional[int] = None
+    CoverURL: Optional[str] = None
+    AverageRating: float
+    RatingCount: int
+    FeedScore: float
+    BecauseMovieID: Optional[int] = None # 推荐理由: 用户打过高分、与这部电影共同演职人员或类型最多的电影
+
+
+TRENDING_FIELDS = tuple(name for name in TrendingMovie.model_fields if name != "TrendingScore")
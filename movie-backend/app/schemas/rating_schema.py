@@ -1,5 +1,6 @@
 from pydantic import BaseModel, Field
 from datetime import datetime
+from typing import List, Optional
 
 class RatingBase(BaseModel):
     Score: int = Field(..., ge=1, le=10, description="评分必须在1到10之间")
@@ -13,4 +14,12 @@ class RatingRead(RatingBase):
     CreatedAt: datetime
 
     class Config:
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
+
+class MovieRatingStats(BaseModel):
+    MovieID: int
+    histogram: List[int] = Field(..., description="1-10分各自的评分人数, 下标0对应1分")
+    count: int
+    mean: Optional[float] = None
+    median: Optional[float] = None
+    stddev: Optional[float] = None
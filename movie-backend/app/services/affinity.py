@@ -0,0 +1,343 @@
+import bisect
+import math
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.models import rating_model
+from app.services.related import related
+
+# numpy 是可选依赖，未安装时逐个特征累加打分，结果相同但大片库下较慢
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+def _centered(score: int) -> float:
+    """1-10 分映射到 [-1, 1]: 高分表示喜欢，低分表示不喜欢，5.5 分不产生偏好"""
+    return (score - 5.5) / 4.5
+
+
+class _MovieFeatures:
+    """
+    所有电影的特征向量，CSR 格式: 第 i 部电影(movie_ids[i])的特征是 indices[indptr[i]:indptr[i + 1]]。
+    特征为演员、导演和类型，值为类型权重除以 sqrt(特征数)，演员很多的电影不会因此得分更高。
+    """
+    def __init__(self, version: int, features: Dict[int, Tuple[List[int], List[float]]]):
+        self.version = version
+        self.by_movie = features
+        self.movie_ids = sorted(features)
+        self.indptr = [0]
+        self.indices: List[int] = []
+        self.values: List[float] = []
+        for movie_id in self.movie_ids:
+            feature_ids, values = features[movie_id]
+            self.indices.extend(feature_ids)
+            self.values.extend(values)
+            self.indptr.append(len(self.indices))
+        if np is not None:
+            self.np_movie_ids = np.array(self.movie_ids, dtype=np.int64)
+            self.np_indices = np.array(self.indices, dtype=np.int64)
+            self.np_values = np.array(self.values, dtype=np.float64)
+            # 每个非零元素所属的行号，打分时用 bincount 按行求和
+            self.np_rows = np.repeat(np.arange(len(self.movie_ids)), np.diff(np.array(self.indptr, dtype=np.int64)))
+
+
+class _UserProfile:
+    """
+    单个用户的评分和偏好向量。评分按 MovieID 排序存放在两个紧凑数组中，
+    偏好向量是 {特征ID: 权重} 的稀疏表示，只包含用户评过分的电影涉及的特征。
+    """
+    __slots__ = ("movie_ids", "scores", "preferences", "features_version", "loaded_at", "liked_by_person")
+
+    def __init__(self, loaded_at: float):
+        self.movie_ids = array("l")
+        self.scores = array("b")
+        self.preferences: Dict[int, float] = {}
+        self.features_version = -1
+        self.loaded_at = loaded_at
+        # {演员/导演特征ID: [(评分, MovieID), ...]}，只包含打了高分的电影，用于给出推荐理由; 评分变化后置空
+        self.liked_by_person: Optional[Dict[int, List[Tuple[int, int]]]] = None
+
+    def score_of(self, movie_id: int) -> Optional[int]:
+        index = bisect.bisect_left(self.movie_ids, movie_id)
+        if index < len(self.movie_ids) and self.movie_ids[index] == movie_id:
+            return self.scores[index]
+        return None
+
+    def set_score(self, movie_id: int, score: Optional[int]):
+        self.liked_by_person = None
+        index = bisect.bisect_left(self.movie_ids, movie_id)
+        exists = index < len(self.movie_ids) and self.movie_ids[index] == movie_id
+        if score is None:
+            if exists:
+                del self.movie_ids[index]
+                del self.scores[index]
+        elif exists:
+            self.scores[index] = score
+        else:
+            self.movie_ids.insert(index, movie_id)
+            self.scores.insert(index, score)
+
+
+class AffinityModel:
+    """
+    基于演员、导演和类型偏好的个性化推荐。
+
+    用户的偏好向量是其评过分的电影特征向量按评分加权求和(高于 5.5 分为正，低于为负)。
+    评分写入时按新旧分数的差值增量更新偏好向量；电影的演员/导演/类型变化后，
+    下一次读取时用内存中的评分列表重新计算，不需要查询数据库。
+    推荐时用偏好向量与所有电影的特征向量做点积，排除已评分的电影后取前 N 名。
+
+    用户数据按最近使用保留 AFFINITY_MAX_USERS 个，超过 AFFINITY_PROFILE_TTL 秒后从数据库重新加载，
+    以同步其他 worker 上发生的评分。
+
+    锁只在读写用户数据时持有: 查询数据库、构建电影特征和打分都在锁外进行。
+    电影特征构建好后整体替换，同一时间只有一个请求构建，其他请求继续使用旧的特征；
+    相关电影图变化后最多每 AFFINITY_FEATURE_REFRESH_INTERVAL 秒重建一次。
+    """
+    def __init__(self, max_users: int, profile_ttl: float):
+        self.max_users = max_users
+        self.profile_ttl = profile_ttl
+        self._profiles: "OrderedDict[int, _UserProfile]" = OrderedDict()
+        self._feature_ids: Dict[Tuple[str, object], int] = {}
+        self._genre_features: set = set()
+        self._movie_features: Optional[_MovieFeatures] = None
+        self._features_built_at = 0.0
+        self._lock = threading.Lock()
+        # 保证同一时间只有一个线程构建电影特征，特征编号也只在持有它时分配
+        self._build_lock = threading.Lock()
+        # 正在从数据库加载的用户 {UserID: 加载期间是否有新的评分}
+        self._loading: Dict[int, bool] = {}
+
+        self.feeds = 0
+        self.profile_loads = 0
+        self.incremental_updates = 0
+        self.feature_builds = 0
+        self.last_feed_ms = 0.0
+
+    # ---------- 电影特征 ----------
+
+    def _feature_id(self, kind: str, key) -> int:
+        # 特征编号只增不减, 重建电影特征后用户偏好向量中的编号依然有效
+        feature = self._feature_ids.setdefault((kind, key), len(self._feature_ids))
+        if kind == "genre":
+            self._genre_features.add(feature)
+        return feature
+
+    def _features(self) -> _MovieFeatures:
+        related.ensure_loaded()
+        current = self._movie_features
+        if current is not None and (
+            current.version == related.version
+            or time.monotonic() - self._features_built_at < settings.AFFINITY_FEATURE_REFRESH_INTERVAL
+        ):
+            return current
+        # 已经有旧的特征时不等待正在进行的构建
+        if not self._build_lock.acquire(blocking=current is None):
+            return current
+        try:
+            current = self._movie_features
+            if current is not None and current.version == related.version:
+                return current
+            version, links = related.movie_features()
+            features = {}
+            for movie_id, (actors, directors, genres) in links.items():
+                weighted = (
+                    [(self._feature_id("actor", person), settings.AFFINITY_ACTOR_WEIGHT) for person in actors]
+                    + [(self._feature_id("director", person), settings.AFFINITY_DIRECTOR_WEIGHT) for person in directors]
+                    + [(self._feature_id("genre", genre), settings.AFFINITY_GENRE_WEIGHT) for genre in genres]
+                )
+                norm = math.sqrt(len(weighted)) if weighted else 1.0
+                features[movie_id] = ([feature for feature, _ in weighted], [weight / norm for _, weight in weighted])
+            built = _MovieFeatures(version, features)
+            self._movie_features = built
+            # 相关电影图还没加载完时构建的是空特征，加载完成后要立即重建
+            self._features_built_at = time.monotonic() if related.loaded else 0.0
+            self.feature_builds += 1
+            return built
+        finally:
+            self._build_lock.release()
+
+    # ---------- 用户偏好 ----------
+
+    @staticmethod
+    def _apply(profile: _UserProfile, features: _MovieFeatures, movie_id: int, delta: float):
+        feature_ids, values = features.by_movie.get(movie_id, ((), ()))
+        preferences = profile.preferences
+        for feature, value in zip(feature_ids, values):
+            weight = preferences.get(feature, 0.0) + delta * value
+            if abs(weight) < 1e-9:
+                preferences.pop(feature, None)
+            else:
+                preferences[feature] = weight
+
+    def _recompute(self, profile: _UserProfile, features: _MovieFeatures):
+        profile.preferences = {}
+        for movie_id, score in zip(profile.movie_ids, profile.scores):
+            self._apply(profile, features, movie_id, _centered(score))
+        profile.features_version = features.version
+        profile.liked_by_person = None
+
+    def _load_profile(self, db: Session, user_id: int) -> _UserProfile:
+        now = time.monotonic()
+        with self._lock:
+            profile = self._profiles.get(user_id)
+            if profile is not None and now - profile.loaded_at <= self.profile_ttl:
+                self._profiles.move_to_end(user_id)
+                return profile
+            self._loading[user_id] = False
+        try:
+            Rating = rating_model.Rating
+            rows = db.execute(
+                select(Rating.MovieID, Rating.Score).where(Rating.UserID == user_id).order_by(Rating.MovieID)
+            ).all()
+        except Exception:
+            with self._lock:
+                self._loading.pop(user_id, None)
+            raise
+        profile = _UserProfile(loaded_at=now)
+        profile.movie_ids.extend(movie_id for movie_id, _ in rows)
+        profile.scores.extend(score for _, score in rows)
+        with self._lock:
+            self.profile_loads += 1
+            # 查询期间有新的评分时，查询结果可能没有包含它: 这次照常使用，但不缓存，下次请求重新加载
+            if not self._loading.pop(user_id, False):
+                self._profiles[user_id] = profile
+                self._profiles.move_to_end(user_id)
+                while len(self._profiles) > self.max_users:
+                    self._profiles.popitem(last=False)
+        return profile
+
+    def record_rating(self, user_id: int, movie_id: int, score: Optional[int]):
+        """
+        评分新增、修改(score 为新分数)或删除(score 为 None)后调用。
+        只更新已经在内存中的用户，其他用户在下一次请求推荐时从数据库加载。
+        """
+        with self._lock:
+            if user_id in self._loading:
+                self._loading[user_id] = True
+            profile = self._profiles.get(user_id)
+            features = self._movie_features
+            if profile is None:
+                return
+            old = profile.score_of(movie_id)
+            profile.set_score(movie_id, score)
+            if features is None or profile.features_version != features.version:
+                return  # 读取时会整体重新计算
+            delta = (_centered(score) if score is not None else 0.0) - (_centered(old) if old is not None else 0.0)
+            if delta:
+                self._apply(profile, features, movie_id, delta)
+            self.incremental_updates += 1
+
+    # ---------- 推荐 ----------
+
+    def _score_all(self, features: _MovieFeatures, preferences: Dict[int, float]):
+        if np is not None:
+            vector = np.zeros(len(self._feature_ids), dtype=np.float64)
+            vector[np.fromiter(preferences.keys(), dtype=np.int64, count=len(preferences))] = np.fromiter(
+                preferences.values(), dtype=np.float64, count=len(preferences)
+            )
+            contributions = vector[features.np_indices] * features.np_values
+            return np.bincount(features.np_rows, weights=contributions, minlength=len(features.movie_ids))
+        scores = []
+        for row in range(len(features.movie_ids)):
+            start, end = features.indptr[row], features.indptr[row + 1]
+            scores.append(sum(
+                preferences.get(feature, 0.0) * value
+                for feature, value in zip(features.indices[start:end], features.values[start:end])
+            ))
+        return scores
+
+    def _top(self, features: _MovieFeatures, scores, rated: array, k: int) -> List[Tuple[int, float]]:
+        if np is not None:
+            # 已评分的电影在有序的 movie_ids 中二分查找到位置后清零
+            rated_ids = np.array(rated, dtype=np.int64)
+            positions = np.searchsorted(features.np_movie_ids, rated_ids)
+            found = positions < len(features.movie_ids)
+            positions, rated_ids = positions[found], rated_ids[found]
+            scores[positions[features.np_movie_ids[positions] == rated_ids]] = 0.0
+            candidates = np.flatnonzero(scores > 0)
+            if len(candidates) > k:
+                candidates = candidates[np.argpartition(-scores[candidates], k - 1)[:k]]
+            order = candidates[np.lexsort((features.np_movie_ids[candidates], -scores[candidates]))]
+            return [(int(features.np_movie_ids[i]), float(scores[i])) for i in order]
+        rated_set = set(rated)
+        ranked = [
+            (movie_id, score) for movie_id, score in zip(features.movie_ids, scores)
+            if score > 0 and movie_id not in rated_set
+        ]
+        ranked.sort(key=lambda item: (-item[1], item[0]))
+        return ranked[:k]
+
+    def _because(self, features: _MovieFeatures, profile: _UserProfile, movie_id: int) -> Optional[int]:
+        """
+        在用户打了高分的电影中找出与推荐电影共同演员、导演最多的一部，作为推荐理由。
+        类型太宽泛，不作为理由。按演职人员建立的索引在评分或电影特征变化前重复使用。
+        """
+        if profile.liked_by_person is None:
+            index: Dict[int, List[Tuple[int, int]]] = {}
+            for rated_id, score in zip(profile.movie_ids, profile.scores):
+                if score <= 5:
+                    continue
+                for feature in features.by_movie.get(rated_id, ((), ()))[0]:
+                    if feature not in self._genre_features:
+                        index.setdefault(feature, []).append((score, rated_id))
+            profile.liked_by_person = index
+        shared: Dict[int, List[int]] = {}
+        for feature in features.by_movie.get(movie_id, ((), ()))[0]:
+            for score, rated_id in profile.liked_by_person.get(feature, ()):
+                entry = shared.setdefault(rated_id, [0, score])
+                entry[0] += 1
+        if not shared:
+            return None
+        # 共同人数最多的优先，其次是评分更高的，再其次是 MovieID 小的
+        return min(shared, key=lambda rated_id: (-shared[rated_id][0], -shared[rated_id][1], rated_id))
+
+    def feed(self, db: Session, user_id: int, k: int) -> List[Tuple[int, float, Optional[int]]]:
+        """返回 [(MovieID, 推荐分, 推荐理由的 MovieID)]，不包含用户已经评过分的电影"""
+        start = time.perf_counter()
+        features = self._features()
+        profile = self._load_profile(db, user_id)
+        with self._lock:
+            if profile.features_version != features.version:
+                self._recompute(profile, features)
+            preferences = dict(profile.preferences)
+            rated = array("l", profile.movie_ids)
+        if not preferences:
+            result = []
+        else:
+            ranked = self._top(features, self._score_all(features, preferences), rated, k)
+            with self._lock:
+                result = [
+                    (movie_id, round(score, 4), self._because(features, profile, movie_id))
+                    for movie_id, score in ranked
+                ]
+        with self._lock:
+            self.feeds += 1
+            self.last_feed_ms = round((time.perf_counter() - start) * 1000, 3)
+        return result
+
+    def snapshot(self) -> Dict:
+        features = self._movie_features
+        return {
+            "numpy": np is not None,
+            "users": len(self._profiles),
+            "features": len(self._feature_ids),
+            "movies": len(features.movie_ids) if features else 0,
+            "feature_builds": self.feature_builds,
+            "profile_loads": self.profile_loads,
+            "incremental_updates": self.incremental_updates,
+            "feeds": self.feeds,
+            "last_feed_ms": self.last_feed_ms,
+        }
+
+
+affinity = AffinityModel(max_users=settings.AFFINITY_MAX_USERS, profile_ttl=settings.AFFINITY_PROFILE_TTL)
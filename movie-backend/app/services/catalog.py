@@ -0,0 +1,347 @@
+import threading
+import time
+from typing import Dict, Iterable, List, Optional
+
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.models import movie_model
+
+# numpy 是可选依赖，未安装时电影列表始终走 SQL 查询
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# 类型位图使用 uint64，超过 64 种类型时多出来的类型交给 SQL 处理
+_MAX_GENRE_BITS = 64
+# 排序键: 高位为排序列，低 32 位为 MovieID 取反，同分时按 MovieID 升序，分页结果稳定
+_ID_BITS = 32
+_ID_MASK = (1 << _ID_BITS) - 1
+
+_COLUMNS = (
+    movie_model.Movie.MovieID,
+    movie_model.Movie.Version,
+    movie_model.Movie.ReleaseYear,
+    movie_model.Movie.AverageRating,
+    movie_model.Movie.RatingCount,
+    movie_model.Movie.Genre,
+    movie_model.Movie.Country,
+)
+
+
+class CatalogSnapshot:
+    """
+    电影目录的列式内存快照，用于回答电影列表的筛选和排序。
+    每列是一个 NumPy 数组，筛选条件转换为向量化的布尔掩码，前 N 名用 argpartition 选出，
+    再只对这 N 个元素排序。查询只返回排好序的 MovieID，电影本身仍按主键从数据库批量读取。
+
+    快照通过 Movies.Version 增量同步: 任何写入(包括评分触发器改变平均分)都会让电影版本号加一，
+    每隔 sync_interval 秒先比较 COUNT(*) 和 SUM(Version)，有变化再读取 (MovieID, Version) 找出变化的行，
+    只重新读取这些行，用于同步其他 worker 的写入。
+    本进程内的写入调用 mark_stale(movie_ids) 登记变化的电影，下一次查询前只按主键重新读取这些行。
+
+    同步时的数据库查询不持有 self._lock，只在替换数组时短暂持有；同一时间只有一个请求在同步，
+    其他请求不等待，直接使用当前的快照(首次加载除外)。
+    """
+    def __init__(self, sync_interval: float):
+        self.sync_interval = sync_interval
+        self._lock = threading.Lock()
+        self._sync_lock = threading.Lock()
+        self._dirty_lock = threading.Lock()
+        self._dirty: set = set()
+        self._loaded = False
+        self._stale = True
+        self._synced_at = 0.0
+        self._signature = None
+
+        self.genre_bits: Dict[str, int] = {}
+        self.overflow_genres: set = set()
+        self.country_codes: Dict[str, int] = {}
+        if np is not None:
+            self._reset_arrays()
+
+        self.queries = 0
+        self.fallbacks = 0
+        self.full_loads = 0
+        self.incremental_syncs = 0
+        self.rows_synced = 0
+
+    @property
+    def available(self) -> bool:
+        return np is not None and settings.CATALOG_ENABLED
+
+    def _reset_arrays(self):
+        self.ids = np.empty(0, dtype=np.int64)
+        self.versions = np.empty(0, dtype=np.int64)
+        self.years = np.empty(0, dtype=np.int32)
+        self.ratings = np.empty(0, dtype=np.int32)  # AverageRating * 10, DECIMAL(3,1) 可以精确表示
+        self.counts = np.empty(0, dtype=np.int64)
+        self.genres = np.empty(0, dtype=np.uint64)
+        self.countries = np.empty(0, dtype=np.int32)
+
+    def mark_stale(self, movie_ids: Optional[Iterable[int]] = None):
+        """
+        本进程写入电影或评分后调用，下一次查询前先同步。
+        传入变化的 MovieID 时只重新读取这些行，不传时比较所有电影的版本号。
+        """
+        if movie_ids is None:
+            self._stale = True
+            return
+        with self._dirty_lock:
+            self._dirty.update(movie_ids)
+
+    # ---------- 同步 ----------
+
+    def _genre_mask(self, genre: Optional[str]) -> int:
+        mask = 0
+        for token in (genre or "").split("/"):
+            token = token.strip().casefold()
+            if not token:
+                continue
+            bit = self.genre_bits.get(token)
+            if bit is None:
+                if len(self.genre_bits) >= _MAX_GENRE_BITS:
+                    self.overflow_genres.add(token)
+                    continue
+                bit = self.genre_bits[token] = len(self.genre_bits)
+            mask |= 1 << bit
+        return mask
+
+    def _country_code(self, country: Optional[str]) -> int:
+        if not country:
+            return -1
+        return self.country_codes.setdefault(country, len(self.country_codes))
+
+    def _encode_rows(self, rows):
+        return (
+            np.array([row.MovieID for row in rows], dtype=np.int64),
+            np.array([row.Version for row in rows], dtype=np.int64),
+            np.array([row.ReleaseYear if row.ReleaseYear is not None else -1 for row in rows], dtype=np.int32),
+            np.array([round(float(row.AverageRating or 0) * 10) for row in rows], dtype=np.int32),
+            np.array([row.RatingCount or 0 for row in rows], dtype=np.int64),
+            np.array([self._genre_mask(row.Genre) for row in rows], dtype=np.uint64),
+            np.array([self._country_code(row.Country) for row in rows], dtype=np.int32),
+        )
+
+    def _set_arrays(self, arrays):
+        self.ids, self.versions, self.years, self.ratings, self.counts, self.genres, self.countries = arrays
+
+    def _full_load(self, db: Session):
+        rows = db.execute(select(*_COLUMNS).order_by(movie_model.Movie.MovieID)).all()
+        with self._lock:
+            self.genre_bits.clear()
+            self.overflow_genres.clear()
+            self.country_codes.clear()
+            self._set_arrays(self._encode_rows(rows))
+            self._loaded = True
+        self.full_loads += 1
+
+    @staticmethod
+    def _read_rows(db: Session, movie_ids: List[int]):
+        Movie = movie_model.Movie
+        rows = []
+        for start in range(0, len(movie_ids), 1000):
+            chunk = movie_ids[start:start + 1000]
+            rows.extend(db.execute(select(*_COLUMNS).where(Movie.MovieID.in_(chunk))).all())
+        return rows
+
+    def _merge(self, rows, removed):
+        """去掉 removed 中的行和要替换的旧行，合并新读取的行"""
+        with self._lock:
+            fresh = self._encode_rows(rows)
+            # 先去掉旧行，再合并新行并按 MovieID 排序，searchsorted 依赖有序的 ids
+            keep = ~np.isin(self.ids, np.concatenate([np.asarray(removed, dtype=np.int64), fresh[0]]))
+            merged = tuple(np.concatenate([old[keep], new]) for old, new in zip(self._arrays(), fresh))
+            order = np.argsort(merged[0], kind="stable")
+            self._set_arrays(tuple(array[order] for array in merged))
+        self.rows_synced += len(rows)
+
+    def _incremental_sync(self, db: Session):
+        # 只有持有 _sync_lock 的线程会替换数组，这里在锁外读取是安全的
+        ids, versions = self.ids, self.versions
+        Movie = movie_model.Movie
+        current = db.execute(select(Movie.MovieID, Movie.Version)).all()
+        current_ids = np.array([row[0] for row in current], dtype=np.int64)
+        current_versions = np.array([row[1] for row in current], dtype=np.int64)
+
+        # 已不存在的电影
+        removed = ids[~np.isin(ids, current_ids)]
+
+        # 找出新增的和版本号变化的电影
+        if len(ids):
+            positions = np.minimum(np.searchsorted(ids, current_ids), len(ids) - 1)
+            known = ids[positions] == current_ids
+            changed = ~known | (versions[positions] != current_versions)
+        else:
+            changed = np.ones(len(current_ids), dtype=bool)
+        changed_ids = current_ids[changed]
+        if len(changed_ids) == 0 and len(removed) == 0:
+            return
+        self._merge(self._read_rows(db, changed_ids.tolist()), removed)
+        self.incremental_syncs += 1
+
+    def _sync_rows(self, db: Session, movie_ids: set):
+        """按主键重新读取本进程修改过的电影，读不到的是已被删除的"""
+        rows = self._read_rows(db, sorted(movie_ids))
+        self._merge(rows, sorted(movie_ids - {row.MovieID for row in rows}))
+        self.incremental_syncs += 1
+
+    def _arrays(self):
+        return (self.ids, self.versions, self.years, self.ratings, self.counts, self.genres, self.countries)
+
+    def _sync(self, db: Session):
+        now = time.monotonic()
+        due = not self._loaded or self._stale or now - self._synced_at >= self.sync_interval
+        if not due and not self._dirty:
+            return
+        # 已经加载过时不等待其他请求的同步
+        if not self._sync_lock.acquire(blocking=not self._loaded):
+            return
+        with self._dirty_lock:
+            dirty, self._dirty = self._dirty, set()
+        stale = False
+        try:
+            if self._loaded and not self._stale and now - self._synced_at < self.sync_interval:
+                if dirty:
+                    self._sync_rows(db, dirty)
+                return
+            stale = self._stale
+            self._stale = False
+            self._synced_at = now
+            Movie = movie_model.Movie
+            signature = tuple(db.execute(select(func.count(), func.coalesce(func.sum(Movie.Version), 0))).one())
+            if not self._loaded:
+                self._full_load(db)
+            elif stale or signature != self._signature:
+                # 比较所有版本号时也会读到本进程修改过的行
+                self._incremental_sync(db)
+            elif dirty:
+                self._sync_rows(db, dirty)
+            self._signature = signature
+        except Exception:
+            # 下一次查询重试
+            self._stale = self._stale or stale
+            with self._dirty_lock:
+                self._dirty |= dirty
+            raise
+        finally:
+            self._sync_lock.release()
+
+    # ---------- 查询 ----------
+
+    def _genre_filter(self, genre: str) -> Optional[int]:
+        """
+        SQL 中的条件是 Genre ILIKE '%genre%'。不含 '/'、通配符和首尾空白的关键字匹配整个字符串，
+        等价于匹配其中某一个类型，所以可以转换为"包含关键字的类型"的位掩码。
+        """
+        if any(char in genre for char in "/%_") or genre != genre.strip():
+            return None
+        needle = genre.casefold()
+        if any(needle in token for token in self.overflow_genres):
+            return None
+        mask = 0
+        for token, bit in self.genre_bits.items():
+            if needle in token:
+                mask |= 1 << bit
+        return mask
+
+    def _mask(self, genre, year, min_rating, country):
+        """筛选条件对应的布尔掩码，快照无法回答时返回 None。调用方需持有 self._lock"""
+        mask = np.ones(len(self.ids), dtype=bool)
+        if genre:
+            genre_mask = self._genre_filter(genre)
+            if genre_mask is None:
+                return None
+            mask &= (self.genres & np.uint64(genre_mask)) != 0
+        if year:
+            mask &= self.years == year
+        if min_rating is not None:
+            # 与 DECIMAL(3,1) 列比较: rating >= min_rating 等价于 rating*10 >= ceil(min_rating*10)
+            mask &= self.ratings >= np.ceil(round(min_rating * 10, 6))
+        if country:
+            code = self.country_codes.get(country)
+            if code is None:
+                mask[:] = False
+            else:
+                mask &= self.countries == code
+        return mask
+
+    def count(
+        self,
+        db: Session,
+        *,
+        genre: Optional[str] = None,
+        year: Optional[int] = None,
+        min_rating: Optional[float] = None,
+        country: Optional[str] = None,
+    ) -> Optional[int]:
+        """满足筛选条件的电影数；快照无法回答时返回 None"""
+        if not self.available:
+            return None
+        self._sync(db)
+        with self._lock:
+            mask = self._mask(genre, year, min_rating, country)
+            return None if mask is None else int(np.count_nonzero(mask))
+
+    def query(
+        self,
+        db: Session,
+        *,
+        genre: Optional[str] = None,
+        year: Optional[int] = None,
+        min_rating: Optional[float] = None,
+        country: Optional[str] = None,
+        search: Optional[str] = None,
+        sort_by: Optional[str] = None,
+        skip: int = 0,
+        limit: int = 100,
+    ) -> Optional[List[int]]:
+        """
+        返回筛选、排序、分页后的 MovieID 列表；快照无法回答时返回 None，由调用方回退到 SQL。
+        """
+        if not self.available or search:
+            # 搜索需要匹配演员和导演的名字，不在快照中
+            self.fallbacks += 1
+            return None
+        self._sync(db)
+        with self._lock:
+            self.queries += 1
+            mask = self._mask(genre, year, min_rating, country)
+            if mask is None:
+                self.fallbacks += 1
+                return None
+
+            candidates = np.flatnonzero(mask)
+            sort_values = self.years if sort_by == "release_year_desc" else self.ratings
+            keys = (sort_values[candidates].astype(np.int64) << _ID_BITS) | (_ID_MASK - self.ids[candidates])
+            wanted = skip + limit
+            if wanted <= 0 or len(candidates) == 0 or skip >= len(candidates):
+                return []
+            if wanted < len(candidates):
+                # 只保证前 wanted 个是最大的，再对这一小部分排序
+                top = np.argpartition(-keys, wanted - 1)[:wanted]
+            else:
+                top = np.arange(len(candidates))
+            top = top[np.argsort(-keys[top], kind="stable")]
+            return self.ids[candidates[top[skip:wanted]]].tolist()
+
+    def snapshot(self) -> Dict:
+        return {
+            "available": self.available,
+            "loaded": self._loaded,
+            "pending_rows": len(self._dirty),
+            "movies": int(len(self.ids)) if np is not None else 0,
+            "genres": len(self.genre_bits),
+            "overflow_genres": len(self.overflow_genres),
+            "countries": len(self.country_codes),
+            "queries": self.queries,
+            "fallbacks": self.fallbacks,
+            "full_loads": self.full_loads,
+            "incremental_syncs": self.incremental_syncs,
+            "rows_synced": self.rows_synced,
+        }
+
+
+catalog = CatalogSnapshot(sync_interval=settings.CATALOG_SYNC_INTERVAL)
@@ -0,0 +1,180 @@
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Hashable, NamedTuple, Optional, Tuple
+
+from sqlalchemy import func, select, text
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+
+
+class TotalCount(NamedTuple):
+    value: int
+    exact: bool
+
+
+class CountCache:
+    """
+    列表总数的缓存，以 (资源, 筛选条件) 为键。
+
+    每种资源有一个代数计数器，本进程写入后调用 invalidate() 让代数加一，旧代数的缓存随即失效；
+    其他 worker 的写入通过 COUNT_CACHE_TTL 过期来同步。
+    资源名可以带一级子资源，例如 "movies:rating" 表示依赖评分的电影总数: 它的代数是自身与 "movies" 的代数之和，
+    invalidate("movies") 让两者都失效，invalidate("movies:rating") 只让依赖评分的缓存失效。
+    计算代价高的筛选(例如全文搜索)不在请求中同步计算: 先返回估算值，同时交给后台线程池计算精确值，
+    算好后写入缓存，后续请求得到精确值。线程池只有 background_workers 个线程，
+    排队的计算超过 background_queue 个时新的计算直接放弃(只返回估算值)，避免大量不同的搜索词占满连接池。
+    """
+    def __init__(self, ttl: float, max_entries: int, background_workers: int = 1, background_queue: int = 16):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.background_workers = background_workers
+        self.background_queue = background_queue
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._entries: "OrderedDict[Tuple[str, Hashable], Tuple[int, int, float]]" = OrderedDict()
+        self._generations: Dict[str, int] = {}
+        self._pending: set = set()
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.estimates = 0
+        self.background_counts = 0
+        self.background_dropped = 0
+
+    def invalidate(self, resource: str):
+        with self._lock:
+            self._generations[resource] = self._generations.get(resource, 0) + 1
+
+    def _current(self, resource: str) -> int:
+        parent, _, child = resource.partition(":")
+        generation = self._generations.get(resource, 0)
+        return generation + self._generations.get(parent, 0) if child else generation
+
+    def get(self, resource: str, signature: Hashable) -> Optional[int]:
+        key = (resource, signature)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, generation, expires_at = entry
+                if generation == self._current(resource) and expires_at > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def generation(self, resource: str) -> int:
+        with self._lock:
+            return self._current(resource)
+
+    def put(self, resource: str, signature: Hashable, value: int, generation: Optional[int] = None):
+        """generation 为开始计算时的代数: 计算期间发生了写入时结果已经过期，不再缓存"""
+        with self._lock:
+            current = self._current(resource)
+            if generation is not None and generation != current:
+                return
+            self._entries[(resource, signature)] = (value, current, time.monotonic() + self.ttl)
+            self._entries.move_to_end((resource, signature))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get_or_count(self, resource: str, signature: Hashable, db: Session, count: Callable[[Session], int]) -> TotalCount:
+        """命中缓存时直接返回，否则同步计算精确值并缓存"""
+        cached = self.get(resource, signature)
+        if cached is not None:
+            return TotalCount(cached, True)
+        generation = self.generation(resource)
+        value = count(db)
+        self.put(resource, signature, value, generation)
+        return TotalCount(value, True)
+
+    def get_or_estimate(
+        self,
+        resource: str,
+        signature: Hashable,
+        estimate: int,
+        count: Callable[[Session], int],
+    ) -> TotalCount:
+        """命中缓存时返回精确值，否则返回估算值，并在后台计算精确值"""
+        cached = self.get(resource, signature)
+        if cached is not None:
+            return TotalCount(cached, True)
+        key = (resource, signature)
+        with self._lock:
+            self.estimates += 1
+            start = key not in self._pending and len(self._pending) < self.background_queue
+            if start:
+                self._pending.add(key)
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=self.background_workers, thread_name_prefix="count")
+                executor = self._executor
+            elif key not in self._pending:
+                self.background_dropped += 1
+        if start:
+            executor.submit(self._count_in_background, resource, signature, count, self.generation(resource))
+        return TotalCount(estimate, False)
+
+    def stop(self):
+        """停机时放弃还在排队的计算"""
+        with self._lock:
+            executor, self._executor = self._executor, None
+            self._pending.clear()
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def _count_in_background(self, resource: str, signature: Hashable, count: Callable[[Session], int], generation: int):
+        # 延迟导入: database 模块导入时会读取配置并创建引擎
+        from app.database import SessionLocal
+        try:
+            with SessionLocal() as db:
+                self.put(resource, signature, count(db), generation)
+            with self._lock:
+                self.background_counts += 1
+        except Exception as e:
+            print(f"--- [后端日志] 后台计算总数失败 ({resource}): {e} ---")
+        finally:
+            with self._lock:
+                self._pending.discard((resource, signature))
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "estimates": self.estimates,
+                "background_counts": self.background_counts,
+                "background_dropped": self.background_dropped,
+                "pending": len(self._pending),
+                "generations": dict(self._generations),
+            }
+
+
+def estimate_table_rows(db: Session, table) -> int:
+    """
+    表的估算行数。MySQL 读取 information_schema 中的统计信息，不扫描表；
+    其他数据库没有现成的统计信息，直接 COUNT(*)。
+    """
+    if db.get_bind().dialect.name == "mysql":
+        rows = db.execute(
+            text(
+                "SELECT TABLE_ROWS FROM information_schema.TABLES "
+                "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = :name"
+            ),
+            {"name": table.name},
+        ).scalar()
+        if rows is not None:
+            return int(rows)
+    return db.execute(select(func.count()).select_from(table)).scalar_one()
+
+
+counts = CountCache(
+    ttl=settings.COUNT_CACHE_TTL,
+    max_entries=settings.COUNT_CACHE_MAX_ENTRIES,
+    background_workers=settings.COUNT_BACKGROUND_WORKERS,
+    background_queue=settings.COUNT_BACKGROUND_QUEUE,
+)
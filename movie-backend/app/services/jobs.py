@@ -0,0 +1,104 @@
+import time
+from pathlib import Path
+
+from sqlalchemy import select, text
+
+from app.core.config import settings
+from app.core.scheduler import Job, Scheduler
+from app.crud import crud_rating
+from app.database import SessionLocal, engine
+from app.models import actor_model, director_model, movie_model, user_model
+from app.services.related import related
+from app.services.trending import trending
+
+STATIC_DIR = Path(__file__).resolve().parent.parent.parent / "static"
+IMAGE_DIRS = ["covers", "actors", "directors", "avatars"]
+
+
+def verify_rating_aggregates() -> str:
+    """
+    对照 Ratings 表检查 Movies 上由触发器维护的 AverageRating / RatingCount，
+    修正触发器缺失或手工改数据造成的偏差。
+    检查和修正在同一条 UPDATE 中完成: 先读后写时，两步之间发生的评分会被旧的统计值覆盖。
+    ROUND(AVG, 1) 与触发器写入 DECIMAL(3,1) 列时的舍入一致；没有评分的电影通过 LEFT JOIN 归零。
+    """
+    with SessionLocal() as db:
+        result = db.execute(text(
+            "UPDATE Movies m "
+            "LEFT JOIN ("
+            "    SELECT MovieID, COUNT(*) AS real_count, ROUND(AVG(Score), 1) AS real_average"
+            "    FROM Ratings GROUP BY MovieID"
+            ") r ON r.MovieID = m.MovieID "
+            "SET m.AverageRating = COALESCE(r.real_average, 0), "
+            "    m.RatingCount = COALESCE(r.real_count, 0), "
+            "    m.Version = m.Version + 1 "
+            "WHERE m.RatingCount <> COALESCE(r.real_count, 0) "
+            "   OR m.AverageRating <> COALESCE(r.real_average, 0)"
+        ))
+        db.commit()
+    return f"修正 {result.rowcount} 部电影"
+
+
+def rebuild_rating_histograms() -> str:
+    with SessionLocal() as db:
+        rebuilt = crud_rating.rebuild_histograms(db)
+    return f"重建 {rebuilt} 部电影的评分分布"
+
+
+def persist_trending() -> None:
+    trending.save()
+    # 同时读入其他 worker 保存的热度，各 worker 返回的排名保持一致
+    trending.load()
+
+
+def compact_trending() -> str:
+    return f"合并 {trending.compact()} 个已退出 worker 的热度文件"
+
+
+def rebuild_related_graph() -> str:
+    with SessionLocal() as db:
+        related.build(db)
+    return f"相关电影图: {related.snapshot()['edges']} 条边"
+
+
+def sweep_orphaned_images() -> str:
+    """
+    删除 static/images 下没有被任何电影、演员、导演或用户引用的图片。
+    更换图片时旧文件已经被删除，这里主要清理上传后写库失败留下的文件。
+    只处理修改时间早于 ORPHAN_IMAGE_GRACE_HOURS 的文件，避免误删刚上传、尚未写库的图片。
+    """
+    url_columns = [
+        movie_model.Movie.CoverURL,
+        actor_model.Actor.PhotoURL,
+        director_model.Director.PhotoURL,
+        user_model.User.AvatarURL,
+    ]
+    with SessionLocal() as db:
+        referenced = set()
+        for column in url_columns:
+            referenced.update(url for url in db.scalars(select(column).where(column.is_not(None))))
+
+    cutoff = time.time() - settings.ORPHAN_IMAGE_GRACE_HOURS * 3600
+    removed = 0
+    for name in IMAGE_DIRS:
+        directory = STATIC_DIR / "images" / name
+        if not directory.is_dir():
+            continue
+        for path in directory.iterdir():
+            if not path.is_file() or path.stat().st_mtime > cutoff:
+                continue
+            url = "/static/" + path.relative_to(STATIC_DIR).as_posix()
+            if url not in referenced:
+                path.unlink(missing_ok=True)
+                removed += 1
+    return f"删除 {removed} 个未引用的图片"
+
+
+scheduler = Scheduler(engine, Path(settings.SCHEDULER_LOCK_DIR))
+scheduler.add_job(Job("verify_rating_aggregates", verify_rating_aggregates, interval=3600))
+scheduler.add_job(Job("rebuild_rating_histograms", rebuild_rating_histograms, cron="30 4 * * *"))
+scheduler.add_job(Job("sweep_orphaned_images", sweep_orphaned_images, cron="0 3 * * *"))
+# 热度数据保存在每个 worker 各自的内存里，每个 worker 都要保存自己的那份
+scheduler.add_job(Job("persist_trending", persist_trending, interval=settings.TRENDING_PERSIST_INTERVAL, single_runner=False))
+scheduler.add_job(Job("compact_trending", compact_trending, interval=3600))
+scheduler.add_job(Job("rebuild_related_graph", rebuild_related_graph, interval=settings.RELATED_REBUILD_INTERVAL, single_runner=False))
@@ -0,0 +1,383 @@
+import asyncio
+import json
+import os
+import socket
+import threading
+from pathlib import Path
+from typing import AsyncIterator, Callable, Dict, List, Optional, Set
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.database import SessionLocal
+from app.models import movie_model
+
+# redis 是可选依赖，只有 LIVE_BROKER 配置为 redis:// 地址时才需要
+try:
+    import redis
+except ImportError:
+    redis = None
+
+# 队列中的这两个标记表示订阅者因为消费太慢被断开 / 服务器即将停机
+_CLOSE = object()
+_SHUTDOWN = object()
+_CLOSE_REASONS = {_CLOSE: "slow_consumer", _SHUTDOWN: "shutdown"}
+# UDP 数据报的安全上限, 超过的事件只在本进程内分发
+_MAX_DATAGRAM = 60000
+
+
+def _encode(event: dict) -> bytes:
+    return json.dumps(event, ensure_ascii=False, default=str).encode("utf-8")
+
+
+# ---------- 跨 worker 转发 ----------
+
+class MemoryBroker:
+    """只在进程内分发，单 worker 部署时使用"""
+    def start(self, on_event: Callable[[dict], None]):
+        self._on_event = on_event
+
+    def publish(self, event: dict):
+        self._on_event(event)
+
+    def stop(self):
+        pass
+
+
+class LocalRelayBroker:
+    """
+    同一台机器上多个 worker 之间的本地转发，不需要额外的消息服务。
+    每个 worker 在 127.0.0.1 上绑定一个 UDP 端口，并在 relay_dir 中登记 "<pid>.port" 文件；
+    发布事件时先在本进程分发，再发送给登记目录中其他存活的 worker。
+    """
+    def __init__(self, relay_dir: Path):
+        self.relay_dir = relay_dir
+        self._socket: Optional[socket.socket] = None
+        self._port_file: Optional[Path] = None
+        self._thread: Optional[threading.Thread] = None
+        self.relayed = 0
+        self.received = 0
+
+    def start(self, on_event: Callable[[dict], None]):
+        self._on_event = on_event
+        self._socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self._socket.bind(("127.0.0.1", 0))
+        self.relay_dir.mkdir(parents=True, exist_ok=True)
+        self._port_file = self.relay_dir / f"{os.getpid()}.port"
+        self._port_file.write_text(str(self._socket.getsockname()[1]), encoding="ascii")
+        self._thread = threading.Thread(target=self._receive, name="live-relay", daemon=True)
+        self._thread.start()
+
+    def _peers(self) -> List[int]:
+        ports = []
+        for path in self.relay_dir.glob("*.port"):
+            if path == self._port_file:
+                continue
+            try:
+                pid = int(path.stem)
+                os.kill(pid, 0)  # 只检查进程是否存在
+                ports.append(int(path.read_text(encoding="ascii")))
+            except ProcessLookupError:
+                path.unlink(missing_ok=True)  # 进程已退出, 清理它留下的登记文件
+            except (ValueError, OSError):
+                continue
+        return ports
+
+    def publish(self, event: dict):
+        self._on_event(event)
+        if self._socket is None:
+            return
+        data = _encode(event)
+        if len(data) > _MAX_DATAGRAM:
+            return
+        for port in self._peers():
+            try:
+                self._socket.sendto(data, ("127.0.0.1", port))
+                self.relayed += 1
+            except OSError:
+                continue
+
+    def _receive(self):
+        while self._socket is not None:
+            try:
+                data = self._socket.recv(65536)
+            except OSError:
+                return  # stop() 关闭了 socket
+            try:
+                event = json.loads(data)
+            except ValueError:
+                continue
+            self.received += 1
+            self._on_event(event)
+
+    def stop(self):
+        sock, self._socket = self._socket, None
+        if sock is not None:
+            sock.close()
+        if self._port_file is not None:
+            self._port_file.unlink(missing_ok=True)
+
+
+class RedisBroker:
+    """
+    通过 Redis 发布/订阅在多台机器的 worker 之间转发。
+    client 可以是任何兼容 redis-py 接口的对象。
+    """
+    CHANNEL = "movie-live"
+
+    def __init__(self, client):
+        self.client = client
+        self._pubsub = None
+        self._thread = None
+
+    def start(self, on_event: Callable[[dict], None]):
+        def handle(message):
+            try:
+                on_event(json.loads(message["data"]))
+            except ValueError:
+                pass
+
+        self._pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+        self._pubsub.subscribe(**{self.CHANNEL: handle})
+        self._thread = self._pubsub.run_in_thread(sleep_time=1.0, daemon=True)
+
+    def publish(self, event: dict):
+        # 包括本进程在内的所有订阅者都会从频道中收到事件
+        self.client.publish(self.CHANNEL, _encode(event))
+
+    def stop(self):
+        if self._thread is not None:
+            self._thread.stop()
+        if self._pubsub is not None:
+            self._pubsub.close()
+
+
+def _create_broker():
+    if settings.LIVE_BROKER.startswith("redis://") or settings.LIVE_BROKER.startswith("rediss://"):
+        if redis is None:
+            raise RuntimeError("LIVE_BROKER 配置了 Redis 地址但未安装 redis 包")
+        return RedisBroker(redis.Redis.from_url(settings.LIVE_BROKER))
+    if settings.LIVE_BROKER == "local":
+        return LocalRelayBroker(Path(settings.LIVE_RELAY_DIR))
+    return MemoryBroker()
+
+
+# ---------- 进程内分发 ----------
+
+class _Subscriber:
+    def __init__(self, movie_id: int, loop: asyncio.AbstractEventLoop, queue_size: int):
+        self.movie_id = movie_id
+        self.loop = loop
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.closed = False
+
+    def offer(self, message: str, hub: "LiveHub"):
+        """在事件循环线程中执行。队列已满说明客户端读得太慢，清空队列并断开它"""
+        if self.closed:
+            return
+        try:
+            self.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            self.close(hub, _CLOSE)
+            hub.slow_disconnects += 1
+
+    def close(self, hub: "LiveHub", marker=_SHUTDOWN):
+        """在事件循环线程中执行。丢弃积压的事件，只留下关闭标记"""
+        if self.closed:
+            return
+        self.closed = True
+        while not self.queue.empty():
+            self.queue.get_nowait()
+        self.queue.put_nowait(marker)
+        hub.unsubscribe(self)
+
+
+class LiveHub:
+    """
+    电影页面的实时更新，通过 SSE 推送给浏览器。
+
+    评论的增删改直接推送；评分变化频繁，只把电影标记为"有变化"，
+    由后台任务每隔 LIVE_RATING_INTERVAL 秒用一次查询读取所有有变化且有人订阅的电影的平均分和评分人数，
+    合并推送一次快照。每个订阅者有一个长度为 LIVE_QUEUE_SIZE 的队列，写满时断开这个订阅者，
+    不会因为个别慢客户端占用越来越多的内存。
+    写接口所在的 worker 通过 broker 把事件转发给其他 worker。
+    """
+    def __init__(self, queue_size: int, max_subscribers: int, rating_interval: float):
+        self.queue_size = queue_size
+        self.max_subscribers = max_subscribers
+        self.rating_interval = rating_interval
+        self.broker = None
+        self._subscribers: Dict[int, Set[_Subscriber]] = {}
+        self._dirty_ratings: Set[int] = set()
+        self._lock = threading.Lock()
+        self._flusher: Optional[asyncio.Task] = None
+
+        self.published = 0
+        self.delivered = 0
+        self.rating_snapshots = 0
+        self.slow_disconnects = 0
+
+    # ---------- 生命周期 ----------
+
+    def start(self):
+        if self.broker is None:
+            self.broker = _create_broker()
+            self.broker.start(self._on_event)
+
+    def stop(self):
+        if self._flusher is not None:
+            self._flusher.cancel()
+            self._flusher = None
+        if self.broker is not None:
+            self.broker.stop()
+            self.broker = None
+
+    # ---------- 发布 ----------
+
+    def _publish(self, event: dict):
+        self.published += 1
+        if self.broker is None:
+            # 没有经过 lifespan 启动(例如脚本中直接调用 crud)时只在本进程内分发
+            self._on_event(event)
+            return
+        try:
+            self.broker.publish(event)
+        except Exception as e:
+            print(f"--- [后端日志] 实时事件转发失败: {e} ---")
+            self._on_event(event)
+
+    def rating_changed(self, movie_id: int):
+        self._publish({"type": "rating_changed", "movie_id": movie_id})
+
+    def comment_event(self, movie_id: int, event_type: str, comment: dict):
+        self._publish({"type": event_type, "movie_id": movie_id, "data": comment})
+
+    def _on_event(self, event: dict):
+        """broker 收到事件(可能来自其他 worker)时调用，可能在任意线程中"""
+        movie_id = event.get("movie_id")
+        with self._lock:
+            if movie_id not in self._subscribers:
+                return
+            if event.get("type") == "rating_changed":
+                self._dirty_ratings.add(movie_id)
+                return
+        self._deliver(movie_id, format_event(event["type"], event.get("data")))
+
+    def _deliver(self, movie_id: int, message: str):
+        with self._lock:
+            subscribers = list(self._subscribers.get(movie_id, ()))
+        for subscriber in subscribers:
+            subscriber.loop.call_soon_threadsafe(subscriber.offer, message, self)
+            self.delivered += 1
+
+    # ---------- 评分快照 ----------
+
+    async def _flush_ratings(self):
+        while True:
+            await asyncio.sleep(self.rating_interval)
+            with self._lock:
+                movie_ids = [movie_id for movie_id in self._dirty_ratings if movie_id in self._subscribers]
+                self._dirty_ratings.clear()
+            if not movie_ids:
+                continue
+            try:
+                snapshots = await asyncio.to_thread(self._read_snapshots, movie_ids)
+            except Exception as e:
+                print(f"--- [后端日志] 读取评分快照失败: {e} ---")
+                continue
+            for movie_id, snapshot in snapshots.items():
+                self._deliver(movie_id, format_event("rating", snapshot))
+                self.rating_snapshots += 1
+
+    @staticmethod
+    def _read_snapshots(movie_ids: List[int]) -> Dict[int, dict]:
+        with SessionLocal() as db:
+            return read_rating_snapshots(db, movie_ids)
+
+    # ---------- 订阅 ----------
+
+    def subscribe(self, movie_id: int) -> Optional[_Subscriber]:
+        """在事件循环中调用。订阅者已满时返回 None"""
+        loop = asyncio.get_running_loop()
+        if self._flusher is None or self._flusher.done():
+            self._flusher = loop.create_task(self._flush_ratings())
+        with self._lock:
+            if sum(len(subscribers) for subscribers in self._subscribers.values()) >= self.max_subscribers:
+                return None
+            subscriber = _Subscriber(movie_id, loop, self.queue_size)
+            self._subscribers.setdefault(movie_id, set()).add(subscriber)
+        return subscriber
+
+    def close_all(self):
+        """停机排空时调用: 通知所有订阅者连接即将关闭，客户端会重连到其他实例"""
+        with self._lock:
+            subscribers = [subscriber for items in self._subscribers.values() for subscriber in items]
+        for subscriber in subscribers:
+            subscriber.loop.call_soon_threadsafe(subscriber.close, self)
+
+    def unsubscribe(self, subscriber: _Subscriber):
+        with self._lock:
+            subscribers = self._subscribers.get(subscriber.movie_id)
+            if subscribers is not None:
+                subscribers.discard(subscriber)
+                if not subscribers:
+                    del self._subscribers[subscriber.movie_id]
+
+    async def stream(self, subscriber: _Subscriber, initial: List[str]) -> AsyncIterator[str]:
+        """SSE 响应体: 先发送初始快照，之后转发队列中的事件，空闲时发送心跳注释保持连接"""
+        try:
+            for message in initial:
+                yield message
+            while True:
+                try:
+                    message = await asyncio.wait_for(subscriber.queue.get(), timeout=settings.LIVE_HEARTBEAT_INTERVAL)
+                except asyncio.TimeoutError:
+                    yield ": ping\n\n"
+                    continue
+                if message in _CLOSE_REASONS:
+                    yield format_event("close", {"reason": _CLOSE_REASONS[message]})
+                    return
+                yield message
+        finally:
+            self.unsubscribe(subscriber)
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            subscribers = sum(len(items) for items in self._subscribers.values())
+            movies = len(self._subscribers)
+        return {
+            "broker": type(self.broker).__name__ if self.broker else None,
+            "subscribers": subscribers,
+            "movies": movies,
+            "published": self.published,
+            "delivered": self.delivered,
+            "rating_snapshots": self.rating_snapshots,
+            "slow_disconnects": self.slow_disconnects,
+            "relayed": getattr(self.broker, "relayed", None),
+            "received": getattr(self.broker, "received", None),
+        }
+
+
+def format_event(event_type: str, data) -> str:
+    payload = json.dumps(data, ensure_ascii=False, default=str)
+    return f"event: {event_type}\ndata: {payload}\n\n"
+
+
+def read_rating_snapshots(db: Session, movie_ids: List[int]) -> Dict[int, dict]:
+    """一次查询读取多部电影的平均分和评分人数"""
+    Movie = movie_model.Movie
+    rows = db.execute(
+        select(Movie.MovieID, Movie.AverageRating, Movie.RatingCount).where(Movie.MovieID.in_(movie_ids))
+    ).all()
+    return {
+        movie_id: {"MovieID": movie_id, "AverageRating": float(average), "RatingCount": count}
+        for movie_id, average, count in rows
+    }
+
+
+live = LiveHub(
+    queue_size=settings.LIVE_QUEUE_SIZE,
+    max_subscribers=settings.LIVE_MAX_SUBSCRIBERS,
+    rating_interval=settings.LIVE_RATING_INTERVAL,
+)
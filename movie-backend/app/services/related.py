@@ -0,0 +1,344 @@
+import heapq
+import threading
+import time
+from array import array
+from typing import Dict, FrozenSet, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.database import MovieActors, MovieDirectors, SessionLocal
+from app.models import movie_model
+
+
+# 局部更新的行先记在覆盖表中，超过这个行数时合并回 CSR 数组(定时全量重建也会合并)
+_MAX_OVERRIDE_ROWS = 4096
+
+
+def _genre_tokens(genre: Optional[str]) -> FrozenSet[str]:
+    return frozenset(token.strip() for token in (genre or "").split("/") if token.strip())
+
+
+class _Graph:
+    """
+    CSR 格式的邻接表，以 MovieID 为行号: 电影 m 的相关电影是 indices[indptr[m]:indptr[m + 1]]，
+    对应的相似度在 weights 的同一区间，每行已按相似度从高到低排好、最多 top_k 个。
+    读取前 K 个相关电影只是一次切片。
+
+    局部更新不重写 CSR 数组: 新图与旧图共享数组，变化的行放在 overrides 中，读取时优先查找。
+    """
+    def __init__(self, indptr: array, indices: array, weights: array,
+                 overrides: Optional[Dict[int, List[Tuple[int, float]]]] = None):
+        self.indptr = indptr
+        self.indices = indices
+        self.weights = weights
+        self.overrides = overrides or {}
+
+    @classmethod
+    def empty(cls) -> "_Graph":
+        return cls(array("q", [0]), array("q"), array("d"))
+
+    def row(self, movie_id: int, k: int) -> List[Tuple[int, float]]:
+        override = self.overrides.get(movie_id)
+        if override is not None:
+            return override[:k]
+        if movie_id + 1 >= len(self.indptr):
+            return []
+        start = self.indptr[movie_id]
+        end = min(self.indptr[movie_id + 1], start + k)
+        return list(zip(self.indices[start:end], self.weights[start:end]))
+
+    def with_rows(self, rows: Dict[int, List[Tuple[int, float]]]) -> "_Graph":
+        """
+        返回覆盖了若干行的新图，开销与覆盖表的大小有关、与电影总数无关；
+        覆盖的行超过 _MAX_OVERRIDE_ROWS 时合并成新的 CSR 数组。
+        """
+        overrides = {**self.overrides, **rows}
+        if len(overrides) > _MAX_OVERRIDE_ROWS:
+            return _Graph(self.indptr, self.indices, self.weights).replace_rows(overrides)
+        return _Graph(self.indptr, self.indices, self.weights, overrides)
+
+    def replace_rows(self, rows: Dict[int, List[Tuple[int, float]]]) -> "_Graph":
+        """返回替换了若干行(忽略覆盖表)的新图: 未变化的行整段复制，变化的行重新写入"""
+        size = max(len(self.indptr) - 1, max(rows, default=-1) + 1)
+        indptr, indices, weights = array("q", [0]), array("q"), array("d")
+        position = 0
+        for movie_id in sorted(rows):
+            # 复制 [position, movie_id) 之间未变化的行
+            if position < len(self.indptr) - 1:
+                stop = min(movie_id, len(self.indptr) - 1)
+                self._copy(position, stop, indptr, indices, weights)
+            while len(indptr) <= movie_id:
+                indptr.append(len(indices))
+            for neighbor, weight in rows[movie_id]:
+                indices.append(neighbor)
+                weights.append(weight)
+            indptr.append(len(indices))
+            position = movie_id + 1
+        if position < len(self.indptr) - 1:
+            self._copy(position, len(self.indptr) - 1, indptr, indices, weights)
+        while len(indptr) < size + 1:
+            indptr.append(len(indices))
+        return _Graph(indptr, indices, weights)
+
+    def _copy(self, first: int, stop: int, indptr: array, indices: array, weights: array):
+        if first >= stop:
+            return
+        start, end = self.indptr[first], self.indptr[stop]
+        offset = len(indices) - start
+        indices.extend(self.indices[start:end])
+        weights.extend(self.weights[start:end])
+        indptr.extend(self.indptr[i] + offset for i in range(first + 1, stop + 1))
+
+    @property
+    def edges(self) -> int:
+        edges = len(self.indices)
+        for movie_id, row in self.overrides.items():
+            if movie_id + 1 < len(self.indptr):
+                edges -= self.indptr[movie_id + 1] - self.indptr[movie_id]
+            edges += len(row)
+        return edges
+
+
+class RelatedGraph:
+    """
+    按共同演员、导演计算的电影相似度图，可选地叠加类型重合度(Jaccard)。
+
+    内存中保留演员/导演到电影的反向索引，计算时只需要遍历一部电影的演职人员参演的其他电影；
+    参演电影超过 RELATED_MAX_PERSON_MOVIES 部的人员(群演、龙套)区分度很低，不参与计算。
+    类型重合度只叠加在已经有共同演职人员的电影之间，避免全量两两比较。
+
+    电影的演员/导演/类型变化时，只重新计算这部电影和与它有共同演职人员(变化前后)的电影所在的行，
+    写入图的覆盖表，不复制整张图；其他 worker 的修改由定时任务全量重建时同步。
+
+    全量重建不在请求中进行: 启动时、删除演员/导演(mark_stale)后由后台线程重建，同一时间只有一个重建，
+    重建期间请求继续读取旧的图。重建读取数据库期间发生的局部更新会记录下来，在新数据上重放。
+    """
+    def __init__(self, top_k: int):
+        self.top_k = top_k
+        self._graph = _Graph.empty()
+        self._lock = threading.Lock()
+        self._build_lock = threading.Lock()
+        self._loaded = False
+        self._stale = False
+        # 重建读取数据库期间收到的局部更新 {MovieID: (演员ID, 导演ID, 类型) 或 None(已删除)}
+        self._pending: Optional[Dict[int, Optional[tuple]]] = None
+        # 每次全量重建或局部更新后加一, 依赖演员/导演/类型索引的其他组件据此判断是否需要重新计算
+        self.version = 0
+
+        self.movie_actors: Dict[int, FrozenSet[int]] = {}
+        self.movie_directors: Dict[int, FrozenSet[int]] = {}
+        self.movie_genres: Dict[int, FrozenSet[str]] = {}
+        self.actor_movies: Dict[int, Set[int]] = {}
+        self.director_movies: Dict[int, Set[int]] = {}
+
+        self.full_builds = 0
+        self.incremental_updates = 0
+        self.rows_rebuilt = 0
+        self.last_build_ms = 0.0
+
+    # ---------- 构建 ----------
+
+    def _neighbors(self, movie_id: int) -> List[Tuple[int, float]]:
+        scores: Dict[int, float] = {}
+        limit = settings.RELATED_MAX_PERSON_MOVIES
+        for people, movies_of, weight in (
+            (self.movie_actors, self.actor_movies, settings.RELATED_ACTOR_WEIGHT),
+            (self.movie_directors, self.director_movies, settings.RELATED_DIRECTOR_WEIGHT),
+        ):
+            for person_id in people.get(movie_id, ()):
+                movies = movies_of.get(person_id, ())
+                if len(movies) > limit:
+                    continue
+                for other in movies:
+                    if other != movie_id:
+                        scores[other] = scores.get(other, 0.0) + weight
+
+        genre_weight = settings.RELATED_GENRE_WEIGHT
+        genres = self.movie_genres.get(movie_id, frozenset())
+        if genre_weight and genres:
+            for other in scores:
+                other_genres = self.movie_genres.get(other, frozenset())
+                if other_genres:
+                    scores[other] += genre_weight * len(genres & other_genres) / len(genres | other_genres)
+
+        # 同分时 MovieID 小的在前
+        top = heapq.nsmallest(self.top_k, scores.items(), key=lambda item: (-item[1], item[0]))
+        return [(other, round(score, 6)) for other, score in top]
+
+    def _affected(self, movie_ids: Iterable[int]) -> Set[int]:
+        """与给定电影有共同演职人员的电影(包括它们自己)"""
+        affected = set(movie_ids)
+        for movie_id in list(affected):
+            for people, movies_of in (
+                (self.movie_actors, self.actor_movies),
+                (self.movie_directors, self.director_movies),
+            ):
+                for person_id in people.get(movie_id, ()):
+                    affected.update(movies_of.get(person_id, ()))
+        return affected
+
+    def _set_links(self, movie_id: int, actor_ids, director_ids, genre: Optional[str]):
+        for people, movies_of, new_ids in (
+            (self.movie_actors, self.actor_movies, actor_ids),
+            (self.movie_directors, self.director_movies, director_ids),
+        ):
+            if new_ids is None:
+                continue
+            for person_id in people.pop(movie_id, ()):
+                movies_of.get(person_id, set()).discard(movie_id)
+            if new_ids:
+                people[movie_id] = frozenset(new_ids)
+                for person_id in new_ids:
+                    movies_of.setdefault(person_id, set()).add(movie_id)
+        self.movie_genres[movie_id] = _genre_tokens(genre)
+
+    def build(self, db: Session):
+        """从数据库全量重建(定时任务使用)，有其他重建正在进行时等待它结束后再重建"""
+        with self._build_lock:
+            self._build(db)
+
+    def refresh(self) -> bool:
+        """在后台线程中全量重建，已经有重建在进行时直接返回 False"""
+        if not self._build_lock.acquire(blocking=False):
+            return False
+        threading.Thread(target=self._build_in_background, name="related-build", daemon=True).start()
+        return True
+
+    def _build_in_background(self):
+        try:
+            with SessionLocal() as db:
+                self._build(db)
+        except Exception as e:
+            print(f"--- [后端日志] 相关电影图重建失败: {e} ---")
+        finally:
+            self._build_lock.release()
+
+    def _build(self, db: Session):
+        start = time.perf_counter()
+        with self._lock:
+            # 读取期间再次 mark_stale 时，这次重建结束后还会再重建一次
+            self._stale = False
+            self._pending = {}
+        try:
+            Movie = movie_model.Movie
+            genres = {movie_id: _genre_tokens(genre) for movie_id, genre in db.execute(select(Movie.MovieID, Movie.Genre))}
+            links = []
+            for table, column in ((MovieActors, MovieActors.c.ActorID), (MovieDirectors, MovieDirectors.c.DirectorID)):
+                people: Dict[int, Set[int]] = {}
+                movies_of: Dict[int, Set[int]] = {}
+                for movie_id, person_id in db.execute(select(table.c.MovieID, column)):
+                    people.setdefault(movie_id, set()).add(person_id)
+                    movies_of.setdefault(person_id, set()).add(movie_id)
+                links.append(({movie_id: frozenset(ids) for movie_id, ids in people.items()}, movies_of))
+        except Exception:
+            with self._lock:
+                self._pending = None
+                self._stale = True
+            raise
+
+        with self._lock:
+            (self.movie_actors, self.actor_movies), (self.movie_directors, self.director_movies) = links
+            self.movie_genres = genres
+            # 读取时可能还没看到这些已提交的修改，重放一遍(重复应用结果相同)
+            for movie_id, change in self._pending.items():
+                if change is None:
+                    self._set_links(movie_id, (), (), None)
+                    self.movie_genres.pop(movie_id, None)
+                else:
+                    self._set_links(movie_id, *change)
+            self._pending = None
+            rows = {movie_id: self._neighbors(movie_id) for movie_id in self.movie_genres}
+            self._graph = _Graph.empty().replace_rows(rows)
+            self._loaded = True
+            self.version += 1
+            self.full_builds += 1
+            self.last_build_ms = round((time.perf_counter() - start) * 1000, 2)
+
+    def update_movie(self, movie_id: int, actor_ids=None, director_ids=None, genre: Optional[str] = None):
+        """
+        电影创建或修改后调用。actor_ids / director_ids 为 None 表示这次没有修改对应的关系，
+        genre 传入电影当前的类型。
+        """
+        with self._lock:
+            if self._pending is not None:
+                previous = self._pending.get(movie_id) or (None, None, None)
+                self._pending[movie_id] = (
+                    previous[0] if actor_ids is None else actor_ids,
+                    previous[1] if director_ids is None else director_ids,
+                    genre,
+                )
+            if not self._loaded:
+                return
+            affected = self._affected([movie_id])
+            self._set_links(movie_id, actor_ids, director_ids, genre)
+            affected = self._affected(affected)
+            self._graph = self._graph.with_rows({other: self._neighbors(other) for other in affected})
+            self.version += 1
+            self.incremental_updates += 1
+            self.rows_rebuilt += len(affected)
+
+    def remove_movie(self, movie_id: int):
+        with self._lock:
+            if self._pending is not None:
+                self._pending[movie_id] = None
+            if not self._loaded:
+                return
+            affected = self._affected([movie_id])
+            self._set_links(movie_id, (), (), None)
+            self.movie_genres.pop(movie_id, None)
+            self._graph = self._graph.with_rows({other: self._neighbors(other) for other in affected})
+            self.version += 1
+            self.incremental_updates += 1
+            self.rows_rebuilt += len(affected)
+
+    def movie_features(self) -> Tuple[int, Dict[int, Tuple[FrozenSet[int], FrozenSet[int], FrozenSet[str]]]]:
+        """返回 (版本号, {MovieID: (演员ID, 导演ID, 类型)})，供个性化推荐构建电影特征"""
+        with self._lock:
+            empty = frozenset()
+            return self.version, {
+                movie_id: (self.movie_actors.get(movie_id, empty), self.movie_directors.get(movie_id, empty), genres)
+                for movie_id, genres in self.movie_genres.items()
+            }
+
+    def mark_stale(self):
+        """删除演员或导演等无法局部更新的修改后调用，在后台全量重建"""
+        self._stale = True
+        self.refresh()
+
+    # ---------- 读取 ----------
+
+    @property
+    def loaded(self) -> bool:
+        return self._loaded
+
+    def ensure_loaded(self):
+        """尚未加载或需要重建时在后台开始重建，不等待结果；重建完成前读取到的是旧的图(未加载时为空)"""
+        if not self._loaded or self._stale:
+            self.refresh()
+
+    def top(self, movie_id: int, k: int) -> List[Tuple[int, float]]:
+        """返回与电影最相关的 k 部电影 [(MovieID, 相似度)]"""
+        self.ensure_loaded()
+        # 图整体替换而不是原地修改，读取时不需要加锁
+        return self._graph.row(movie_id, min(k, self.top_k))
+
+    def snapshot(self) -> Dict:
+        graph = self._graph
+        return {
+            "loaded": self._loaded,
+            "stale": self._stale,
+            "building": self._build_lock.locked(),
+            "movies": len(self.movie_genres),
+            "edges": graph.edges,
+            "override_rows": len(graph.overrides),
+            "memory_bytes": sum(a.itemsize * len(a) for a in (graph.indptr, graph.indices, graph.weights)),
+            "full_builds": self.full_builds,
+            "last_build_ms": self.last_build_ms,
+            "incremental_updates": self.incremental_updates,
+            "rows_rebuilt": self.rows_rebuilt,
+        }
+
+
+related = RelatedGraph(top_k=settings.RELATED_TOP_K)
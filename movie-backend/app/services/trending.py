@@ -0,0 +1,291 @@
+import base64
+import bisect
+import json
+import math
+import os
+import threading
+import time
+from array import array
+from pathlib import Path
+from typing import Dict, List, Optional, Set, Tuple
+
+from app.core.config import settings
+
+# 各时间窗口的衰减时间常数(秒): 一次打分/评论的热度每经过一个时间常数衰减为原来的 1/e
+WINDOWS: Dict[str, int] = {
+    "1h": 3600,
+    "24h": 86400,
+    "7d": 7 * 86400,
+}
+
+# 指数增长到这个量级前重新归一化, 防止浮点溢出
+_RENORMALIZE_EXPONENT = 200.0
+
+
+class _Window:
+    """
+    单个时间窗口的热度数据。
+    热度按 exp(-(now - t) / tau) 衰减。这里不对所有电影做衰减，而是把每次新增的热度
+    乘以 exp((t - epoch) / tau) 存下来: 所有电影按同样的速度衰减，存储值的大小顺序与真实热度一致，
+    读取时再统一乘以 exp(-(now - epoch) / tau) 换算成当前热度。
+    """
+    def __init__(self, tau: int, top_k: int, epoch: float):
+        self.tau = tau
+        self.top_k = top_k
+        self.epoch = epoch
+        self.scores = array("d")  # 以 MovieID 为下标
+        # 按存储值从高到低排列的前 top_k 部电影。未被更新的电影之间相对顺序不会改变，
+        # 所以每次只需要调整被更新的那一部，读取前 K 名是 O(K)
+        self.top_ids: List[int] = []
+        self.top_keys: List[float] = []  # 与 top_ids 对应的 -score, 便于 bisect 保持升序
+
+    def add(self, movie_id: int, weight: float, now: float):
+        exponent = (now - self.epoch) / self.tau
+        if exponent > _RENORMALIZE_EXPONENT:
+            self._renormalize(now)
+            exponent = 0.0
+        if movie_id >= len(self.scores):
+            self.scores.extend([0.0] * (movie_id + 1 - len(self.scores)))
+        self.scores[movie_id] += weight * math.exp(exponent)
+        if self.top_k:
+            self._update_top(movie_id)
+
+    def _update_top(self, movie_id: int):
+        score = self.scores[movie_id]
+        if movie_id in self.top_ids:
+            index = self.top_ids.index(movie_id)
+            del self.top_ids[index]
+            del self.top_keys[index]
+        elif len(self.top_ids) >= self.top_k and score <= -self.top_keys[-1]:
+            return
+        index = bisect.bisect_left(self.top_keys, -score)
+        self.top_ids.insert(index, movie_id)
+        self.top_keys.insert(index, -score)
+        if len(self.top_ids) > self.top_k:
+            self.top_ids.pop()
+            self.top_keys.pop()
+
+    def _renormalize(self, now: float):
+        factor = math.exp(-(now - self.epoch) / self.tau)
+        for i in range(len(self.scores)):
+            self.scores[i] *= factor
+        self.top_keys = [key * factor for key in self.top_keys]
+        self.epoch = now
+
+    def merge(self, epoch: float, scores: array, now: float):
+        """把另一份以 epoch 为基准保存的热度加到这里(热度是线性累加的)"""
+        self._renormalize(now)
+        factor = math.exp((epoch - self.epoch) / self.tau)
+        if len(scores) > len(self.scores):
+            self.scores.extend([0.0] * (len(scores) - len(self.scores)))
+        for movie_id, score in enumerate(scores):
+            if score > 0:
+                self.scores[movie_id] += score * factor
+
+    def rebuild_top(self):
+        self.top_ids, self.top_keys = [], []
+        if not self.top_k:
+            return
+        for movie_id, score in enumerate(self.scores):
+            if score > 0:
+                self._update_top(movie_id)
+
+    def dump(self) -> Dict:
+        return {
+            "epoch": self.epoch,
+            "scores": base64.b64encode(self.scores.tobytes()).decode("ascii"),
+        }
+
+    def top(self, k: int, now: float) -> List[Tuple[int, float]]:
+        factor = math.exp(-(now - self.epoch) / self.tau)
+        return [(movie_id, -key * factor) for movie_id, key in zip(self.top_ids[:k], self.top_keys[:k])]
+
+    def remove(self, movie_id: int):
+        if movie_id < len(self.scores):
+            self.scores[movie_id] = 0.0
+        if movie_id in self.top_ids:
+            # 排在前 top_k 名之外的电影没有记录，需要从全部热度中重新选出前 top_k 名补足
+            self.rebuild_top()
+
+
+def _load_state(path: Path) -> Optional[Dict]:
+    try:
+        return json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+
+
+def _decode_scores(data: Dict) -> array:
+    scores = array("d")
+    scores.frombytes(base64.b64decode(data["scores"]))
+    return scores
+
+
+def _process_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)  # 只检查进程是否存在
+    except ProcessLookupError:
+        return False
+    except OSError:
+        return True
+    return True
+
+
+class TrendingTracker:
+    """
+    基于时间衰减的电影热度统计，由评分和评论写入驱动。
+    数据保存在进程内存中，每个 worker 只看到分配给自己的那部分写入。
+    持久化时每个 worker 只把自己记录的热度写入各自的文件(TRENDING_STATE_PATH 加上进程号)，
+    启动时和每次持久化之后重新合并其他 worker 的文件与本 worker 内存中的热度，
+    各 worker 的排名最多相差一个持久化间隔；已退出的 worker 留下的文件由定时任务合并进 TRENDING_STATE_PATH。
+    """
+    def __init__(self, top_k: int, state_path: Optional[str]):
+        now = time.time()
+        self.top_k = top_k
+        self.state_path = Path(state_path) if state_path else None
+        self._windows = {name: _Window(tau, top_k, now) for name, tau in WINDOWS.items()}
+        # 本 worker 启动后记录的热度，只有这部分写入自己的文件，避免把合并来的数据重复保存
+        self._own = {name: _Window(tau, 0, now) for name, tau in WINDOWS.items()}
+        self._removed: Set[int] = set()
+        self._lock = threading.Lock()
+        self._worker_path: Optional[Path] = None
+
+    def record(self, movie_id: int, weight: float, now: Optional[float] = None):
+        now = time.time() if now is None else now
+        with self._lock:
+            for name, window in self._windows.items():
+                window.add(movie_id, weight, now)
+                self._own[name].add(movie_id, weight, now)
+
+    def record_rating(self, movie_id: int):
+        self.record(movie_id, settings.TRENDING_RATING_WEIGHT)
+
+    def record_comment(self, movie_id: int):
+        self.record(movie_id, settings.TRENDING_COMMENT_WEIGHT)
+
+    def remove(self, movie_id: int):
+        with self._lock:
+            for name, window in self._windows.items():
+                window.remove(movie_id)
+                self._own[name].remove(movie_id)
+            # 其他文件里还有这部电影的热度，合并时要一并清除
+            self._removed.add(movie_id)
+
+    def top(self, window: str, k: int) -> List[Tuple[int, float]]:
+        """返回指定窗口内热度最高的 k 部电影 [(MovieID, 当前热度)]"""
+        with self._lock:
+            return self._windows[window].top(min(k, self.top_k), time.time())
+
+    # ---------- 持久化 ----------
+
+    def _worker_files(self) -> List[Path]:
+        # 文件名带上进程号和启动时间: 进程号被复用时也不会覆盖已退出 worker 的文件
+        return sorted(self.state_path.parent.glob(f"{self.state_path.stem}.*{self.state_path.suffix}"))
+
+    @staticmethod
+    def _write(path: Path, state: Dict):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # 先写临时文件再替换，避免进程中途退出留下损坏的状态文件
+        tmp_path = path.with_suffix(".tmp")
+        tmp_path.write_text(json.dumps(state), encoding="utf-8")
+        os.replace(tmp_path, path)
+
+    def save(self):
+        if not self.state_path:
+            return
+        if self._worker_path is None:
+            self._worker_path = self.state_path.with_name(
+                f"{self.state_path.stem}.{os.getpid()}.{int(time.time())}{self.state_path.suffix}"
+            )
+        with self._lock:
+            state = {name: window.dump() for name, window in self._own.items()}
+            state["removed"] = sorted(self._removed)
+        self._write(self._worker_path, state)
+
+    def load(self) -> bool:
+        """
+        重新合并基础文件、其他 worker 的文件和本 worker 记录的热度。
+        本 worker 的文件跳过(内存中的数据更新)，已被基础文件合并过的 worker 文件也跳过。
+        """
+        if not self.state_path:
+            return False
+        base = _load_state(self.state_path) if self.state_path.exists() else None
+        states = [base] if base else []
+        merged_sources = set(base.get("sources", [])) if base else set()
+        for path in self._worker_files():
+            if path.name in merged_sources or path == self._worker_path:
+                continue
+            state = _load_state(path)
+            if state:
+                states.append(state)
+        if not states:
+            return False
+        now = time.time()
+        windows = {name: _Window(tau, self.top_k, now) for name, tau in WINDOWS.items()}
+        removed = set()
+        for state in states:
+            removed.update(state.get("removed", []))
+            for name, window in windows.items():
+                if name in state:
+                    window.merge(state[name]["epoch"], _decode_scores(state[name]), now)
+        # 读取文件期间记录的热度已经在 _own 中，在锁内合并后整体替换
+        with self._lock:
+            removed |= self._removed
+            for name, window in windows.items():
+                own = self._own[name]
+                window.merge(own.epoch, own.scores, now)
+                for movie_id in removed:
+                    if movie_id < len(window.scores):
+                        window.scores[movie_id] = 0.0
+                window.rebuild_top()
+            self._windows = windows
+        return True
+
+    def compact(self) -> int:
+        """
+        把已退出 worker 的文件合并进基础文件，返回合并的文件数。
+        基础文件记录合并过的文件名，先替换基础文件再删除这些文件，
+        中途有 worker 启动读取时也不会重复计算。
+        """
+        if not self.state_path:
+            return 0
+        dead = []
+        for path in self._worker_files():
+            try:
+                pid = int(path.name[len(self.state_path.stem) + 1:].split(".")[0])
+            except ValueError:
+                continue
+            if not _process_alive(pid):
+                dead.append(path)
+        if not dead:
+            return 0
+        base = _load_state(self.state_path) or {}
+        now = time.time()
+        windows = {name: _Window(tau, 0, now) for name, tau in WINDOWS.items()}
+        removed = set()
+        merged_sources = set(base.get("sources", []))
+        for state, path in [(base, None)] + [(_load_state(path), path) for path in dead]:
+            if path is not None and path.name in merged_sources:
+                continue
+            if state:
+                removed.update(state.get("removed", []))
+                for name, window in windows.items():
+                    if name in state:
+                        window.merge(state[name]["epoch"], _decode_scores(state[name]), now)
+        for window in windows.values():
+            for movie_id in removed:
+                window.remove(movie_id)
+        # 还在运行的 worker 的文件里可能也有被删除的电影，保留删除记录直到它们也被合并
+        state = {name: window.dump() for name, window in windows.items()}
+        state["removed"] = sorted(removed)
+        state["sources"] = [path.name for path in dead]
+        self._write(self.state_path, state)
+        for path in dead:
+            path.unlink(missing_ok=True)
+        return len(dead)
+
+
+trending = TrendingTracker(
+    top_k=settings.TRENDING_TOP_K,
+    state_path=settings.TRENDING_STATE_PATH,
+)
@@ -1,35 +1,61 @@
 DELIMITER //
 
-CREATE TRIGGER TGR_After_Rating_Insert
--- 在 Ratings 表的插入操作之后（AFTER INSERT）触发
-AFTER INSERT ON Ratings
--- 对每一行被插入的数据都执行
-FOR EACH ROW
+-- 重新统计一部电影的评分：平均分、总评分数和 1-10 分的分布，并将电影的版本号加一(ETag 随之变化)。
+-- 由下面三个触发器调用，评分写入只需要一条 INSERT / UPDATE / DELETE，
+-- 后端不再单独更新评分分布和版本号。
+CREATE PROCEDURE SP_RefreshMovieRating(IN p_MovieID INT)
 BEGIN
-    -- 声明两个变量，用于存储计算出的新平均分和总评分数
-    DECLARE new_avg_rating DECIMAL(3, 1);
-    DECLARE new_rating_count INT;
+    DECLARE new_avg_rating DECIMAL(3, 1) DEFAULT 0.0;
+    DECLARE new_rating_count INT DEFAULT 0;
+    DECLARE s1, s2, s3, s4, s5, s6, s7, s8, s9, s10 INT DEFAULT 0;
 
-    -- 1. 从 Ratings 表中，为刚刚被插入评分的电影（由 NEW.MovieID 确定）
-    --    计算出它现在的总评分数和平均分。
+    -- 1. 一次扫描(走 idx_ratings_movie_score 索引)同时算出总评分数、平均分和各分数的人数
     SELECT
-        COUNT(*),      -- 计算总行数（即总评分数）
-        AVG(Score)     -- 计算 Score 列的平均值
+        COUNT(*),
+        AVG(Score),
+        COALESCE(SUM(Score = 1), 0), COALESCE(SUM(Score = 2), 0),
+        COALESCE(SUM(Score = 3), 0), COALESCE(SUM(Score = 4), 0),
+        COALESCE(SUM(Score = 5), 0), COALESCE(SUM(Score = 6), 0),
+        COALESCE(SUM(Score = 7), 0), COALESCE(SUM(Score = 8), 0),
+        COALESCE(SUM(Score = 9), 0), COALESCE(SUM(Score = 10), 0)
     INTO
-        new_rating_count, -- 将总评分数存入变量
-        new_avg_rating    -- 将平均分存入变量
+        new_rating_count,
+        new_avg_rating,
+        s1, s2, s3, s4, s5, s6, s7, s8, s9, s10
     FROM
         Ratings
     WHERE
-        MovieID = NEW.MovieID; -- NEW.MovieID 代表刚刚插入那一行数据的 MovieID
+        MovieID = p_MovieID;
 
-    -- 2. 更新 Movies 表中对应电影的记录
+    -- 2. 写入评分分布，存储过程创建的电影还没有分布记录时直接插入
+    INSERT INTO MovieRatingHistograms (MovieID, Score1, Score2, Score3, Score4, Score5, Score6, Score7, Score8, Score9, Score10)
+    VALUES (p_MovieID, s1, s2, s3, s4, s5, s6, s7, s8, s9, s10)
+    ON DUPLICATE KEY UPDATE
+        Score1 = s1, Score2 = s2, Score3 = s3, Score4 = s4, Score5 = s5,
+        Score6 = s6, Score7 = s7, Score8 = s8, Score9 = s9, Score10 = s10;
+
+    -- 3. 更新电影的平均分和总评分数。最后一条评分被删除时 AVG(Score) 是 NULL，按 0.0 处理
     UPDATE Movies
     SET
-        AverageRating = new_avg_rating,
-        RatingCount = new_rating_count
+        AverageRating = COALESCE(new_avg_rating, 0.0),
+        RatingCount = new_rating_count,
+        Version = Version + 1
     WHERE
-        MovieID = NEW.MovieID; -- 定位到需要更新的电影
+        MovieID = p_MovieID;
+END//
+
+DELIMITER ;
+
+DELIMITER //
+
+CREATE TRIGGER TGR_After_Rating_Insert
+-- 在 Ratings 表的插入操作之后（AFTER INSERT）触发
+AFTER INSERT ON Ratings
+-- 对每一行被插入的数据都执行
+FOR EACH ROW
+BEGIN
+    -- NEW.MovieID 代表刚刚插入那一行数据的 MovieID
+    CALL SP_RefreshMovieRating(NEW.MovieID);
 END//
 
 -- 将定界符恢复为 ;
@@ -41,13 +67,9 @@ CREATE TRIGGER TGR_After_Rating_Update
 AFTER UPDATE ON Ratings
 FOR EACH ROW
 BEGIN
-    -- 如果评分值发生了变化
+    -- 如果评分值发生了变化，重新统计该电影的评分
     IF NEW.Score <> OLD.Score THEN
-        -- 逻辑与INSERT触发器完全相同，重新计算并更新电影的平均分
-        UPDATE Movies
-        SET AverageRating = (SELECT AVG(Score) FROM Ratings WHERE MovieID = NEW.MovieID),
-            RatingCount = (SELECT COUNT(*) FROM Ratings WHERE MovieID = NEW.MovieID)
-        WHERE MovieID = NEW.MovieID;
+        CALL SP_RefreshMovieRating(NEW.MovieID);
     END IF;
 END//
 
@@ -59,29 +81,8 @@ CREATE TRIGGER TGR_After_Rating_Delete
 AFTER DELETE ON Ratings
 FOR EACH ROW
 BEGIN
-    DECLARE new_avg_rating DECIMAL(3, 1) DEFAULT 0.0;
-    DECLARE new_rating_count INT DEFAULT 0;
-
-    -- 计算剩余评分的统计数据
-    SELECT 
-        COUNT(*),
-        AVG(Score)
-    INTO
-        new_rating_count,
-        new_avg_rating
-    FROM 
-        Ratings
-    WHERE 
-        MovieID = OLD.MovieID; -- OLD.MovieID 代表被删除那一行数据的 MovieID
-
-    -- 更新 Movies 表。如果这是最后一条被删除的评分，AVG(Score)会是NULL，
-    -- 我们需要将其处理为 0.0。
-    UPDATE Movies
-    SET
-        AverageRating = COALESCE(new_avg_rating, 0.0), -- 如果new_avg_rating是NULL，则使用0.0
-        RatingCount = new_rating_count
-    WHERE
-        MovieID = OLD.MovieID;
+    -- OLD.MovieID 代表被删除那一行数据的 MovieID
+    CALL SP_RefreshMovieRating(OLD.MovieID);
 END//
 
-DELIMITER ;
\ No newline at end of file
+DELIMITER ;
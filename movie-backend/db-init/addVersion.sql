@@ -0,0 +1,13 @@
+-- 为条件请求(ETag / If-None-Match)添加版本号字段
+-- 后端每次写入对应记录时会将版本号加一
+
+-- 电影本身的版本号(评分、演员或导演变化时也会加一)
+ALTER TABLE Movies ADD COLUMN Version INT NOT NULL DEFAULT 1;
+
+-- 电影评论列表的版本号
+ALTER TABLE Movies ADD COLUMN CommentsVersion INT NOT NULL DEFAULT 1;
+
+-- 演员和导演的版本号
+ALTER TABLE Actors ADD COLUMN Version INT NOT NULL DEFAULT 1;
+
+ALTER TABLE Directors ADD COLUMN Version INT NOT NULL DEFAULT 1;
@@ -0,0 +1,33 @@
+-- 在 Movies 上冗余保存评论数和最新一条评论，列表页展示讨论热度时不再需要 COUNT(*) Comments
+-- 由后端在新增/删除评论时维护
+
+ALTER TABLE Movies ADD COLUMN CommentCount INT NOT NULL DEFAULT 0;
+
+ALTER TABLE Movies ADD COLUMN LatestCommentID INT NULL;
+
+ALTER TABLE Movies ADD COLUMN LatestCommentAt TIMESTAMP NULL;
+
+-- 按电影分页读取评论时按索引顺序取出，避免对该电影的全部评论做 filesort
+CREATE INDEX idx_comments_movie_created ON Comments (MovieID, CreatedAt);
+
+-- 根据已有评论初始化
+UPDATE Movies m
+LEFT JOIN (
+    SELECT MovieID, COUNT(*) AS CommentCount
+    FROM Comments
+    GROUP BY MovieID
+) c ON c.MovieID = m.MovieID
+SET m.CommentCount = COALESCE(c.CommentCount, 0);
+
+UPDATE Movies m
+SET
+    m.LatestCommentID = (
+        SELECT c.CommentID FROM Comments c
+        WHERE c.MovieID = m.MovieID
+        ORDER BY c.CreatedAt DESC, c.CommentID DESC
+        LIMIT 1
+    ),
+    m.LatestCommentAt = (
+        SELECT MAX(c.CreatedAt) FROM Comments c
+        WHERE c.MovieID = m.MovieID
+    );
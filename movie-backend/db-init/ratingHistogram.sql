@@ -0,0 +1,34 @@
+-- 表：MovieRatingHistograms (每部电影 1-10 分的评分人数)
+-- 由 Ratings 上的触发器在评分增删改时维护(见 Trigger/Ratingcalcu.sql)，详情页读取分布时不再需要对 Ratings 做 GROUP BY
+CREATE TABLE MovieRatingHistograms (
+    MovieID INT PRIMARY KEY,
+    Score1 INT NOT NULL DEFAULT 0,
+    Score2 INT NOT NULL DEFAULT 0,
+    Score3 INT NOT NULL DEFAULT 0,
+    Score4 INT NOT NULL DEFAULT 0,
+    Score5 INT NOT NULL DEFAULT 0,
+    Score6 INT NOT NULL DEFAULT 0,
+    Score7 INT NOT NULL DEFAULT 0,
+    Score8 INT NOT NULL DEFAULT 0,
+    Score9 INT NOT NULL DEFAULT 0,
+    Score10 INT NOT NULL DEFAULT 0,
+    FOREIGN KEY (MovieID) REFERENCES Movies(MovieID) ON DELETE CASCADE
+);
+
+-- 根据已有评分初始化分布(没有评分的电影也会得到一条全为0的记录)
+INSERT INTO MovieRatingHistograms (MovieID, Score1, Score2, Score3, Score4, Score5, Score6, Score7, Score8, Score9, Score10)
+SELECT
+    m.MovieID,
+    COALESCE(SUM(r.Score = 1), 0),
+    COALESCE(SUM(r.Score = 2), 0),
+    COALESCE(SUM(r.Score = 3), 0),
+    COALESCE(SUM(r.Score = 4), 0),
+    COALESCE(SUM(r.Score = 5), 0),
+    COALESCE(SUM(r.Score = 6), 0),
+    COALESCE(SUM(r.Score = 7), 0),
+    COALESCE(SUM(r.Score = 8), 0),
+    COALESCE(SUM(r.Score = 9), 0),
+    COALESCE(SUM(r.Score = 10), 0)
+FROM Movies m
+LEFT JOIN Ratings r ON r.MovieID = m.MovieID
+GROUP BY m.MovieID;
@@ -0,0 +1,6 @@
+-- 表：ScheduledJobRuns (定时任务最近一次执行的时间)
+-- 每个 worker 都运行调度器，执行任务前先查看这一轮是否已经有其他 worker 执行过
+CREATE TABLE ScheduledJobRuns (
+    JobName VARCHAR(100) PRIMARY KEY,
+    LastRunAt DATETIME NOT NULL
+);
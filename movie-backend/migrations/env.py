@@ -0,0 +1,55 @@
+from logging.config import fileConfig
+
+from alembic import context
+from sqlalchemy import create_engine, pool
+
+from app.core.config import settings
+from app.database import Base
+# 导入所有模型, 让 Base.metadata 包含全部表(autogenerate 时需要)
+from app.models import actor_model, comment_model, director_model, movie_model, rating_model, user_model, view_models  # noqa: F401
+
+config = context.config
+if config.config_file_name is not None:
+    fileConfig(config.config_file_name)
+
+target_metadata = Base.metadata
+
+# 视图由 db-init/view 下的 SQL 维护, 不参与迁移
+EXCLUDED_TABLES = {"V_MovieDetails"}
+
+
+def include_object(object, name, type_, reflected, compare_to):
+    if type_ == "table" and name in EXCLUDED_TABLES:
+        return False
+    return True
+
+
+def run_migrations_offline():
+    """生成 SQL 脚本而不连接数据库: alembic upgrade head --sql"""
+    context.configure(
+        url=settings.DATABASE_URL,
+        target_metadata=target_metadata,
+        include_object=include_object,
+        literal_binds=True,
+        dialect_opts={"paramstyle": "named"},
+    )
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+def run_migrations_online():
+    connectable = create_engine(settings.DATABASE_URL, poolclass=pool.NullPool)
+    with connectable.connect() as connection:
+        context.configure(
+            connection=connection,
+            target_metadata=target_metadata,
+            include_object=include_object,
+        )
+        with context.begin_transaction():
+            context.run_migrations()
+
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    run_migrations_online()
@@ -0,0 +1,39 @@
+"""为现有查询补充索引
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-19
+
+已有数据库由 db-init 下的 SQL 创建, 这是第一个迁移, 直接在其上执行 alembic upgrade head。
+索引与模型中声明的一致。MySQL 为外键列自动建的索引在有了可以替代它的索引后会被自动删除,
+不会留下重复索引。评论的 idx_comments_movie_created 已由 db-init/commentStats.sql 创建, 不在这里处理。
+"""
+from alembic import op
+
+revision = "0001"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+# (索引名, 表名, 列)
+INDEXES = [
+    # 列表页 ORDER BY AverageRating DESC / min_rating 筛选
+    ("idx_movies_average_rating", "Movies", ["AverageRating"]),
+    # 列表页 ORDER BY ReleaseYear DESC / year 筛选
+    ("idx_movies_release_year", "Movies", ["ReleaseYear"]),
+    # 演员/导演反查参演电影, 以及修改演员/导演时更新相关电影的版本号
+    ("idx_movie_actors_actor", "MovieActors", ["ActorID"]),
+    ("idx_movie_directors_director", "MovieDirectors", ["DirectorID"]),
+    # 按电影统计评分(评分分布重建、评分校验), 包含 Score 后不需要回表
+    ("idx_ratings_movie_score", "Ratings", ["MovieID", "Score"]),
+]
+
+
+def upgrade():
+    for name, table, columns in INDEXES:
+        op.create_index(name, table, columns)
+
+
+def downgrade():
+    for name, table, _ in reversed(INDEXES):
+        op.drop_index(name, table_name=table)
@@ -0,0 +1,28 @@
+"""记录定时任务最近一次执行的时间
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-19
+
+多个 worker 各自运行调度器，single_runner 的任务执行前读取这张表，
+同一轮已经有 worker 执行过时跳过。
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "ScheduledJobRuns",
+        sa.Column("JobName", sa.String(100), primary_key=True),
+        sa.Column("LastRunAt", sa.DateTime(), nullable=False),
+    )
+
+
+def downgrade():
+    op.drop_table("ScheduledJobRuns")
@@ -0,0 +1,134 @@
+"""评分触发器同时维护评分分布和电影版本号
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-19
+
+评分的增删改原先由后端在同一事务中额外执行两条 UPDATE(评分分布、Movies.Version)。
+改为由触发器调用 SP_RefreshMovieRating 一并完成，与 db-init/Trigger/Ratingcalcu.sql 保持一致。
+"""
+from alembic import op
+
+revision = "0003"
+down_revision = "0002"
+branch_labels = None
+depends_on = None
+
+TRIGGERS = ["TGR_After_Rating_Insert", "TGR_After_Rating_Update", "TGR_After_Rating_Delete"]
+
+REFRESH_PROCEDURE = """
+CREATE PROCEDURE SP_RefreshMovieRating(IN p_MovieID INT)
+BEGIN
+    DECLARE new_avg_rating DECIMAL(3, 1) DEFAULT 0.0;
+    DECLARE new_rating_count INT DEFAULT 0;
+    DECLARE s1, s2, s3, s4, s5, s6, s7, s8, s9, s10 INT DEFAULT 0;
+
+    SELECT
+        COUNT(*),
+        AVG(Score),
+        COALESCE(SUM(Score = 1), 0), COALESCE(SUM(Score = 2), 0),
+        COALESCE(SUM(Score = 3), 0), COALESCE(SUM(Score = 4), 0),
+        COALESCE(SUM(Score = 5), 0), COALESCE(SUM(Score = 6), 0),
+        COALESCE(SUM(Score = 7), 0), COALESCE(SUM(Score = 8), 0),
+        COALESCE(SUM(Score = 9), 0), COALESCE(SUM(Score = 10), 0)
+    INTO
+        new_rating_count,
+        new_avg_rating,
+        s1, s2, s3, s4, s5, s6, s7, s8, s9, s10
+    FROM Ratings
+    WHERE MovieID = p_MovieID;
+
+    INSERT INTO MovieRatingHistograms (MovieID, Score1, Score2, Score3, Score4, Score5, Score6, Score7, Score8, Score9, Score10)
+    VALUES (p_MovieID, s1, s2, s3, s4, s5, s6, s7, s8, s9, s10)
+    ON DUPLICATE KEY UPDATE
+        Score1 = s1, Score2 = s2, Score3 = s3, Score4 = s4, Score5 = s5,
+        Score6 = s6, Score7 = s7, Score8 = s8, Score9 = s9, Score10 = s10;
+
+    UPDATE Movies
+    SET
+        AverageRating = COALESCE(new_avg_rating, 0.0),
+        RatingCount = new_rating_count,
+        Version = Version + 1
+    WHERE MovieID = p_MovieID;
+END
+"""
+
+NEW_TRIGGERS = [
+    """
+    CREATE TRIGGER TGR_After_Rating_Insert AFTER INSERT ON Ratings FOR EACH ROW
+    BEGIN
+        CALL SP_RefreshMovieRating(NEW.MovieID);
+    END
+    """,
+    """
+    CREATE TRIGGER TGR_After_Rating_Update AFTER UPDATE ON Ratings FOR EACH ROW
+    BEGIN
+        IF NEW.Score <> OLD.Score THEN
+            CALL SP_RefreshMovieRating(NEW.MovieID);
+        END IF;
+    END
+    """,
+    """
+    CREATE TRIGGER TGR_After_Rating_Delete AFTER DELETE ON Ratings FOR EACH ROW
+    BEGIN
+        CALL SP_RefreshMovieRating(OLD.MovieID);
+    END
+    """,
+]
+
+# 0002 时的触发器: 只维护平均分和总评分数
+OLD_TRIGGERS = [
+    """
+    CREATE TRIGGER TGR_After_Rating_Insert AFTER INSERT ON Ratings FOR EACH ROW
+    BEGIN
+        DECLARE new_avg_rating DECIMAL(3, 1);
+        DECLARE new_rating_count INT;
+        SELECT COUNT(*), AVG(Score) INTO new_rating_count, new_avg_rating
+        FROM Ratings WHERE MovieID = NEW.MovieID;
+        UPDATE Movies SET AverageRating = new_avg_rating, RatingCount = new_rating_count
+        WHERE MovieID = NEW.MovieID;
+    END
+    """,
+    """
+    CREATE TRIGGER TGR_After_Rating_Update AFTER UPDATE ON Ratings FOR EACH ROW
+    BEGIN
+        IF NEW.Score <> OLD.Score THEN
+            UPDATE Movies
+            SET AverageRating = (SELECT AVG(Score) FROM Ratings WHERE MovieID = NEW.MovieID),
+                RatingCount = (SELECT COUNT(*) FROM Ratings WHERE MovieID = NEW.MovieID)
+            WHERE MovieID = NEW.MovieID;
+        END IF;
+    END
+    """,
+    """
+    CREATE TRIGGER TGR_After_Rating_Delete AFTER DELETE ON Ratings FOR EACH ROW
+    BEGIN
+        DECLARE new_avg_rating DECIMAL(3, 1) DEFAULT 0.0;
+        DECLARE new_rating_count INT DEFAULT 0;
+        SELECT COUNT(*), AVG(Score) INTO new_rating_count, new_avg_rating
+        FROM Ratings WHERE MovieID = OLD.MovieID;
+        UPDATE Movies SET AverageRating = COALESCE(new_avg_rating, 0.0), RatingCount = new_rating_count
+        WHERE MovieID = OLD.MovieID;
+    END
+    """,
+]
+
+
+def _drop_triggers():
+    for name in TRIGGERS:
+        op.execute(f"DROP TRIGGER IF EXISTS {name}")
+
+
+def upgrade():
+    _drop_triggers()
+    op.execute("DROP PROCEDURE IF EXISTS SP_RefreshMovieRating")
+    op.execute(REFRESH_PROCEDURE)
+    for statement in NEW_TRIGGERS:
+        op.execute(statement)
+
+
+def downgrade():
+    _drop_triggers()
+    op.execute("DROP PROCEDURE IF EXISTS SP_RefreshMovieRating")
+    for statement in OLD_TRIGGERS:
+        op.execute(statement)
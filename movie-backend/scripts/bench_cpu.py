@@ -0,0 +1,119 @@
+"""
+crud 层热点查询每次调用消耗的 CPU 时间，以及 SQL 编译缓存的命中情况。
+
+与 bench_queries 关注数据库执行计划不同，这里统计的是进程自身的 CPU 时间(time.process_time)，
+即构建查询表达式、生成缓存键/编译 SQL、处理结果行所花的时间。
+使用 SQLite 时数据库本身也在进程内执行，结果会包含这部分时间，对比时应使用同一个数据库。
+
+用法(在 movie-backend 目录下, 使用 .env 中的 DATABASE_URL):
+    python -m scripts.bench_cpu --rounds 2000 --output before.json     # 在改动前的代码上运行
+    python -m scripts.bench_cpu --rounds 2000 --baseline before.json   # 在改动后的代码上运行并对比
+    python -m scripts.bench_cpu --no-compiled-cache                    # 关闭编译缓存作对照
+"""
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Tuple
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT_DIR))
+
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from app.core import statement_cache
+from app.core.config import settings
+# user_schema 和 comment_schema 互相引用，需要先导入 user_schema(与应用启动时的导入顺序一致)
+from app.schemas import user_schema  # noqa: F401
+from app.crud import crud_actor, crud_comment, crud_director, crud_movie, crud_user
+from app.database import SessionLocal, engine
+from app.models import comment_model, movie_model, user_model
+
+
+def sample_args(db: Session) -> Dict[str, object]:
+    def first(column, order=None):
+        return db.execute(select(column).order_by(order if order is not None else column).limit(1)).scalar()
+
+    return {
+        "movie": first(movie_model.Movie.MovieID) or 1,
+        "movie_ids": list(db.execute(select(movie_model.Movie.MovieID).limit(20)).scalars()),
+        "commented_movie": db.execute(
+            select(comment_model.Comment.MovieID).group_by(comment_model.Comment.MovieID).order_by(func.count().desc()).limit(1)
+        ).scalar() or 1,
+        "email": first(user_model.User.Email) or "",
+        "year": first(movie_model.Movie.ReleaseYear, movie_model.Movie.ReleaseYear.desc()) or 2000,
+    }
+
+
+def build_cases(args: Dict[str, object]) -> List[Tuple[str, Callable[[Session], object]]]:
+    return [
+        ("crud_movie.get_movie", lambda db: crud_movie.get_movie(db, args["movie"])),
+        ("crud_movie.get_movie(fields, expand)", lambda db: crud_movie.get_movie(db, args["movie"], fields=("Title", "ReleaseYear"), expand=("actors",))),
+        ("crud_movie.get_movies_by_ids", lambda db: crud_movie.get_movies_by_ids(db, args["movie_ids"], fields=("Title", "CoverURL"))),
+        ("crud_movie.get_movies(sql)", lambda db: crud_movie.get_movies(db, limit=20, expand=())),
+        ("crud_movie.get_movies(sql, year, min_rating)", lambda db: crud_movie.get_movies(db, year=args["year"], min_rating=1, limit=20, expand=())),
+        ("crud_movie.get_movies(sql, search)", lambda db: crud_movie.get_movies(db, search="a", limit=20, expand=())),
+        ("crud_movie.get_genres", crud_movie.get_genres),
+        ("crud_comment.get_comments_by_movie", lambda db: crud_comment.get_comments_by_movie(db, args["commented_movie"], limit=20)),
+        ("crud_actor.get_actors", lambda db: crud_actor.get_actors(db, limit=20)),
+        ("crud_director.get_directors", lambda db: crud_director.get_directors(db, limit=20)),
+        ("crud_user.get_user_by_email", lambda db: crud_user.get_user_by_email(db, args["email"])),
+    ]
+
+
+def run(rounds: int) -> Dict[str, float]:
+    # 只测 SQL 路径, 不让内存快照回答 get_movies
+    settings.CATALOG_ENABLED = False
+    results = {}
+    with SessionLocal() as db:
+        cases = build_cases(sample_args(db))
+        for name, case in cases:
+            # 预热一次, 让编译缓存中已有这条语句
+            case(db)
+            db.expunge_all()
+            start = time.process_time()
+            for _ in range(rounds):
+                case(db)
+                # 每次都从空的 identity map 开始, 与每个请求使用新会话一致
+                db.expunge_all()
+            results[name] = (time.process_time() - start) / rounds * 1000
+            db.rollback()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rounds", type=int, default=1000)
+    parser.add_argument("--output", help="把结果保存为 JSON, 供之后 --baseline 对比")
+    parser.add_argument("--baseline", help="与之前保存的结果对比")
+    parser.add_argument("--no-compiled-cache", action="store_true", help="关闭 SQL 编译缓存")
+    args = parser.parse_args()
+
+    print(f"数据库: {engine.url.render_as_string(hide_password=True)}")
+    if args.no_compiled_cache:
+        engine.update_execution_options(compiled_cache=None)
+    for monitor in statement_cache.monitors:
+        monitor.reset()
+    results = run(args.rounds)
+
+    baseline = json.loads(Path(args.baseline).read_text(encoding="utf-8")) if args.baseline else {}
+    header = f"\n{'查询':<44} {'CPU/次':>10}"
+    if baseline:
+        header += f" {'基线':>10} {'加速':>8}"
+    print(header)
+    for name, ms in results.items():
+        line = f"  {name:<42} {ms:8.3f}ms"
+        if name in baseline:
+            line += f" {baseline[name]:8.3f}ms {baseline[name] / ms if ms else float('inf'):7.2f}x"
+        print(line)
+
+    for monitor in statement_cache.monitors:
+        print(f"\n编译缓存 ({monitor.name}): {monitor.snapshot()}")
+    if args.output:
+        Path(args.output).write_text(json.dumps(results, ensure_ascii=False, indent=2), encoding="utf-8")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+"""
+crud 层主要查询的执行计划和耗时。
+
+对每个 crud 函数: 记录它实际发出的 SQL，输出数据库的执行计划(MySQL 为 EXPLAIN，
+SQLite 为 EXPLAIN QUERY PLAN)，并统计多次调用的平均耗时。写操作在事务中执行后回滚。
+
+用法(在 movie-backend 目录下, 使用 .env 中的 DATABASE_URL):
+    python -m scripts.bench_queries --rounds 200
+    python -m scripts.bench_queries --compare   # 先回退到无索引(alembic downgrade base)测一遍, 再升级到 head 测一遍
+
+--compare 会修改数据库结构，只应在测试库上使用。
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Tuple
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT_DIR))
+
+from sqlalchemy import event, func, select
+from sqlalchemy.orm import Session
+
+from app.crud import crud_comment, crud_movie, crud_rating, crud_version
+from app.database import MovieActors, MovieDirectors, SessionLocal, engine
+from app.models import comment_model, movie_model, rating_model
+
+
+def sample_ids(db: Session) -> Dict[str, int]:
+    """选取数据最多的电影/演员/导演/用户作为查询参数，让执行计划更接近真实负载"""
+    def busiest(column):
+        return db.execute(select(column).group_by(column).order_by(func.count().desc()).limit(1)).scalar() or 1
+
+    return {
+        "movie": busiest(rating_model.Rating.MovieID),
+        "commented_movie": busiest(comment_model.Comment.MovieID),
+        "actor": busiest(MovieActors.c.ActorID),
+        "director": busiest(MovieDirectors.c.DirectorID),
+        "user": busiest(comment_model.Comment.UserID),
+        "year": db.execute(select(movie_model.Movie.ReleaseYear).limit(1)).scalar() or 2000,
+    }
+
+
+def build_cases(ids: Dict[str, int]) -> List[Tuple[str, Callable[[Session], object]]]:
+    return [
+        ("crud_movie.get_movies(sort_by=rating_desc)", lambda db: crud_movie.get_movies(db, sort_by="rating_desc", limit=20)),
+        ("crud_movie.get_movies(sort_by=release_year_desc)", lambda db: crud_movie.get_movies(db, sort_by="release_year_desc", limit=20)),
+        ("crud_movie.get_movies(year=...)", lambda db: crud_movie.get_movies(db, year=ids["year"], limit=20)),
+        ("crud_movie.get_movies(min_rating=8)", lambda db: crud_movie.get_movies(db, min_rating=8, limit=20)),
+        ("crud_movie.get_movie", lambda db: crud_movie.get_movie(db, ids["movie"])),
+        ("crud_movie.get_filmography(actor)", lambda db: crud_movie.get_filmography(db, "actors", ids["actor"], limit=20)),
+        ("crud_movie.get_filmography(director, rating_desc)", lambda db: crud_movie.get_filmography(db, "directors", ids["director"], sort_by="rating_desc", limit=20)),
+        ("crud_comment.get_comments_by_movie", lambda db: crud_comment.get_comments_by_movie(db, ids["commented_movie"], limit=20)),
+        ("crud_rating.get_rating_stats", lambda db: crud_rating.get_rating_stats(db, ids["movie"])),
+        ("crud_rating.rebuild_histograms", crud_rating.rebuild_histograms),
+        ("crud_version.bump_movies_of_actor", lambda db: crud_version.bump_movies_of_actor(db, ids["actor"])),
+        ("crud_version.bump_movies_of_director", lambda db: crud_version.bump_movies_of_director(db, ids["director"])),
+        ("crud_version.bump_comments_of_user", lambda db: crud_version.bump_comments_of_user(db, ids["user"])),
+    ]
+
+
+class StatementRecorder:
+    """记录一次调用期间发出的所有 SQL 及其参数"""
+    def __init__(self):
+        self.statements: List[Tuple[str, object]] = []
+        self.enabled = False
+
+    def __call__(self, conn, cursor, statement, parameters, context, executemany):
+        if self.enabled:
+            self.statements.append((statement, parameters))
+
+
+def explain(db: Session, statement: str, parameters) -> List[str]:
+    if not statement.lstrip().upper().startswith(("SELECT", "UPDATE", "DELETE", "INSERT")):
+        return []
+    prefix = "EXPLAIN QUERY PLAN " if engine.dialect.name == "sqlite" else "EXPLAIN "
+    rows = db.connection().exec_driver_sql(prefix + statement, parameters).fetchall()
+    return [" | ".join("" if value is None else str(value) for value in row) for row in rows]
+
+
+def _run(db: Session, case: Callable[[Session], object]):
+    # rebuild_histograms 等函数内部会提交, 这里把 commit 换成 flush, 保证测试不改动数据
+    original_commit = db.commit
+    db.commit = db.flush
+    try:
+        case(db)
+    finally:
+        db.commit = original_commit
+        db.rollback()
+
+
+def run(rounds: int, show_plans: bool = True) -> Dict[str, float]:
+    recorder = StatementRecorder()
+    event.listen(engine, "before_cursor_execute", recorder)
+    results = {}
+    try:
+        with SessionLocal() as db:
+            cases = build_cases(sample_ids(db))
+            for name, case in cases:
+                recorder.statements.clear()
+                recorder.enabled = True
+                _run(db, case)
+                recorder.enabled = False
+                if show_plans:
+                    print(f"\n== {name}")
+                    for statement, parameters in recorder.statements:
+                        print("  " + " ".join(statement.split())[:160])
+                        for line in explain(db, statement, parameters):
+                            print("    " + line)
+                        db.rollback()
+
+                start = time.perf_counter()
+                for _ in range(rounds):
+                    _run(db, case)
+                results[name] = (time.perf_counter() - start) / rounds * 1000
+    finally:
+        event.remove(engine, "before_cursor_execute", recorder)
+    return results
+
+
+def print_latency(title: str, results: Dict[str, float]):
+    print(f"\n{title}")
+    for name, ms in results.items():
+        print(f"  {name:<52} {ms:8.3f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rounds", type=int, default=100)
+    parser.add_argument("--compare", action="store_true", help="对比迁移前后(会修改数据库结构)")
+    args = parser.parse_args()
+
+    print(f"数据库: {engine.url.render_as_string(hide_password=True)}")
+    if not args.compare:
+        print_latency("平均耗时", run(args.rounds))
+        return
+
+    from alembic import command
+    from alembic.config import Config
+
+    config = Config(str(ROOT_DIR / "alembic.ini"))
+    config.set_main_option("script_location", str(ROOT_DIR / "migrations"))
+    command.downgrade(config, "base")
+    print("\n######## 迁移前 ########")
+    before = run(args.rounds)
+    command.upgrade(config, "head")
+    print("\n######## 迁移后 ########")
+    after = run(args.rounds)
+
+    print(f"\n{'查询':<52} {'迁移前':>10} {'迁移后':>10} {'加速':>8}")
+    for name in before:
+        speedup = before[name] / after[name] if after[name] else float("inf")
+        print(f"  {name:<50} {before[name]:8.3f}ms {after[name]:8.3f}ms {speedup:7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+列表接口序列化的微基准测试。
+
+对比两条路径:
+1. FastAPI 默认路径: 按 response_model 校验 -> jsonable_encoder -> json.dumps
+2. app.core.serialization.dump_list: TypeAdapter 校验一次 -> pydantic-core 直接输出 JSON 字节
+
+用法(在 movie-backend 目录下):
+    python -m scripts.bench_serialization --movies 100 --cast 8 --rounds 200
+"""
+import argparse
+import json
+import sys
+import time
+from datetime import date
+from pathlib import Path
+from types import SimpleNamespace
+from typing import List
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from fastapi.encoders import jsonable_encoder
+from pydantic import TypeAdapter
+
+from app.core.serialization import dump_list
+from app.schemas.movie_schema import MovieRead
+
+
+def build_movies(count: int, cast: int):
+    """构造与 ORM 对象属性一致的假数据，避免基准测试依赖数据库"""
+    def person(id_field: str, i: int):
+        return SimpleNamespace(**{
+            id_field: i, "Name": f"演员{i}", "Gender": "男", "BirthDate": date(1970, 1, 1),
+            "Nationality": "中国", "PhotoURL": f"/static/images/actors/{i}.png",
+        })
+    movies = []
+    for i in range(count):
+        movies.append(SimpleNamespace(
+            MovieID=i, Title=f"电影{i}", ReleaseYear=2000 + i % 20, Duration=120, Genre="剧情/犯罪",
+            Language="汉语", Country="中国", Synopsis="简介" * 100, AverageRating=8.5, RatingCount=1000,
+            CoverURL=f"/static/images/covers/{i}.png",
+            actors=[person("ActorID", j) for j in range(cast)],
+            directors=[person("DirectorID", j) for j in range(2)],
+        ))
+    return movies
+
+
+def default_path(adapter: TypeAdapter, movies) -> bytes:
+    value = adapter.validate_python(movies, from_attributes=True)
+    content = jsonable_encoder(value)
+    return json.dumps(content, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def fast_path(movies) -> bytes:
+    return dump_list(MovieRead, movies)
+
+
+def bench(name: str, func, rounds: int):
+    func()  # 预热
+    start = time.perf_counter()
+    for _ in range(rounds):
+        body = func()
+    elapsed = (time.perf_counter() - start) / rounds
+    print(f"{name:<28} {elapsed * 1000:8.3f} ms/次   {len(body) / 1024:8.1f} KiB")
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--movies", type=int, default=100)
+    parser.add_argument("--cast", type=int, default=8)
+    parser.add_argument("--rounds", type=int, default=200)
+    args = parser.parse_args()
+
+    movies = build_movies(args.movies, args.cast)
+    adapter = TypeAdapter(List[MovieRead])
+
+    baseline = bench("FastAPI 默认路径", lambda: default_path(adapter, movies), args.rounds)
+    optimized = bench("TypeAdapter.dump_json", lambda: fast_path(movies), args.rounds)
+    print(f"加速比: {baseline / optimized:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
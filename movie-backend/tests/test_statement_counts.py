@@ -0,0 +1,139 @@
+"""
+写接口的 SQL 语句数测试。
+
+依次调用各个写接口，统计每个请求发出的 SQL 语句数(含 COMMIT)，超过预算时测试失败，
+防止后续修改重新引入多余的 SELECT / refresh / 额外的 UPDATE。
+
+测试在 DATABASE_URL 指向的数据库中创建临时的用户、电影和演员，结束时删除，
+只应在开发或测试库上运行；数据库连不上时跳过。
+
+用法(在 movie-backend 目录下):
+    python -m pytest tests/test_statement_counts.py
+"""
+import uuid
+from typing import Dict, List
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import delete, event, text
+from sqlalchemy.exc import DBAPIError
+
+from app.core import security
+from app.core.config import settings
+from app.database import SessionLocal, engine
+from app.main import app
+from app.models import actor_model, movie_model, user_model
+
+# 鉴权依赖查询当前用户的那一条 SELECT
+AUTH = 1
+# 不支持 INSERT/UPDATE ... RETURNING 的数据库(MySQL)在返回前要再读一次数据库生成的列(CreatedAt)
+FETCH_DEFAULTS = 0 if engine.dialect.insert_returning else 1
+
+# 接口 -> 允许的最多语句数: 鉴权 + 写入本身 + COMMIT (+ 返回前读取数据库生成的列)
+BUDGETS: Dict[str, int] = {
+    # INSERT 评论 + 更新电影的评论数/最新评论/评论版本号
+    "POST /movies/{id}/comments": AUTH + 2 + 1 + FETCH_DEFAULTS,
+    # SELECT 评论(校验作者) + 评论版本号 + UPDATE
+    "PUT /comments/{id}": AUTH + 3 + 1,
+    # SELECT 评论 + DELETE + 更新电影的评论统计
+    "DELETE /comments/{id}": AUTH + 3 + 1,
+    # SELECT 已有评分 + INSERT / UPDATE / DELETE, 平均分、评分分布和版本号由触发器维护
+    "POST /movies/{id}/ratings (新建)": AUTH + 2 + 1 + FETCH_DEFAULTS,
+    # CreatedAt 带 onupdate, UPDATE 之后要重新读取
+    "POST /movies/{id}/ratings (修改)": AUTH + 2 + 1 + 1,
+    "DELETE /movies/{id}/ratings": AUTH + 2 + 1,
+    "POST /actors/": AUTH + 1 + 1,
+    # UPDATE 演员 + 参演电影的版本号, 提交后读取完整的演员返回
+    "PUT /actors/{id}": AUTH + 2 + 1 + 1,
+    # 检查用户名是否被占用 + UPDATE 用户 + 评论过的电影的评论版本号
+    "PUT /users/me": AUTH + 3 + 1,
+    # SELECT 演员 + INSERT 电影 + 演员关联 + 评分分布
+    "POST /movies/": AUTH + 4 + 1,
+    # SELECT 电影(带演员) + SELECT 新演员 + UPDATE 电影 + 删除/插入演员关联
+    "PUT /movies/{id}": AUTH + 5 + 1,
+}
+
+
+class StatementCounter:
+    def __init__(self):
+        self.statements: List[str] = []
+
+    def on_execute(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(" ".join(statement.split())[:120])
+
+    def on_commit(self, conn):
+        self.statements.append("COMMIT")
+
+
+@pytest.fixture(scope="module")
+def statement_counts():
+    """依次调用写接口，返回 {接口: 执行的语句列表}"""
+    try:
+        with engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
+    except DBAPIError as e:
+        pytest.skip(f"数据库不可用: {e.orig}")
+
+    rate_limit_enabled = settings.RATE_LIMIT_ENABLED
+    settings.RATE_LIMIT_ENABLED = False
+    suffix = uuid.uuid4().hex[:8]
+    with SessionLocal() as db:
+        user = user_model.User(
+            Username=f"stmt_{suffix}", Email=f"stmt_{suffix}@example.com",
+            PasswordHash=security.get_password_hash("check"), Role="admin",
+        )
+        movie = movie_model.Movie(Title=f"stmt_{suffix}")
+        actor = actor_model.Actor(Name=f"stmt_{suffix}")
+        db.add_all([user, movie, actor])
+        db.commit()
+        user_id, movie_id, actor_id = user.UserID, movie.MovieID, actor.ActorID
+
+    counter = StatementCounter()
+    client = TestClient(app)  # 不进入 lifespan, 不启动定时任务
+    token = client.post(
+        "/api/v1/users/login/token", data={"username": f"stmt_{suffix}@example.com", "password": "check"}
+    ).json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    results: Dict[str, List[str]] = {}
+
+    def measure(name: str, method: str, url: str, **kwargs):
+        counter.statements.clear()
+        response = client.request(method, "/api/v1" + url, headers=headers, **kwargs)
+        assert response.status_code < 400, f"{name} 返回 {response.status_code}: {response.text}"
+        results[name] = list(counter.statements)
+        return response
+
+    event.listen(engine, "before_cursor_execute", counter.on_execute)
+    event.listen(engine, "commit", counter.on_commit)
+    try:
+        comment_id = measure("POST /movies/{id}/comments", "POST", f"/movies/{movie_id}/comments", json={"Content": "a"}).json()["CommentID"]
+        measure("PUT /comments/{id}", "PUT", f"/comments/{comment_id}", json={"Content": "b"})
+        measure("DELETE /comments/{id}", "DELETE", f"/comments/{comment_id}")
+        measure("POST /movies/{id}/ratings (新建)", "POST", f"/movies/{movie_id}/ratings", json={"Score": 8})
+        measure("POST /movies/{id}/ratings (修改)", "POST", f"/movies/{movie_id}/ratings", json={"Score": 6})
+        measure("DELETE /movies/{id}/ratings", "DELETE", f"/movies/{movie_id}/ratings")
+        new_actor_id = measure("POST /actors/", "POST", "/actors/", json={"Name": f"stmt2_{suffix}"}).json()["ActorID"]
+        measure("PUT /actors/{id}", "PUT", f"/actors/{actor_id}", json={"Nationality": "中国"})
+        measure("PUT /users/me", "PUT", "/users/me", json={"Username": f"stmt3_{suffix}"})
+        new_movie_id = measure(
+            "POST /movies/", "POST", "/movies/", json={"Title": f"stmt2_{suffix}", "actor_ids": [actor_id]}
+        ).json()["MovieID"]
+        measure("PUT /movies/{id}", "PUT", f"/movies/{new_movie_id}", json={"Duration": 100, "actor_ids": [new_actor_id]})
+        yield results
+    finally:
+        event.remove(engine, "before_cursor_execute", counter.on_execute)
+        event.remove(engine, "commit", counter.on_commit)
+        settings.RATE_LIMIT_ENABLED = rate_limit_enabled
+        with SessionLocal() as db:
+            db.execute(delete(movie_model.Movie).where(movie_model.Movie.Title.like(f"stmt%_{suffix}")))
+            db.execute(delete(actor_model.Actor).where(actor_model.Actor.Name.like(f"stmt%_{suffix}")))
+            db.execute(delete(user_model.User).where(user_model.User.UserID == user_id))
+            db.commit()
+
+
+@pytest.mark.parametrize("name", list(BUDGETS))
+def test_write_statement_budget(statement_counts, name):
+    statements = statement_counts[name]
+    assert len(statements) <= BUDGETS[name], (
+        f"{name} 执行了 {len(statements)} 条语句(预算 {BUDGETS[name]}):\n  " + "\n  ".join(statements)
+    )